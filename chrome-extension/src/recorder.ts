@@ -18,6 +18,12 @@
   const streamToServer = getQueryParam("streamToServer") === "1";
   const serverUrl = getQueryParam("serverUrl") || "http://localhost:8017";
   let sessionId: string | null = null;
+  const UPLOAD_ATTEMPTS = 4;
+  // Recorded audio the server has not acknowledged yet, starting at byte unsentOffset
+  let unsentAudio = new Blob([], { type: AUDIO_MIME_TYPE });
+  let unsentOffset = 0;
+  let recordedBytes = 0;
+  let audioUploads: Promise<void> = Promise.resolve();
 
   async function serverStartSession(title: string): Promise<string | null> {
     try {
@@ -39,20 +45,33 @@
   }
   async function serverEndSession(sessionId: string) {
     try {
-      await fetch(`${serverUrl}/sessions/${sessionId}/end`, {
-        method: "POST",
-      });
+      await serverFlushAudio(sessionId);
+      const resp = await fetch(
+        `${serverUrl}/sessions/${sessionId}/end?bytes=${recordedBytes}`,
+        { method: "POST" },
+      );
+      if (resp.status === 409) {
+        const statusDiv = document.getElementById("status");
+        if (statusDiv)
+          statusDiv.textContent =
+            "Error: Some audio could not be uploaded to the server";
+      }
     } catch (e) {
       const statusDiv = document.getElementById("status");
       if (statusDiv)
         statusDiv.textContent = `Error: Could not end session on server (${e instanceof Error ? e.message : String(e)})`;
     }
   }
-  async function serverSendScreenshot(sessionId: string, dataUrl: string) {
+  async function serverSendScreenshot(
+    sessionId: string,
+    dataUrl: string,
+    capturedAt: number,
+  ) {
     try {
       const blob = await (await fetch(dataUrl)).blob();
       const form = new FormData();
       form.append("file", blob, "screenshot.png");
+      form.append("captured_at", String(capturedAt / 1000));
       await fetch(`${serverUrl}/sessions/${sessionId}/screenshot`, {
         method: "POST",
         body: form,
@@ -64,20 +83,69 @@
         statusDiv.textContent = `Error: Could not send screenshot to server (${e instanceof Error ? e.message : String(e)})`;
     }
   }
-  async function serverSendAudio(sessionId: string, audioBlob: Blob) {
-    try {
-      const form = new FormData();
-      form.append("file", audioBlob, "audio.webm");
-      await fetch(`${serverUrl}/sessions/${sessionId}/chunk`, {
-        method: "POST",
-        body: form,
-        headers: { mime_type: audioBlob.type },
-      });
-    } catch (e) {
-      const statusDiv = document.getElementById("status");
-      if (statusDiv)
-        statusDiv.textContent = `Error: Could not send audio to server (${e instanceof Error ? e.message : String(e)})`;
+  function acknowledgeAudio(offset: number) {
+    unsentAudio = unsentAudio.slice(
+      offset - unsentOffset,
+      undefined,
+      unsentAudio.type,
+    );
+    unsentOffset = offset;
+  }
+
+  // The recording is appended to a single audio stream on the server. Each request
+  // sends all audio not acknowledged yet from its byte offset, so audio of a failed
+  // request goes out with the next one, and bytes the server already has are skipped.
+  async function serverSendAudio(sessionId: string) {
+    let error = "";
+    for (let attempt = 1; attempt <= UPLOAD_ATTEMPTS; attempt++) {
+      if (unsentAudio.size === 0) return;
+      try {
+        const resp = await fetch(
+          `${serverUrl}/sessions/${sessionId}/stream?offset=${unsentOffset}`,
+          {
+            method: "POST",
+            body: unsentAudio,
+            headers: { "Content-Type": unsentAudio.type },
+          },
+        );
+        const data = await resp.json();
+        // A 409 with an offset means the server has a different amount of audio
+        // than expected, resume from there
+        const offset: number | undefined = resp.ok
+          ? data.offset
+          : data.detail?.offset;
+        if (offset !== undefined && offset >= unsentOffset) {
+          acknowledgeAudio(offset);
+          if (resp.ok) return;
+          continue;
+        }
+        error = `HTTP ${resp.status}`;
+        if (resp.status < 500 && resp.status !== 409) break;
+      } catch (e) {
+        error = e instanceof Error ? e.message : String(e);
+      }
+      if (attempt < UPLOAD_ATTEMPTS) {
+        await new Promise((resolve) =>
+          setTimeout(resolve, 1000 * 2 ** attempt),
+        );
+      }
     }
+    const statusDiv = document.getElementById("status");
+    if (statusDiv)
+      statusDiv.textContent = `Error: Could not send audio to server (${error})`;
+  }
+
+  function uploadAudio(sessionId: string, audioBlob: Blob): Promise<void> {
+    unsentAudio = new Blob([unsentAudio, audioBlob], { type: audioBlob.type });
+    recordedBytes += audioBlob.size;
+    audioUploads = audioUploads.then(() => serverSendAudio(sessionId));
+    return audioUploads;
+  }
+
+  // Waits for uploads in flight, then makes a last attempt at audio still unsent
+  async function serverFlushAudio(sessionId: string) {
+    await audioUploads;
+    await serverSendAudio(sessionId);
   }
 
   const beforeUnloadHandler = (event: BeforeUnloadEvent) => {
@@ -124,6 +192,7 @@
   async function captureScreenshot(): Promise<void> {
     if (!targetTabId) return;
     try {
+      const capturedAt = Date.now();
       const screenshot = await new Promise<string>((resolve, reject) => {
         chrome.runtime.sendMessage(
           { type: "TAKE_SCREENSHOT", tabId: targetTabId },
@@ -139,7 +208,7 @@
         );
       });
       if (streamToServer && sessionId) {
-        await serverSendScreenshot(sessionId, screenshot);
+        await serverSendScreenshot(sessionId, screenshot, capturedAt);
       } else {
         const filename = getTabFilename("png");
         triggerDownload(screenshot, filename);
@@ -287,7 +356,7 @@
                     mediaRecorder.ondataavailable = async (event) => {
                       if (event.data && event.data.size > 0) {
                         if (localStreamToServer && sessionId) {
-                          await serverSendAudio(sessionId, event.data);
+                          await uploadAudio(sessionId, event.data);
                         } else {
                           const url = URL.createObjectURL(event.data);
                           const filename = getTabFilename("webm");
@@ -333,7 +402,13 @@
                       }
                       window.close();
                     };
-                    mediaRecorder.start();
+                    // Uploads are appended to the server's stream while recording. Downloads
+                    // stay one file, blobs after the first are not playable on their own.
+                    if (localStreamToServer && sessionId) {
+                      mediaRecorder.start(audioBatchIntervalSec * 1000);
+                    } else {
+                      mediaRecorder.start();
+                    }
                     console.log(
                       "MediaRecorder state after start:",
                       mediaRecorder.state,
@@ -416,7 +491,12 @@
     stopScreenshotCapture();
     const capture = async () => {
       if (toServer && sessionId) {
-        await serverSendScreenshot(sessionId, await getScreenshotDataUrl());
+        const capturedAt = Date.now();
+        await serverSendScreenshot(
+          sessionId,
+          await getScreenshotDataUrl(),
+          capturedAt,
+        );
       } else {
         const filename = getTabFilename("png");
         triggerDownload(await getScreenshotDataUrl(), filename);
@@ -431,7 +511,12 @@
     sessionId: string | null,
   ) {
     if (toServer && sessionId) {
-      await serverSendScreenshot(sessionId, await getScreenshotDataUrl());
+      const capturedAt = Date.now();
+      await serverSendScreenshot(
+        sessionId,
+        await getScreenshotDataUrl(),
+        capturedAt,
+      );
     } else {
       const filename = getTabFilename("png");
       triggerDownload(await getScreenshotDataUrl(), filename);
@@ -0,0 +1,156 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from common import check_regressions, environment, percentiles, write_results
+
+logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(levelname)s %(message)s")
+
+
+def _request(
+        url: str, data: Optional[bytes] = None, headers: Optional[Dict[str, str]] = None, method: Optional[str] = None
+) -> Tuple[float, bytes]:
+    request = urllib.request.Request(
+        url, data=data, headers=headers or {}, method=method or ("POST" if data is not None else "GET")
+    )
+    started = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=60) as response:
+        body = response.read()
+    return time.perf_counter() - started, body
+
+
+def _multipart(payload: bytes, filename: str, content_type: str) -> Tuple[bytes, str]:
+    boundary = uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode() + payload + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def _start_session(base_url: str, index: int) -> str:
+    _, body = _request(
+        f"{base_url}/sessions/start",
+        json.dumps({"title": f"bench session {index}"}).encode(),
+        {"Content-Type": "application/json"},
+    )
+    return json.loads(body)["session_id"]
+
+
+def _close_sessions(base_url: str, session_ids: List[str], end: bool) -> None:
+    # The chunks are random bytes, so ending the sessions queues transcriptions that can only fail
+    for session_id in session_ids:
+        try:
+            if end:
+                _request(f"{base_url}/sessions/{session_id}/end", b"")
+            else:
+                _request(f"{base_url}/sessions/{session_id}", method="DELETE")
+        except OSError as e:
+            logging.warning(f"Failed to close session {session_id}: {e}")
+
+
+def bench_chunks(base_url: str, session_ids: List[str], chunks: int, chunk_kb: int, concurrency: int) -> Dict:
+    body, content_type = _multipart(os.urandom(chunk_kb * 1024), "audio.webm", "audio/webm;codecs=opus")
+    headers = {"Content-Type": content_type}
+
+    def upload(session_id: str) -> float:
+        latency, _ = _request(f"{base_url}/sessions/{session_id}/chunk", body, headers)
+        return latency
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(upload, [sid for sid in session_ids for _ in range(chunks)]))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "elapsed_sec": elapsed,
+        "requests_per_sec": len(latencies) / elapsed,
+        "mb_per_sec": len(latencies) * chunk_kb / 1024 / elapsed,
+        "latency_sec": percentiles(latencies),
+    }
+
+
+def bench_meetings(base_url: str, requests: int, concurrency: int, query: str) -> Dict:
+    url = f"{base_url}/api/meetings{query}"
+
+    def fetch(_: int) -> float:
+        latency, _ = _request(url)
+        return latency
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies: List[float] = list(pool.map(fetch, range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "elapsed_sec": elapsed,
+        "requests_per_sec": len(latencies) / elapsed,
+        "latency_sec": percentiles(latencies),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test the upload and listing endpoints of a running server.")
+    parser.add_argument("--url", default="http://localhost:8017")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--chunks", type=int, default=20, help="Chunks uploaded per session")
+    parser.add_argument("--chunk-kb", type=int, default=256)
+    parser.add_argument("--list-requests", type=int, default=200)
+    parser.add_argument("--list-query", default="", help="Query string for /api/meetings, e.g. ?limit=50")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--end-sessions",
+        action="store_true",
+        help="End the sessions instead of discarding them, queueing transcriptions of the random chunks",
+    )
+    parser.add_argument("--output", help="Write JSON results to this path")
+    parser.add_argument("--baseline", help="Previous results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline")
+    args = parser.parse_args()
+    base_url = args.url.rstrip("/")
+
+    session_ids: List[str] = []
+    try:
+        for i in range(args.sessions):
+            session_ids.append(_start_session(base_url, i))
+        logging.info(f"Uploading {args.sessions * args.chunks} chunks of {args.chunk_kb} KB to {base_url}")
+        chunk_results = bench_chunks(base_url, session_ids, args.chunks, args.chunk_kb, args.concurrency)
+        logging.info(f"Fetching /api/meetings{args.list_query} {args.list_requests} times")
+        meetings_results = bench_meetings(base_url, args.list_requests, args.concurrency, args.list_query)
+    finally:
+        _close_sessions(base_url, session_ids, args.end_sessions)
+
+    summary = {
+        "chunk_p50_sec": chunk_results["latency_sec"]["p50"],
+        "chunk_p95_sec": chunk_results["latency_sec"]["p95"],
+        "meetings_p50_sec": meetings_results["latency_sec"]["p50"],
+        "meetings_p95_sec": meetings_results["latency_sec"]["p95"],
+    }
+    results = {
+        "benchmark": "server",
+        "environment": environment(),
+        "config": vars(args),
+        "chunk_upload": chunk_results,
+        "list_meetings": meetings_results,
+        "summary": summary,
+    }
+    write_results(results, args.output)
+
+    if args.baseline:
+        regressions = check_regressions(summary, args.baseline, args.tolerance)
+        for regression in regressions:
+            logging.error(f"Regression: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import wave
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy as np
+
+from common import check_regressions, environment, peak_rss_mb, write_results
+
+SAMPLE_RATE = 16000
+
+
+def _synthetic_speech(duration_sec: float, seed: int = 0) -> np.ndarray:
+    # Two alternating "voices": harmonic tones at different pitches, amplitude
+    # modulated at a syllable-like rate, separated by pauses and longer silences.
+    rng = np.random.default_rng(seed)
+    audio = np.zeros(int(duration_sec * SAMPLE_RATE), dtype=np.float32)
+    position = 0
+    voice = 0
+    while position < len(audio):
+        turn = int(rng.uniform(2, 8) * SAMPLE_RATE)
+        t = np.arange(turn) / SAMPLE_RATE
+        pitch = (120.0, 210.0)[voice]
+        tone = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+        envelope = 0.5 * (1 + np.sin(2 * np.pi * rng.uniform(3, 5) * t))
+        segment = (0.08 * tone * envelope + 0.005 * rng.standard_normal(turn)).astype(np.float32)
+        end = min(position + turn, len(audio))
+        audio[position:end] = segment[: end - position]
+        position = end + int(rng.choice([0.3, 0.8, 4.0]) * SAMPLE_RATE)
+        voice = 1 - voice
+    return audio
+
+
+def _write_wav(audio: np.ndarray, path: str) -> None:
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((np.clip(audio, -1, 1) * 32767).astype(np.int16).tobytes())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the transcription pipeline stage by stage.")
+    parser.add_argument("--audio", help="Audio file to transcribe, defaults to synthetic speech")
+    parser.add_argument("--duration", type=float, default=120.0, help="Synthetic audio length in seconds")
+    parser.add_argument("--profile", default="quality", help="Transcription profile to benchmark")
+    parser.add_argument("--model", default="tiny", help="Whisper model size to benchmark, replacing the profile's")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", help="Write JSON results to this path")
+    parser.add_argument("--baseline", help="Previous results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    import profiles
+    import transcribe
+
+    profile = profiles.get(args.profile)._replace(model=args.model)
+    stage_times: Dict[str, float] = defaultdict(float)
+    stage_rss: Dict[str, float] = {}
+
+    def on_stage(name: str, elapsed: float) -> None:
+        stage_times[name] += elapsed
+        stage_rss[name] = peak_rss_mb()
+
+    transcribe.add_stage_listener(on_stage)
+
+    device, compute_type = transcribe.device_config()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        audio_path = args.audio
+        if audio_path is None:
+            audio_path = os.path.join(tmp_dir, "synthetic.wav")
+            _write_wav(_synthetic_speech(args.duration), audio_path)
+
+        transcribe.preload_models_sync(profile)
+        model_load = dict(stage_times)
+
+        runs: List[Dict] = []
+        for run in range(args.runs):
+            stage_times.clear()
+            started = time.perf_counter()
+            audio = transcribe.load_audio(audio_path)
+            result = transcribe.transcribe_array(audio, profile=profile)
+            total_sec = time.perf_counter() - started
+            audio_sec = len(audio) / transcribe.SAMPLE_RATE
+            runs.append(
+                {
+                    "stages": dict(stage_times),
+                    "peak_rss_mb_after_stage": dict(stage_rss),
+                    "total_sec": total_sec,
+                    "audio_sec": audio_sec,
+                    "rtf": total_sec / audio_sec if audio_sec else None,
+                    "segments": len(result.get("segments", [])),
+                }
+            )
+            logging.info(f"Run {run + 1}/{args.runs}: {total_sec:.2f}s, RTF {runs[-1]['rtf']:.3f}")
+
+    summary = {
+        f"{stage}_sec": statistics.median(r["stages"].get(stage, 0.0) for r in runs)
+        for stage in runs[0]["stages"]
+    }
+    summary["total_sec"] = statistics.median(r["total_sec"] for r in runs)
+    summary["rtf"] = statistics.median(r["rtf"] for r in runs)
+    summary["peak_rss_mb"] = peak_rss_mb()
+    results = {
+        "benchmark": "transcribe",
+        "environment": environment(),
+        "config": {
+            "profile": profile.name,
+            "model": profile.model,
+            "device": device,
+            "compute_type": profile.compute_type or compute_type,
+            "batch_size": profile.batch_size,
+            "beam_size": profile.beam_size,
+            "diarize": profile.diarize,
+            "audio": args.audio or f"synthetic:{args.duration}s",
+        },
+        "model_load": model_load,
+        "runs": runs,
+        "summary": summary,
+    }
+    write_results(results, args.output)
+
+    if args.baseline:
+        regressions = check_regressions(summary, args.baseline, args.tolerance)
+        for regression in regressions:
+            logging.error(f"Regression: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+import logging
+import os
+import shutil
+import threading
+import time
+import zipfile
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+import recordings
+
+ARCHIVE_DIRNAME = "archive"
+CACHE_DIRNAME = ".cache"
+# Archived meetings kept extracted for reading, least recently read are removed first
+ARCHIVE_CACHE_MEETINGS: int = int(os.environ.get("ARCHIVE_CACHE_MEETINGS", 16))
+# Formats that are already compressed are stored as they are
+STORED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".gz"} | set(recordings.MEDIA_TYPES)
+_SOURCE_FILENAME = ".archived_from"
+
+
+class Bundle(NamedTuple):
+    mtime_ns: int
+    size: int
+    meetings: Set[str]
+
+
+_output_dir: Optional[str] = None
+_lock = threading.Lock()
+_bundles: Dict[str, Bundle] = {}
+
+
+def init(output_dir: str) -> None:
+    global _output_dir
+    _output_dir = output_dir
+    _bundles.clear()
+
+
+def archive_dir(output_dir: Optional[str] = None) -> str:
+    output_dir = output_dir or _output_dir
+    if output_dir is None:
+        raise RuntimeError("Archive not initialized, call archive.init() first")
+    return os.path.join(output_dir, ARCHIVE_DIRNAME)
+
+
+def bundle_path(month: str) -> str:
+    return os.path.join(archive_dir(), f"{month}.zip")
+
+
+def month_of(start_time: float) -> str:
+    return datetime.fromtimestamp(start_time, timezone.utc).strftime("%Y-%m")
+
+
+def bundle_paths(output_dir: Optional[str] = None) -> List[str]:
+    directory = archive_dir(output_dir)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".zip"))
+
+
+def _meeting_of(member: str) -> str:
+    return member.split("/", 1)[0]
+
+
+def archived() -> Dict[str, str]:
+    """Bundle of every archived meeting. Bundles are only re-listed when they change."""
+    meetings: Dict[str, str] = {}
+    with _lock:
+        paths = bundle_paths()
+        for path in set(_bundles) - set(paths):
+            del _bundles[path]
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            bundle = _bundles.get(path)
+            if bundle is None or bundle.mtime_ns != stat.st_mtime_ns or bundle.size != stat.st_size:
+                with zipfile.ZipFile(path) as zf:
+                    bundle = Bundle(stat.st_mtime_ns, stat.st_size, {_meeting_of(name) for name in zf.namelist()})
+                _bundles[path] = bundle
+            for meeting_id in bundle.meetings:
+                meetings[meeting_id] = path
+    return meetings
+
+
+def _compress_type(filename: str) -> int:
+    return zipfile.ZIP_STORED if os.path.splitext(filename)[1].lower() in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def _meeting_files(meeting_path: str) -> Iterator[str]:
+    for root, _, files in os.walk(meeting_path):
+        for name in sorted(files):
+            if not name.endswith(".tmp"):
+                yield os.path.relpath(os.path.join(root, name), meeting_path)
+
+
+def add(path: str, meeting_paths: List[str]) -> List[str]:
+    """Adds meeting directories to the bundle at path, returning the meetings added.
+
+    The bundle is written to a copy that replaces it once complete, so readers and a
+    crash mid-way never see a partial bundle. Meetings already in it are skipped.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    if os.path.exists(path):
+        shutil.copyfile(path, tmp_path)
+    added: List[str] = []
+    with zipfile.ZipFile(tmp_path, "a" if os.path.exists(tmp_path) else "w") as zf:
+        present = {_meeting_of(name) for name in zf.namelist()}
+        for meeting_path in meeting_paths:
+            meeting_id = os.path.basename(os.path.normpath(meeting_path))
+            if meeting_id in present:
+                continue
+            for relpath in _meeting_files(meeting_path):
+                zf.write(
+                    os.path.join(meeting_path, relpath),
+                    f"{meeting_id}/{relpath.replace(os.sep, '/')}",
+                    compress_type=_compress_type(relpath),
+                )
+            added.append(meeting_id)
+    os.replace(tmp_path, path)
+    return added
+
+
+def _is_audio(member: str) -> bool:
+    return os.path.splitext(os.path.basename(member))[0] == recordings.AUDIO_BASENAME
+
+
+def meeting_sizes(path: str) -> Dict[str, Tuple[int, int]]:
+    """Compressed bytes of audio and of everything else, for every meeting in the bundle at path."""
+    sizes: Dict[str, Tuple[int, int]] = {}
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            audio, other = sizes.get(_meeting_of(info.filename), (0, 0))
+            if _is_audio(info.filename):
+                audio += info.compress_size
+            else:
+                other += info.compress_size
+            sizes[_meeting_of(info.filename)] = (audio, other)
+    return sizes
+
+
+def drop(path: str, meeting_ids: Set[str], audio_only: bool = False) -> int:
+    """Removes meetings, or only their audio, from the bundle at path, returning the bytes reclaimed."""
+    reclaimed = rewrite(
+        path,
+        lambda member: _meeting_of(member) not in meeting_ids or (audio_only and not _is_audio(member)),
+    )
+    # Extracted copies of meetings left in the bundle are refreshed on their next read
+    if not audio_only:
+        for meeting_id in meeting_ids:
+            shutil.rmtree(os.path.join(archive_dir(), CACHE_DIRNAME, meeting_id), ignore_errors=True)
+    return reclaimed
+
+
+def rewrite(path: str, keep: Callable[[str], bool]) -> int:
+    """Rewrites the bundle at path with only the members keep returns True for.
+
+    Returns the bytes reclaimed. A bundle left empty is deleted.
+    """
+    size = os.path.getsize(path)
+    tmp_path = path + ".tmp"
+    kept = 0
+    with zipfile.ZipFile(path) as zin, zipfile.ZipFile(tmp_path, "w") as zout:
+        for info in zin.infolist():
+            if not keep(info.filename):
+                continue
+            with zin.open(info) as src, zout.open(info, "w") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            kept += 1
+    if kept:
+        os.replace(tmp_path, path)
+        return size - os.path.getsize(path)
+    os.remove(tmp_path)
+    os.remove(path)
+    return size
+
+
+def _extract(zf: zipfile.ZipFile, members: List[zipfile.ZipInfo], meeting_path: str) -> None:
+    for info in members:
+        target = os.path.join(meeting_path, *info.filename.split("/")[1:])
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        with zf.open(info) as src, open(tmp_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        # Readers compare file times, e.g. a merged view against its transcript
+        mtime = time.mktime(info.date_time + (0, 0, -1))
+        os.utime(tmp_path, (mtime, mtime))
+        os.replace(tmp_path, target)
+
+
+def restore(meeting_id: str, audio: bool = False) -> Optional[str]:
+    """Extracts an archived meeting to the cache, returning its directory.
+
+    Audio is only extracted when asked for, so listing and reading archived meetings
+    does not unpack their recordings. None if the meeting is not archived.
+    """
+    path = archived().get(meeting_id)
+    if path is None:
+        return None
+    meeting_path = os.path.join(archive_dir(), CACHE_DIRNAME, meeting_id)
+    source = f"{os.path.basename(path)} {os.stat(path).st_mtime_ns}"
+    with _lock:
+        try:
+            with open(os.path.join(meeting_path, _SOURCE_FILENAME), "r", encoding="utf-8") as f:
+                fresh = f.read() == source
+        except FileNotFoundError:
+            fresh = False
+        has_audio = fresh and recordings.find(meeting_path) is not None
+        if not fresh or (audio and not has_audio):
+            with zipfile.ZipFile(path) as zf:
+                members = [info for info in zf.infolist() if _meeting_of(info.filename) == meeting_id]
+                if not fresh:
+                    shutil.rmtree(meeting_path, ignore_errors=True)
+                    tmp_path = f"{meeting_path}.{os.getpid()}.tmp"
+                    shutil.rmtree(tmp_path, ignore_errors=True)
+                    os.makedirs(tmp_path)
+                    _extract(zf, [info for info in members if not _is_audio(info.filename)], tmp_path)
+                    with open(os.path.join(tmp_path, _SOURCE_FILENAME), "w", encoding="utf-8") as f:
+                        f.write(source)
+                    try:
+                        os.rename(tmp_path, meeting_path)
+                        logging.info(f"Restored archived meeting {meeting_id} from {path}")
+                    except OSError:
+                        # Another process restored it first
+                        shutil.rmtree(tmp_path, ignore_errors=True)
+                if audio:
+                    _extract(zf, [info for info in members if _is_audio(info.filename)], meeting_path)
+        # The directory time orders the cache by last read
+        os.utime(meeting_path)
+    return meeting_path
+
+
+def prune_cache() -> int:
+    """Removes the least recently read meetings beyond ARCHIVE_CACHE_MEETINGS, returning the bytes freed."""
+    cache_dir = os.path.join(archive_dir(), CACHE_DIRNAME)
+    if not os.path.isdir(cache_dir):
+        return 0
+    freed = 0
+    with _lock:
+        entries = sorted(
+            (entry for entry in os.scandir(cache_dir) if entry.is_dir() and not entry.name.endswith(".tmp")),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True,
+        )
+        for entry in entries[ARCHIVE_CACHE_MEETINGS:]:
+            for root, _, files in os.walk(entry.path):
+                freed += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+            shutil.rmtree(entry.path, ignore_errors=True)
+    return freed
+
+
+def read_meetings(output_dir: str) -> Iterator[Tuple[str, Optional[bytes], List[str]]]:
+    """(meeting id, transcription.json bytes or None, screenshot filenames) of every archived meeting."""
+    for path in bundle_paths(output_dir):
+        with zipfile.ZipFile(path) as zf:
+            files: Dict[str, List[str]] = {}
+            for name in zf.namelist():
+                meeting_id, _, filename = name.partition("/")
+                files.setdefault(meeting_id, []).append(filename)
+            for meeting_id, filenames in files.items():
+                transcription = (
+                    zf.read(f"{meeting_id}/transcription.json") if "transcription.json" in filenames else None
+                )
+                yield meeting_id, transcription, [name for name in filenames if "/" not in name]
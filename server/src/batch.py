@@ -0,0 +1,205 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import logger as _
+
+AUDIO_EXTENSIONS: Tuple[str, ...] = (".webm", ".ogg", ".mp4", ".m4a", ".mp3", ".wav", ".flac")
+CHECKPOINT_FILENAME = "batch.checkpoint.jsonl"
+
+
+def _find_inputs(paths: Iterable[str], manifest: Optional[str]) -> List[str]:
+    inputs: List[str] = []
+    if manifest:
+        with open(manifest, "r", encoding="utf-8") as f:
+            paths = [*paths, *(line.strip() for line in f if line.strip() and not line.startswith("#"))]
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                inputs.extend(
+                    os.path.join(root, name) for name in files if name.lower().endswith(AUDIO_EXTENSIONS)
+                )
+        elif os.path.isfile(path):
+            inputs.append(path)
+        else:
+            logging.warning(f"Skipping {path}: not found")
+    return sorted({os.path.abspath(path) for path in inputs})
+
+
+def _output_path(input_path: str, output_dir: Optional[str], roots: List[str]) -> str:
+    if output_dir is None:
+        return input_path + ".transcription.json"
+    # Mirror the input tree under output_dir, and the full path of inputs under none of the
+    # given directories, so inputs with the same name in different directories don't collide
+    root = next((r for r in roots if input_path.startswith(r + os.sep)), None)
+    relative = os.path.relpath(input_path, root) if root else os.path.splitdrive(input_path)[1].lstrip(os.sep)
+    return os.path.join(os.path.abspath(output_dir), relative + ".transcription.json")
+
+
+def _collisions(outputs: Dict[str, str]) -> Dict[str, List[str]]:
+    # Inputs at the same path under two given directories still map to the same output
+    inputs_by_output: Dict[str, List[str]] = {}
+    for input_path, output_path in outputs.items():
+        inputs_by_output.setdefault(output_path, []).append(input_path)
+    return {output: inputs for output, inputs in inputs_by_output.items() if len(inputs) > 1}
+
+
+def _is_up_to_date(input_path: str, output_path: str) -> bool:
+    return os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(input_path)
+
+
+def _load_checkpoint(path: str) -> Dict[str, Dict[str, Any]]:
+    entries: Dict[str, Dict[str, Any]] = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.endswith("\n"):
+                entry = json.loads(line)
+                entries[entry["input"]] = entry
+    return entries
+
+
+def _init_worker(threads: int, profile_name: Optional[str]) -> None:
+    import torch
+
+    import profiles
+    import transcribe
+
+    # Workers split the CPU between them instead of each using every core
+    torch.set_num_threads(threads)
+    transcribe.preload_models_sync(profiles.get(profile_name) if profile_name else None)
+
+
+def _transcribe_file(input_path: str, output_path: str, profile_name: Optional[str]) -> Dict[str, Any]:
+    import profiles
+    import transcribe
+
+    started = time.perf_counter()
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    session = {
+        "title": os.path.basename(input_path),
+        "start_time": os.path.getmtime(input_path),
+        "source": input_path,
+    }
+    tmp_path = output_path + ".tmp"
+    result = transcribe.transcribe_to_json(
+        session, input_path, tmp_path, profiles.get(profile_name) if profile_name else None
+    )
+    os.replace(tmp_path, output_path)
+    return {
+        "audio_sec": result.get("duration", 0.0),
+        "elapsed_sec": time.perf_counter() - started,
+        "segments": len(result.get("segments", [])),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Transcribe a tree of recordings in parallel, resuming where a previous run stopped."
+    )
+    parser.add_argument("paths", nargs="*", help="Audio files or directories to search for recordings")
+    parser.add_argument("--manifest", help="File listing audio files or directories, one per line")
+    parser.add_argument("--output-dir", help="Write transcripts here, mirroring the input tree, instead of next to each input")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes, each loading its own models")
+    parser.add_argument("--profile", help="Transcription profile, the best one by default")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILENAME, help="Progress file used to resume runs")
+    parser.add_argument("--retry-failed", action="store_true", help="Retry inputs that failed in a previous run")
+    parser.add_argument("--force", action="store_true", help="Transcribe inputs even if their output is up to date")
+    args = parser.parse_args()
+    if not args.paths and not args.manifest:
+        parser.error("give at least one path or --manifest")
+
+    roots = [os.path.abspath(p) for p in args.paths if os.path.isdir(p)]
+    checkpoint = _load_checkpoint(args.checkpoint)
+    pending: List[Tuple[str, str]] = []
+    skipped = 0
+    outputs = {
+        input_path: _output_path(input_path, args.output_dir, roots)
+        for input_path in _find_inputs(args.paths, args.manifest)
+    }
+    collisions = _collisions(outputs)
+    if collisions:
+        for output_path, inputs in collisions.items():
+            logging.error(f"Inputs {', '.join(inputs)} would be written to {output_path}")
+        parser.error("several inputs would be written to the same output, transcribe them into separate --output-dir")
+    for input_path, output_path in outputs.items():
+        previous = checkpoint.get(input_path, {})
+        if not args.force and (
+            _is_up_to_date(input_path, output_path)
+            or (previous.get("status") == "failed" and not args.retry_failed)
+        ):
+            skipped += 1
+            continue
+        pending.append((input_path, output_path))
+    # Longest recordings first, so a long one doesn't start last and hold up the end of the run
+    pending.sort(key=lambda item: os.path.getsize(item[0]), reverse=True)
+    logging.info(f"{len(pending)} recordings to transcribe, {skipped} skipped, {args.workers} workers")
+    if not pending:
+        return 0
+
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    started = time.perf_counter()
+    done = failed = 0
+    audio_sec = 0.0
+    with open(args.checkpoint, "a", encoding="utf-8") as checkpoint_file, ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads, args.profile),
+    ) as pool:
+        futures: Dict[Future, Tuple[str, str]] = {
+            pool.submit(_transcribe_file, input_path, output_path, args.profile): (input_path, output_path)
+            for input_path, output_path in pending
+        }
+        remaining = set(futures)
+        while remaining:
+            finished, remaining = wait(remaining, return_when=FIRST_COMPLETED)
+            for future in finished:
+                input_path, output_path = futures[future]
+                entry: Dict[str, Any] = {"input": input_path, "output": output_path, "finished_at": time.time()}
+                try:
+                    entry.update(future.result(), status="done")
+                    done += 1
+                    audio_sec += entry["audio_sec"]
+                except BrokenProcessPool:
+                    # A worker died (out of memory, failed to load models): stop without
+                    # recording the rest as failed, so the next run retries them
+                    logging.critical("A worker process died, stopping. Rerun to resume.")
+                    return 1
+                except Exception as e:
+                    entry.update(status="failed", error=str(e))
+                    failed += 1
+                    logging.error(f"Failed to transcribe {input_path}: {e}")
+                checkpoint_file.write(json.dumps(entry) + "\n")
+                checkpoint_file.flush()
+                elapsed = time.perf_counter() - started
+                logging.info(
+                    f"[{done + failed}/{len(pending)}] {entry['status']} {input_path}, "
+                    f"{audio_sec / 3600:.2f}h of audio in {elapsed / 60:.1f} min "
+                    f"({audio_sec / elapsed:.1f}x real time)"
+                )
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "transcribed": done,
+        "failed": failed,
+        "skipped": skipped,
+        "audio_hours": round(audio_sec / 3600, 3),
+        "wall_minutes": round(elapsed / 60, 2),
+        "real_time_speedup": round(audio_sec / elapsed, 2),
+        "files_per_hour": round(done / elapsed * 3600, 1),
+    }
+    print(json.dumps(summary, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+import argparse
+import html
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import archive
+import db
+import logger as _
+
+TRANSCRIPTION_FILENAME = "transcription.json"
+SORT_COLUMNS: Dict[str, str] = {"date": "start_time", "title": "title COLLATE NOCASE"}
+# Placeholders for the highlighted terms of search snippets, never found in transcript text
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+
+_db_path: Optional[str] = None
+
+
+def _connect():
+    if _db_path is None:
+        raise RuntimeError("Meeting catalog not initialized, call catalog.init() first")
+    return db.connect(_db_path)
+
+
+def _is_screenshot(filename: str) -> bool:
+    return filename.startswith("screenshot_") and filename.endswith(".png")
+
+
+def init(db_path: str, output_dir: str) -> bool:
+    """Creates the catalog if needed, returning True if it was (re)built from output_dir."""
+    global _db_path
+    is_new = not os.path.exists(db_path)
+    _db_path = db_path
+    with _connect() as conn:
+        had_fts = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'segments_fts'"
+        ).fetchone() is not None
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meetings (
+                id TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                start_time REAL NOT NULL DEFAULT 0,
+                has_transcript INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS meetings_start_time ON meetings (has_transcript, start_time);
+            CREATE TABLE IF NOT EXISTS screenshots (
+                meeting_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                PRIMARY KEY (meeting_id, filename)
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+                text,
+                speaker UNINDEXED,
+                meeting_id UNINDEXED,
+                start UNINDEXED,
+                end UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2'
+            );
+            """
+        )
+        # Catalogs from before full-text search, or whose index was lost, get their transcripts indexed
+        unindexed = conn.execute(
+            "SELECT NOT EXISTS (SELECT 1 FROM segments_fts) AND EXISTS (SELECT 1 FROM meetings WHERE has_transcript = 1)"
+        ).fetchone()[0]
+    if is_new or not had_fts or unindexed:
+        rebuild(output_dir)
+        return True
+    return False
+
+
+def upsert_meeting(meeting_id: str, session: Dict[str, Any]) -> None:
+    with _connect() as conn:
+        conn.execute(
+            """
+            INSERT INTO meetings (id, title, start_time, has_transcript, updated_at)
+            VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                title = excluded.title,
+                start_time = excluded.start_time,
+                has_transcript = 1,
+                updated_at = excluded.updated_at
+            """,
+            (
+                meeting_id,
+                session.get("title", meeting_id),
+                session.get("start_time", 0),
+                time.time(),
+            ),
+        )
+
+
+def _insert_segments(conn, meeting_id: str, segments: List[Dict[str, Any]]) -> None:
+    conn.executemany(
+        "INSERT INTO segments_fts (text, speaker, meeting_id, start, end) VALUES (?, ?, ?, ?, ?)",
+        [
+            (
+                segment.get("text", "").strip(),
+                segment.get("speaker_name") or segment.get("speaker"),
+                meeting_id,
+                segment.get("start"),
+                segment.get("end"),
+            )
+            for segment in segments
+            if segment.get("text", "").strip()
+        ],
+    )
+
+
+def index_segments(meeting_id: str, segments: List[Dict[str, Any]]) -> None:
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM segments_fts WHERE meeting_id = ?", (meeting_id,))
+        _insert_segments(conn, meeting_id, segments)
+        conn.execute("COMMIT")
+    logging.info(f"Indexed {len(segments)} segments for meeting {meeting_id}")
+
+
+def _fts_query(query: str) -> str:
+    # Quote every term so user input is matched literally instead of parsed as FTS syntax.
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+def _snippet_html(snippet: str) -> str:
+    # Transcript text is escaped, only the highlighting is markup
+    return html.escape(snippet).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+
+def search(query: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+    fts_query = _fts_query(query)
+    if not fts_query:
+        return []
+    with _connect() as conn:
+        rows = conn.execute(
+            """
+            SELECT f.meeting_id, f.speaker, f.start, f.end,
+                snippet(segments_fts, 0, ?, ?, '…', 16) AS snippet,
+                bm25(segments_fts) AS score,
+                m.title, m.start_time
+            FROM segments_fts f
+            LEFT JOIN meetings m ON m.id = f.meeting_id
+            WHERE segments_fts MATCH ?
+            ORDER BY score
+            LIMIT ? OFFSET ?
+            """,
+            (_MARK_START, _MARK_END, fts_query, limit, offset),
+        ).fetchall()
+    return [
+        {
+            "meeting_id": row["meeting_id"],
+            "title": row["title"],
+            "date": row["start_time"],
+            "speaker": row["speaker"],
+            "start": row["start"],
+            "end": row["end"],
+            "snippet": _snippet_html(row["snippet"]),
+            "score": -row["score"],
+        }
+        for row in rows
+    ]
+
+
+def add_screenshot(meeting_id: str, filename: str) -> None:
+    if not _is_screenshot(filename):
+        return
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO screenshots (meeting_id, filename) VALUES (?, ?)",
+            (meeting_id, filename),
+        )
+
+
+def _middle_screenshots(conn, meeting_ids: List[str]) -> Dict[str, str]:
+    if not meeting_ids:
+        return {}
+    placeholders = ",".join("?" * len(meeting_ids))
+    rows = conn.execute(
+        f"""
+        SELECT meeting_id, filename FROM (
+            SELECT meeting_id, filename,
+                ROW_NUMBER() OVER (PARTITION BY meeting_id ORDER BY filename) - 1 AS idx,
+                COUNT(*) OVER (PARTITION BY meeting_id) AS total
+            FROM screenshots WHERE meeting_id IN ({placeholders})
+        ) WHERE idx = total / 2
+        """,
+        meeting_ids,
+    ).fetchall()
+    return {row["meeting_id"]: row["filename"] for row in rows}
+
+
+def list_meetings(
+        limit: Optional[int] = None,
+        offset: int = 0,
+        sort: str = "date",
+        order: str = "desc",
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+) -> Tuple[List[Dict[str, Any]], int]:
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Unsupported sort field: {sort}")
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Unsupported sort order: {order}")
+    where = ["has_transcript = 1"]
+    params: List[Any] = []
+    if since is not None:
+        where.append("start_time >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("start_time < ?")
+        params.append(until)
+    where_sql = " AND ".join(where)
+    with _connect() as conn:
+        total = conn.execute(
+            f"SELECT COUNT(*) FROM meetings WHERE {where_sql}", params
+        ).fetchone()[0]
+        rows = conn.execute(
+            f"""
+            SELECT id, title, start_time FROM meetings
+            WHERE {where_sql}
+            ORDER BY {SORT_COLUMNS[sort]} {order.upper()}
+            LIMIT ? OFFSET ?
+            """,
+            params + [limit if limit is not None else -1, offset],
+        ).fetchall()
+        middle_screenshots = _middle_screenshots(conn, [row["id"] for row in rows])
+    meetings = [
+        {
+            "id": row["id"],
+            "title": row["title"],
+            "date": row["start_time"],
+            "screenshot": middle_screenshots.get(row["id"]),
+        }
+        for row in rows
+    ]
+    return meetings, total
+
+
+def start_times() -> Dict[str, float]:
+    with _connect() as conn:
+        return {row["id"]: row["start_time"] for row in conn.execute("SELECT id, start_time FROM meetings")}
+
+
+def remove_meeting(meeting_id: str) -> None:
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM meetings WHERE id = ?", (meeting_id,))
+        conn.execute("DELETE FROM screenshots WHERE meeting_id = ?", (meeting_id,))
+        conn.execute("DELETE FROM segments_fts WHERE meeting_id = ?", (meeting_id,))
+        conn.execute("COMMIT")
+
+
+def _insert_meeting(conn, meeting_id: str, transcription: Optional[bytes], screenshots: List[str]) -> None:
+    session: Dict[str, Any] = {}
+    has_transcript = False
+    if transcription is not None:
+        try:
+            transcription_data = json.loads(transcription)
+            session = transcription_data.get("session", {})
+            _insert_segments(conn, meeting_id, transcription_data.get("segments", []))
+            has_transcript = True
+        except Exception as e:
+            logging.error(f"Error processing meeting {meeting_id}: {e}")
+    conn.execute(
+        """
+        INSERT INTO meetings (id, title, start_time, has_transcript, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (
+            meeting_id,
+            session.get("title", meeting_id),
+            session.get("start_time", 0),
+            int(has_transcript),
+            time.time(),
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO screenshots (meeting_id, filename) VALUES (?, ?)",
+        [(meeting_id, f) for f in screenshots if _is_screenshot(f)],
+    )
+
+
+def rebuild(output_dir: str) -> int:
+    logging.info(f"Rebuilding meeting catalog from {output_dir}")
+    count = 0
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM meetings")
+        conn.execute("DELETE FROM screenshots")
+        conn.execute("DELETE FROM segments_fts")
+        for meeting_id in os.listdir(output_dir):
+            meeting_path = os.path.join(output_dir, meeting_id)
+            if meeting_id == archive.ARCHIVE_DIRNAME or not os.path.isdir(meeting_path):
+                continue
+            transcription = None
+            transcription_path = os.path.join(meeting_path, TRANSCRIPTION_FILENAME)
+            if os.path.exists(transcription_path):
+                with open(transcription_path, "rb") as f:
+                    transcription = f.read()
+            _insert_meeting(conn, meeting_id, transcription, os.listdir(meeting_path))
+            count += 1
+        # Meetings moved to the monthly archives are listed like the others
+        for meeting_id, transcription, screenshots in archive.read_meetings(output_dir):
+            if conn.execute("SELECT 1 FROM meetings WHERE id = ?", (meeting_id,)).fetchone() is None:
+                _insert_meeting(conn, meeting_id, transcription, screenshots)
+                count += 1
+        conn.execute("COMMIT")
+    logging.info(f"Meeting catalog rebuilt with {count} meetings")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the meeting catalog and search index from disk.")
+    parser.add_argument(
+        "output_dir",
+        nargs="?",
+        default=os.environ.get("OUTPUT_DIR", "./output"),
+        help="Meetings output directory",
+    )
+    args = parser.parse_args()
+    if not init(os.path.join(args.output_dir, "catalog.db"), args.output_dir):
+        rebuild(args.output_dir)
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+import db
+
+EVENT_RETENTION_SEC: float = float(os.environ.get("EVENT_RETENTION_SEC", 60 * 60))
+EVENT_POLL_INTERVAL_SEC: float = float(os.environ.get("EVENT_POLL_INTERVAL_SEC", 0.5))
+SUBSCRIBER_QUEUE_SIZE: int = 256
+PRUNE_INTERVAL_SEC: float = 300.0
+ALL = "*"
+
+_db_path: Optional[str] = None
+# Subscriber queues by session id, ALL for subscribers to every session
+_subscribers: Dict[str, Set[asyncio.Queue]] = {}
+# Subscribers dropped for falling behind, which end once they have read their queue
+_overflowed: Set[asyncio.Queue] = set()
+_last_id: int = 0
+
+
+def _connect():
+    if _db_path is None:
+        raise RuntimeError("Event log not initialized, call events.init() first")
+    return db.connect(_db_path)
+
+
+def _row_to_event(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "session_id": row["session_id"],
+        "type": row["type"],
+        "time": row["created_at"],
+        "data": json.loads(row["data"]),
+    }
+
+
+def init(db_path: str) -> None:
+    global _db_path, _last_id
+    _db_path = db_path
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    with _connect() as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS events_session ON events (session_id, id)")
+        _last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+
+def publish(session_id: str, event_type: str, data: Optional[Dict[str, Any]] = None) -> None:
+    """Appends an event to the log shared by the API and worker processes.
+
+    Events are best effort: a failure is logged and never fails the caller.
+    """
+    if _db_path is None:
+        return
+    try:
+        with _connect() as conn:
+            conn.execute(
+                "INSERT INTO events (session_id, type, data, created_at) VALUES (?, ?, ?, ?)",
+                (session_id, event_type, json.dumps(data or {}, ensure_ascii=False), time.time()),
+            )
+    except sqlite3.Error as e:
+        logging.warning(f"Failed to publish {event_type} event for session {session_id}: {e}")
+
+
+def _events_after(after_id: int, session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    with _connect() as conn:
+        if session_id is None:
+            rows = conn.execute("SELECT * FROM events WHERE id > ? ORDER BY id", (after_id,)).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT * FROM events WHERE session_id = ? AND id > ? ORDER BY id", (session_id, after_id)
+            ).fetchall()
+    return [_row_to_event(row) for row in rows]
+
+
+def _prune() -> None:
+    with _connect() as conn:
+        conn.execute("DELETE FROM events WHERE created_at < ?", (time.time() - EVENT_RETENTION_SEC,))
+
+
+def _dispatch(event: Dict[str, Any]) -> None:
+    for key in (event["session_id"], ALL):
+        for queue in list(_subscribers.get(key, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A subscriber that can't keep up is disconnected rather than buffered
+                # without bound. Browsers reconnect with Last-Event-ID and replay the log.
+                _subscribers[key].discard(queue)
+                _overflowed.add(queue)
+
+
+async def pump() -> None:
+    """Tails the event log and fans new events out to subscribers of this process.
+
+    One query per interval serves every subscriber, however many are connected.
+    """
+    global _last_id
+    last_prune = 0.0
+    while True:
+        await asyncio.sleep(EVENT_POLL_INTERVAL_SEC)
+        try:
+            if time.monotonic() - last_prune > PRUNE_INTERVAL_SEC:
+                await asyncio.to_thread(_prune)
+                last_prune = time.monotonic()
+            for event in await asyncio.to_thread(_events_after, _last_id):
+                _last_id = event["id"]
+                _dispatch(event)
+        except Exception as e:
+            logging.error(f"Failed to read new events: {e}", exc_info=True)
+
+
+async def subscribe(
+        session_id: str = ALL,
+        last_event_id: Optional[int] = None,
+) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """Yields events of session_id (every session for ALL) as they are published,
+    after replaying those after last_event_id. Yields None when no event arrived
+    for a while, so callers can send keepalives, and stops if the subscriber falls
+    SUBSCRIBER_QUEUE_SIZE events behind.
+    """
+    queue: asyncio.Queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+    _subscribers.setdefault(session_id, set()).add(queue)
+    try:
+        replayed = 0
+        if last_event_id is not None:
+            for event in await asyncio.to_thread(
+                    _events_after, last_event_id, None if session_id == ALL else session_id
+            ):
+                replayed = event["id"]
+                yield event
+        while True:
+            if queue in _overflowed and queue.empty():
+                return
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=15)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            # Events published while replaying are both replayed and queued
+            if event["id"] > replayed:
+                yield event
+    finally:
+        _overflowed.discard(queue)
+        queues = _subscribers.get(session_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                _subscribers.pop(session_id, None)
+
+
+def subscriber_count() -> int:
+    return sum(len(queues) for queues in _subscribers.values())
@@ -0,0 +1,257 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import db
+
+TRANSCRIBE_WORKERS: int = int(os.environ.get("TRANSCRIBE_WORKERS", 1))
+MAX_QUEUED_JOBS: int = int(os.environ.get("MAX_QUEUED_JOBS", 32))
+JOB_LEASE_SEC: float = float(os.environ.get("JOB_LEASE_SEC", 60))
+MAX_JOB_ATTEMPTS: int = int(os.environ.get("MAX_JOB_ATTEMPTS", 3))
+WORKER_ID: str = os.environ.get("WORKER_ID", f"{socket.gethostname()}:{os.getpid()}")
+POLL_INTERVAL_SEC: float = 5.0
+
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+PRIORITY_NORMAL = 0
+# Claimed only when no normal job is queued, and not counted against MAX_QUEUED_JOBS
+PRIORITY_BACKGROUND = -1
+
+_db_path: Optional[str] = None
+_wakeup = threading.Event()
+_stopping = threading.Event()
+_workers: List[threading.Thread] = []
+
+
+def _connect():
+    if _db_path is None:
+        raise RuntimeError("Job queue not initialized, call jobs.init() first")
+    return db.connect(_db_path)
+
+
+def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    return job
+
+
+def init(db_path: str) -> None:
+    global _db_path
+    _db_path = db_path
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    with _connect() as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                worker_id TEXT,
+                lease_expires_at REAL,
+                priority INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in (
+                ("worker_id", "TEXT"),
+                ("lease_expires_at", "REAL"),
+                ("priority", "INTEGER NOT NULL DEFAULT 0"),
+        ):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_priority ON jobs (state, priority, created_at)")
+    logging.info(f"Job queue initialized at {db_path}")
+
+
+def recover() -> int:
+    # Running jobs whose worker stopped renewing the lease died with it. Any worker
+    # may take them over, unless they already crashed workers too many times.
+    now = time.time()
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        expired = "state = ? AND (lease_expires_at IS NULL OR lease_expires_at < ?)"
+        conn.execute(
+            f"""
+            UPDATE jobs SET state = ?, error = ?, finished_at = ?
+            WHERE {expired} AND attempts >= ?
+            """,
+            (STATE_FAILED, "Worker lost too many times", now, STATE_RUNNING, now, MAX_JOB_ATTEMPTS),
+        )
+        cur = conn.execute(
+            f"""
+            UPDATE jobs SET state = ?, started_at = NULL, worker_id = NULL, lease_expires_at = NULL
+            WHERE {expired}
+            """,
+            (STATE_QUEUED, STATE_RUNNING, now),
+        )
+        count = cur.rowcount
+        conn.execute("COMMIT")
+    if count:
+        logging.info(f"Requeued {count} interrupted transcription jobs")
+        _wakeup.set()
+    return count
+
+
+def queue_depth() -> int:
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE state IN (?, ?) AND priority >= ?",
+            (STATE_QUEUED, STATE_RUNNING, PRIORITY_NORMAL),
+        ).fetchone()
+    return row[0]
+
+
+def counts_by_state() -> Dict[str, int]:
+    with _connect() as conn:
+        rows = conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+    return {row[0]: row[1] for row in rows}
+
+
+def is_saturated() -> bool:
+    return queue_depth() >= MAX_QUEUED_JOBS
+
+
+def enqueue(job_id: str, payload: Dict[str, Any], priority: int = PRIORITY_NORMAL) -> Dict[str, Any]:
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is not None and row["state"] in (STATE_QUEUED, STATE_RUNNING):
+            conn.execute("COMMIT")
+            return _row_to_job(row)
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO jobs (id, state, payload, attempts, created_at, priority)
+            VALUES (?, ?, ?, 0, ?, ?)
+            """,
+            (job_id, STATE_QUEUED, json.dumps(payload), time.time(), priority),
+        )
+        conn.execute("COMMIT")
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    logging.info(f"Enqueued transcription job {job_id}")
+    _wakeup.set()
+    return _row_to_job(row)
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = _row_to_job(row)
+        if job["state"] == STATE_QUEUED:
+            ahead = conn.execute(
+                """
+                SELECT COUNT(*) FROM jobs
+                WHERE state = ? AND (priority > ? OR (priority = ? AND created_at < ?))
+                """,
+                (STATE_QUEUED, job["priority"], job["priority"], job["created_at"]),
+            ).fetchone()
+            job["queue_position"] = ahead[0]
+    return job
+
+
+def _claim_next() -> Optional[Dict[str, Any]]:
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE state = ? ORDER BY priority DESC, created_at LIMIT 1",
+            (STATE_QUEUED,),
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        now = time.time()
+        conn.execute(
+            """
+            UPDATE jobs SET state = ?, started_at = ?, attempts = attempts + 1,
+                worker_id = ?, lease_expires_at = ?
+            WHERE id = ?
+            """,
+            (STATE_RUNNING, now, WORKER_ID, now + JOB_LEASE_SEC, row["id"]),
+        )
+        conn.execute("COMMIT")
+    return _row_to_job(row)
+
+
+def _finish(job_id: str, error: Optional[str] = None) -> None:
+    with _connect() as conn:
+        conn.execute(
+            """
+            UPDATE jobs SET state = ?, error = ?, finished_at = ?, lease_expires_at = NULL
+            WHERE id = ? AND worker_id = ?
+            """,
+            (STATE_FAILED if error else STATE_DONE, error, time.time(), job_id, WORKER_ID),
+        )
+
+
+def _heartbeat_loop() -> None:
+    while not _stopping.wait(JOB_LEASE_SEC / 3):
+        try:
+            with _connect() as conn:
+                conn.execute(
+                    "UPDATE jobs SET lease_expires_at = ? WHERE state = ? AND worker_id = ?",
+                    (time.time() + JOB_LEASE_SEC, STATE_RUNNING, WORKER_ID),
+                )
+        except sqlite3.Error as e:
+            logging.error(f"Failed to renew job leases: {e}")
+
+
+def _worker_loop(handler: Callable[[Dict[str, Any]], None]) -> None:
+    name = threading.current_thread().name
+    while not _stopping.is_set():
+        try:
+            job = _claim_next()
+        except sqlite3.Error as e:
+            logging.error(f"{name}: failed to claim job: {e}")
+            job = None
+        if job is None:
+            _wakeup.wait(POLL_INTERVAL_SEC)
+            _wakeup.clear()
+            try:
+                recover()
+            except sqlite3.Error as e:
+                logging.error(f"{name}: failed to recover expired jobs: {e}")
+            continue
+        logging.info(f"{name}: running job {job['id']} (attempt {job['attempts'] + 1})")
+        try:
+            handler(job)
+            _finish(job["id"])
+            logging.info(f"{name}: job {job['id']} done")
+        except Exception as e:
+            logging.error(f"{name}: job {job['id']} failed: {e}", exc_info=True)
+            _finish(job["id"], error=str(e))
+
+
+def start_workers(handler: Callable[[Dict[str, Any]], None], count: int = TRANSCRIBE_WORKERS) -> None:
+    _stopping.clear()
+    heartbeat = threading.Thread(target=_heartbeat_loop, name="job-heartbeat", daemon=True)
+    heartbeat.start()
+    _workers.append(heartbeat)
+    for i in range(count):
+        worker = threading.Thread(
+            target=_worker_loop, args=(handler,), name=f"transcribe-worker-{i}", daemon=True
+        )
+        worker.start()
+        _workers.append(worker)
+    logging.info(f"Started {count} transcription workers as {WORKER_ID}")
+
+
+def stop_workers() -> None:
+    _stopping.set()
+    _wakeup.set()
+    _workers.clear()
@@ -0,0 +1,401 @@
+import argparse
+import fcntl
+import json
+import logging
+import os
+import shutil
+import subprocess
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import archive
+import catalog
+import jobs
+import logger as _
+import metrics
+import recordings
+import session_store
+
+# Seconds between background sweeps, 0 disables them
+LIFECYCLE_INTERVAL_SEC: float = float(os.environ.get("LIFECYCLE_INTERVAL_SEC", 60 * 60))
+# Re-encode kept meeting audio to Opus at AUDIO_OPUS_BITRATE once transcribed
+COMPACT_AUDIO: bool = os.environ.get("COMPACT_AUDIO", "true").lower() in ("1", "true", "yes")
+# Meetings older than this move to the monthly archives, 0 never archives
+ARCHIVE_AFTER_DAYS: float = float(os.environ.get("ARCHIVE_AFTER_DAYS", 90))
+# Meetings older than this are deleted, 0 keeps them forever
+RETENTION_DAYS: float = float(os.environ.get("RETENTION_DAYS", 0))
+# Audio older than this is deleted, the transcript and screenshots are kept. 0 keeps it forever
+AUDIO_RETENTION_DAYS: float = float(os.environ.get("AUDIO_RETENTION_DAYS", 0))
+# Chunks of sessions whose transcription failed are kept this long for debugging, 0 keeps them forever
+FAILED_SESSION_RETENTION_DAYS: float = float(os.environ.get("FAILED_SESSION_RETENTION_DAYS", 30))
+# Size OUTPUT_DIR is kept under by deleting the audio of the oldest meetings, 0 for no limit
+OUTPUT_QUOTA_MB: float = float(os.environ.get("OUTPUT_QUOTA_MB", 0))
+
+DAY_SEC: float = 24 * 60 * 60
+# Chunk directories of transcribed meetings are left alone this long, in case the job is still finishing
+LEFTOVER_CHUNKS_AGE_SEC: float = DAY_SEC
+REPORT_FILENAME = "lifecycle.json"
+LOCK_FILENAME = ".lifecycle.lock"
+
+_working_dir: str = "./data"
+_output_dir: str = "./output"
+_sessions: Optional[session_store.SessionStore] = None
+
+
+def configure(working_dir: str, output_dir: str, sessions: session_store.SessionStore) -> None:
+    global _working_dir, _output_dir, _sessions
+    _working_dir = working_dir
+    _output_dir = output_dir
+    _sessions = sessions
+
+
+def _size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _busy(meeting_id: str) -> bool:
+    # Sessions still recording or being transcribed (again) are never touched
+    if _sessions is not None and meeting_id in _sessions:
+        return True
+    for job_id in (meeting_id, f"rerun:{meeting_id}"):
+        job = jobs.get_job(job_id)
+        if job is not None and job["state"] in (jobs.STATE_QUEUED, jobs.STATE_RUNNING):
+            return True
+    return False
+
+
+def _live_meetings() -> Dict[str, str]:
+    return {
+        name: os.path.join(_output_dir, name)
+        for name in sorted(os.listdir(_output_dir))
+        if name != archive.ARCHIVE_DIRNAME and os.path.isdir(os.path.join(_output_dir, name))
+    }
+
+
+def _has_transcript(meeting_path: str) -> bool:
+    return os.path.exists(os.path.join(meeting_path, catalog.TRANSCRIPTION_FILENAME))
+
+
+class _Sweep:
+    def __init__(self, dry_run: bool):
+        self.dry_run = dry_run
+        self.now = time.time()
+        self.start_times = catalog.start_times()
+        self.report: Dict[str, Any] = {
+            "started_at": self.now,
+            "dry_run": dry_run,
+            "reclaimed_bytes": {},
+            "meetings_deleted": [],
+            "meetings_archived": [],
+            "audio_deleted": [],
+            "audio_compacted": 0,
+            "transcripts_compacted": 0,
+            "chunk_dirs_deleted": [],
+            "errors": [],
+        }
+
+    def reclaimed(self, category: str, size: int) -> None:
+        # The report has the net change, negative when e.g. small meetings grow when archived.
+        # The counter only ever goes up.
+        reclaimed = self.report["reclaimed_bytes"]
+        reclaimed[category] = reclaimed.get(category, 0) + size
+        if not self.dry_run and size > 0:
+            metrics.storage_reclaimed_bytes.inc(size, category)
+
+    def error(self, message: str) -> None:
+        logging.warning(message)
+        self.report["errors"].append(message)
+
+    def age_sec(self, meeting_id: str, meeting_path: Optional[str] = None) -> Optional[float]:
+        start_time = self.start_times.get(meeting_id)
+        if not start_time and meeting_path is not None:
+            transcription_path = os.path.join(meeting_path, catalog.TRANSCRIPTION_FILENAME)
+            start_time = os.path.getmtime(transcription_path if os.path.exists(transcription_path) else meeting_path)
+        return self.now - start_time if start_time else None
+
+    def remove_tree(self, path: str) -> int:
+        size = _size(path)
+        if not self.dry_run:
+            shutil.rmtree(path, ignore_errors=True)
+        return size
+
+    def drop_archived(self, meetings: Dict[str, str], audio_only: bool) -> int:
+        by_bundle: Dict[str, Set[str]] = {}
+        for meeting_id, path in meetings.items():
+            by_bundle.setdefault(path, set()).add(meeting_id)
+        reclaimed = 0
+        for path, meeting_ids in by_bundle.items():
+            if self.dry_run:
+                sizes = archive.meeting_sizes(path)
+                reclaimed += sum(
+                    sizes[meeting_id][0] + (0 if audio_only else sizes[meeting_id][1]) for meeting_id in meeting_ids
+                )
+            else:
+                reclaimed += archive.drop(path, meeting_ids, audio_only)
+        return reclaimed
+
+    def clean_working_dir(self) -> None:
+        # Chunks are deleted once transcribed, but kept when transcription failed or the
+        # process died in between. The session id of a chunk directory is its job id.
+        archived = archive.archived()
+        for name in sorted(os.listdir(_working_dir)):
+            chunk_dir = os.path.join(_working_dir, name)
+            if not os.path.isdir(chunk_dir) or _busy(name):
+                continue
+            job = jobs.get_job(name)
+            if job is not None and job["state"] == jobs.STATE_FAILED:
+                expired = FAILED_SESSION_RETENTION_DAYS > 0 and (
+                    self.now - (job["finished_at"] or 0) > FAILED_SESSION_RETENTION_DAYS * DAY_SEC
+                )
+            else:
+                expired = (
+                    (_has_transcript(os.path.join(_output_dir, name)) or name in archived)
+                    and self.now - os.path.getmtime(chunk_dir) > LEFTOVER_CHUNKS_AGE_SEC
+                )
+            if expired:
+                self.reclaimed("working_dir", self.remove_tree(chunk_dir))
+                self.report["chunk_dirs_deleted"].append(name)
+
+    def enforce_retention(self) -> None:
+        if RETENTION_DAYS <= 0 and AUDIO_RETENTION_DAYS <= 0:
+            return
+        expired: Dict[str, Optional[str]] = {}
+        expired_audio: Dict[str, Optional[str]] = {}
+        archived = archive.archived()
+        candidates: Dict[str, Optional[str]] = {meeting_id: None for meeting_id in archived}
+        candidates.update(_live_meetings())
+        for meeting_id, meeting_path in candidates.items():
+            if meeting_path is not None and _busy(meeting_id):
+                continue
+            age = self.age_sec(meeting_id, meeting_path)
+            if age is None:
+                continue
+            if RETENTION_DAYS > 0 and age > RETENTION_DAYS * DAY_SEC:
+                expired[meeting_id] = meeting_path
+            elif AUDIO_RETENTION_DAYS > 0 and age > AUDIO_RETENTION_DAYS * DAY_SEC:
+                expired_audio[meeting_id] = meeting_path
+
+        for meeting_id, meeting_path in expired.items():
+            if meeting_path is not None:
+                self.reclaimed("retention", self.remove_tree(meeting_path))
+            if not self.dry_run:
+                catalog.remove_meeting(meeting_id)
+            self.report["meetings_deleted"].append(meeting_id)
+        self.reclaimed("retention", self.drop_archived(
+            {meeting_id: archived[meeting_id] for meeting_id in expired if meeting_id in archived}, audio_only=False
+        ))
+
+        for meeting_id, meeting_path in expired_audio.items():
+            audio_files = recordings.audio_files(meeting_path) if meeting_path is not None else []
+            for path in audio_files:
+                self.reclaimed("audio_retention", os.path.getsize(path) if self.dry_run else _remove_file(path))
+            if audio_files:
+                self.report["audio_deleted"].append(meeting_id)
+        archived_audio = {meeting_id: archived[meeting_id] for meeting_id in expired_audio if meeting_id in archived}
+        self.reclaimed("audio_retention", self.drop_archived(archived_audio, audio_only=True))
+        self.report["audio_deleted"].extend(archived_audio)
+
+    def compact(self) -> None:
+        compact_audio = COMPACT_AUDIO
+        if compact_audio and shutil.which("ffmpeg") is None:
+            compact_audio = False
+            self.error("ffmpeg not found, meeting audio is not compacted")
+        for meeting_id, meeting_path in _live_meetings().items():
+            if not _has_transcript(meeting_path) or _busy(meeting_id):
+                continue
+            self.compact_transcript(meeting_path)
+            if not compact_audio:
+                continue
+            for path in recordings.audio_files(meeting_path):
+                if recordings.is_compact(path):
+                    continue
+                if self.dry_run:
+                    self.report["audio_compacted"] += 1
+                    continue
+                size = os.path.getsize(path)
+                try:
+                    compacted = recordings.compact(path)
+                except subprocess.CalledProcessError as e:
+                    self.error(f"Failed to compact audio of meeting {meeting_id}: {e.stderr.decode().strip()}")
+                    continue
+                self.reclaimed("audio_compaction", size - os.path.getsize(compacted))
+                self.report["audio_compacted"] += 1
+
+    def compact_transcript(self, meeting_path: str) -> None:
+        # Transcripts used to be written indented, a third of their size being whitespace
+        path = os.path.join(meeting_path, catalog.TRANSCRIPTION_FILENAME)
+        with open(path, "rb") as f:
+            if f.read(2) != b"{\n":
+                return
+        self.report["transcripts_compacted"] += 1
+        if self.dry_run:
+            return
+        stat = os.stat(path)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        # Unchanged content, so the merged view and catalog stay valid
+        os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(tmp_path, path)
+        self.reclaimed("transcript_compaction", stat.st_size - os.path.getsize(path))
+
+    def archive_old_meetings(self) -> None:
+        if ARCHIVE_AFTER_DAYS <= 0:
+            return
+        by_month: Dict[str, List[str]] = {}
+        for meeting_id, meeting_path in _live_meetings().items():
+            if not _has_transcript(meeting_path) or _busy(meeting_id):
+                continue
+            age = self.age_sec(meeting_id, meeting_path)
+            if age is not None and age > ARCHIVE_AFTER_DAYS * DAY_SEC:
+                by_month.setdefault(archive.month_of(self.now - age), []).append(meeting_path)
+
+        for month, meeting_paths in sorted(by_month.items()):
+            path = archive.bundle_path(month)
+            size = sum(_size(meeting_path) for meeting_path in meeting_paths)
+            if self.dry_run:
+                self.report["meetings_archived"].extend(os.path.basename(p) for p in meeting_paths)
+                continue
+            bundle_size = os.path.getsize(path) if os.path.exists(path) else 0
+            try:
+                archive.add(path, meeting_paths)
+            except OSError as e:
+                self.error(f"Failed to archive {len(meeting_paths)} meetings to {path}: {e}")
+                continue
+            # Meetings already in the bundle were archived by a sweep that stopped before deleting them
+            for meeting_path in meeting_paths:
+                shutil.rmtree(meeting_path, ignore_errors=True)
+                self.report["meetings_archived"].append(os.path.basename(meeting_path))
+            self.reclaimed("archive", size - (os.path.getsize(path) - bundle_size))
+            logging.info(f"Archived {len(meeting_paths)} meetings to {path}")
+
+    def enforce_quota(self) -> None:
+        usage = _size(_output_dir)
+        quota = int(OUTPUT_QUOTA_MB * 1024 * 1024)
+        self.report["output_bytes"] = usage
+        self.report["quota_bytes"] = quota or None
+        if not quota or usage <= quota:
+            self.report["over_quota_bytes"] = 0
+            return
+
+        # Audio is the bulk of a meeting and the least needed once transcribed, oldest first
+        candidates = []
+        for meeting_id, meeting_path in _live_meetings().items():
+            if _busy(meeting_id):
+                continue
+            for path in recordings.audio_files(meeting_path):
+                candidates.append((self.start_times.get(meeting_id) or 0, meeting_id, path, os.path.getsize(path)))
+        for path in archive.bundle_paths():
+            for meeting_id, (audio_size, _) in archive.meeting_sizes(path).items():
+                if audio_size:
+                    candidates.append((self.start_times.get(meeting_id) or 0, meeting_id, path, audio_size))
+        candidates.sort(key=lambda candidate: candidate[0])
+
+        evicted: Dict[str, str] = {}
+        for _, meeting_id, path, size in candidates:
+            if usage <= quota:
+                break
+            if path.endswith(".zip"):
+                evicted[meeting_id] = path
+                usage -= size
+            else:
+                reclaimed = size if self.dry_run else _remove_file(path)
+                self.reclaimed("quota", reclaimed)
+                usage -= reclaimed
+            self.report["audio_deleted"].append(meeting_id)
+        reclaimed = self.drop_archived(evicted, audio_only=True)
+        self.reclaimed("quota", reclaimed)
+        self.report["output_bytes"] = _size(_output_dir) if not self.dry_run else usage
+        self.report["over_quota_bytes"] = max(self.report["output_bytes"] - quota, 0)
+        if self.report["over_quota_bytes"]:
+            self.error(
+                f"OUTPUT_DIR is {self.report['over_quota_bytes']} bytes over OUTPUT_QUOTA_MB with no audio left to delete"
+            )
+
+
+def _remove_file(path: str) -> int:
+    size = os.path.getsize(path)
+    os.remove(path)
+    return size
+
+
+def sweep(dry_run: bool = False) -> Optional[Dict[str, Any]]:
+    """Runs every lifecycle policy once and returns a report of the space reclaimed.
+
+    In order: chunks of failed or transcribed sessions are deleted from WORKING_DIR,
+    retention deletes old meetings or their audio, audio and transcripts are compacted,
+    old meetings move to their monthly archive and the oldest audio is deleted while
+    OUTPUT_DIR is over quota. Returns None if a sweep is already running in another process.
+    """
+    os.makedirs(archive.archive_dir(), exist_ok=True)
+    with open(os.path.join(archive.archive_dir(), LOCK_FILENAME), "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logging.info("Storage lifecycle sweep already running in another process")
+            return None
+        run = _Sweep(dry_run)
+        for step in (
+                run.clean_working_dir,
+                run.enforce_retention,
+                run.compact,
+                run.archive_old_meetings,
+                run.enforce_quota,
+        ):
+            try:
+                step()
+            except Exception as e:
+                logging.error(f"Storage lifecycle step {step.__name__} failed: {e}", exc_info=True)
+                run.report["errors"].append(f"{step.__name__}: {e}")
+        if not dry_run:
+            run.reclaimed("archive_cache", archive.prune_cache())
+
+    report = run.report
+    report["reclaimed_bytes_total"] = sum(report["reclaimed_bytes"].values())
+    report["duration_sec"] = round(time.time() - run.now, 3)
+    if not dry_run:
+        path = os.path.join(archive.archive_dir(), REPORT_FILENAME)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+    logging.info(
+        f"Storage lifecycle reclaimed {report['reclaimed_bytes_total']} bytes in {report['duration_sec']}s: "
+        f"{len(report['meetings_archived'])} meetings archived, {len(report['meetings_deleted'])} deleted, "
+        f"{report['audio_compacted']} audio files compacted"
+    )
+    return report
+
+
+def last_report() -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(archive.archive_dir(), REPORT_FILENAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the storage lifecycle policies once and print the report.")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be reclaimed without changing anything")
+    args = parser.parse_args()
+
+    working_dir = os.environ.get("WORKING_DIR", "./data")
+    output_dir = os.environ.get("OUTPUT_DIR", "./output")
+    os.makedirs(working_dir, exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
+    archive.init(output_dir)
+    catalog.init(os.path.join(output_dir, "catalog.db"), output_dir)
+    jobs.init(os.path.join(working_dir, "jobs.db"))
+    configure(working_dir, output_dir, session_store.SessionStore(os.path.join(working_dir, "sessions.journal")))
+    print(json.dumps(sweep(dry_run=args.dry_run), indent=2))
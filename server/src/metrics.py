@@ -0,0 +1,234 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+TRACE_HISTORY: int = int(os.environ.get("TRACE_HISTORY", 200))
+DISK_USAGE_TTL_SEC: float = 60.0
+
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_BUCKETS: Tuple[float, ...] = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+RTF_BUCKETS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *label_values: str) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(self.labels, values)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help_text: str, collect: Callable[[], Dict[LabelValues, float]],
+                 labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        try:
+            for values, value in self._collect().items():
+                lines.append(f"{self.name}{_format_labels(self.labels, values)} {value}")
+        except Exception as e:
+            logging.warning(f"Failed to collect metric {self.name}: {e}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...], labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            counts, totals = self._series.setdefault(
+                label_values, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            totals[0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, (counts, totals) in self._series.items():
+                for bound, count in zip(self.buckets, counts):
+                    le = f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le)} {count}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le)} {counts[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {totals[0]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {counts[-1]}")
+        return lines
+
+
+_registry: List[Any] = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+chunk_bytes = register(Counter("attendee_chunk_bytes_total", "Audio bytes received in session chunks"))
+screenshots_deduplicated = register(
+    Counter("attendee_screenshots_deduplicated_total", "Screenshots dropped as unchanged from the previous one")
+)
+upload_latency = register(
+    Histogram("attendee_upload_latency_seconds", "Upload request handling time", LATENCY_BUCKETS, ("endpoint",))
+)
+stage_duration = register(
+    Histogram("attendee_stage_duration_seconds", "Transcription pipeline stage duration", STAGE_BUCKETS, ("stage",))
+)
+finalize_duration = register(
+    Histogram("attendee_finalize_duration_seconds", "End to end finalize job duration", STAGE_BUCKETS, ("status",))
+)
+storage_reclaimed_bytes = register(
+    Counter("attendee_storage_reclaimed_bytes_total", "Disk space reclaimed by the storage lifecycle", ("category",))
+)
+real_time_factor = register(
+    Histogram("attendee_real_time_factor", "Finalize processing time divided by meeting audio length", RTF_BUCKETS)
+)
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+_disk_usage_cache: Dict[str, Tuple[float, int]] = {}
+
+
+def disk_usage(directories: Dict[str, str]) -> Dict[LabelValues, float]:
+    # Walking large output directories is slow, so sizes are refreshed at most once a minute
+    now = time.time()
+    usage: Dict[LabelValues, float] = {}
+    for label, path in directories.items():
+        cached = _disk_usage_cache.get(path)
+        if cached is None or now - cached[0] > DISK_USAGE_TTL_SEC:
+            cached = (now, _dir_size(path))
+            _disk_usage_cache[path] = cached
+        usage[(label,)] = cached[1]
+    return usage
+
+
+def timed(histogram: Histogram, *label_values: str):
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started, *label_values)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, *label_values)
+
+        return wrapper
+
+    return decorator
+
+
+_trace_local = threading.local()
+_traces: Deque[Dict[str, Any]] = deque(maxlen=TRACE_HISTORY)
+_traces_lock = threading.Lock()
+
+
+@contextmanager
+def trace(name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    record: Dict[str, Any] = {
+        "name": name,
+        "attributes": attributes,
+        "start": time.time(),
+        "spans": [],
+        "status": "ok",
+    }
+    _trace_local.current = record
+    started = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = str(e)
+        raise
+    finally:
+        _trace_local.current = None
+        record["duration"] = time.perf_counter() - started
+        with _traces_lock:
+            _traces.append(record)
+        logging.info(f"trace {json.dumps(record, default=str)}")
+
+
+def record_stage(name: str, elapsed: float) -> None:
+    stage_duration.observe(elapsed, name)
+    current: Optional[Dict[str, Any]] = getattr(_trace_local, "current", None)
+    if current is not None:
+        current["spans"].append({"name": name, "end": time.time(), "duration": elapsed})
+
+
+def recent_traces(limit: int = 50, slowest: bool = False) -> List[Dict[str, Any]]:
+    with _traces_lock:
+        traces = list(_traces)
+    if slowest:
+        traces.sort(key=lambda t: t["duration"], reverse=True)
+    else:
+        traces.reverse()
+    return traces[:limit]
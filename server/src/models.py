@@ -0,0 +1,216 @@
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+MODEL_IDLE_UNLOAD_SEC: float = float(os.environ.get("MODEL_IDLE_UNLOAD_SEC", 30 * 60))
+MODEL_MEMORY_BUDGET_MB: float = float(os.environ.get("MODEL_MEMORY_BUDGET_MB", 0))
+IDLE_CHECK_INTERVAL_SEC: float = 60.0
+
+# Loaded models by name, least recently used first. Each entry holds the model, its
+# measured (or estimated) size and how many callers are currently using it.
+_models: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+# Cache counters per model family, the part of the name before the first ":" (whisper, align, diarize)
+_stats: Dict[str, Dict[str, int]] = {}
+_lock = threading.Lock()
+# Loads are serialized, so the memory growth measured around one belongs to that model
+_load_lock = threading.Lock()
+_loading: Optional[str] = None
+_reaper: Optional[threading.Thread] = None
+
+
+def _memory_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    total = resident_pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        total += torch.cuda.memory_allocated() / 2 ** 20
+    return total
+
+
+def _free_memory() -> None:
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def _used_mb() -> float:
+    return sum(entry["size_mb"] for entry in _models.values())
+
+
+def _evict(name: str, reason: str) -> None:
+    entry = _models.pop(name)
+    logging.info(f"Unloaded model {name} ({entry['size_mb']:.0f} MB, {reason})")
+
+
+def _family(name: str) -> str:
+    return name.split(":", 1)[0]
+
+
+def _count(name: str, counter: str) -> None:
+    # Called with _lock held
+    counters = _stats.setdefault(_family(name), {"hits": 0, "misses": 0, "evictions": 0, "idle_unloads": 0})
+    counters[counter] += 1
+
+
+def _make_room(size_mb: float) -> None:
+    # Called with _lock held: evicts idle models, least recently used first, until
+    # size_mb more fits in the budget. Models in use are never evicted.
+    if MODEL_MEMORY_BUDGET_MB <= 0:
+        return
+    evicted = False
+    while _used_mb() + size_mb > MODEL_MEMORY_BUDGET_MB:
+        idle = next((name for name, entry in _models.items() if entry["in_use"] == 0), None)
+        if idle is None:
+            logging.warning(
+                f"Model memory budget of {MODEL_MEMORY_BUDGET_MB:.0f} MB exceeded, "
+                f"{_used_mb():.0f} MB is in use by running jobs"
+            )
+            break
+        _evict(idle, "memory budget")
+        _count(idle, "evictions")
+        evicted = True
+    if evicted:
+        _free_memory()
+
+
+def trim(prefix: str, keep: int) -> None:
+    # Keeps at most `keep` idle models whose name starts with prefix
+    with _lock:
+        names = [name for name, entry in _models.items() if name.startswith(prefix) and entry["in_use"] == 0]
+        evicted = names[: max(len(names) - keep, 0)]
+        for name in evicted:
+            _evict(name, "cache size")
+            _count(name, "evictions")
+    if evicted:
+        _free_memory()
+
+
+def _reap_idle_models() -> None:
+    while True:
+        time.sleep(IDLE_CHECK_INTERVAL_SEC)
+        now = time.time()
+        with _lock:
+            idle = [
+                name
+                for name, entry in _models.items()
+                if entry["in_use"] == 0 and now - entry["last_used"] > MODEL_IDLE_UNLOAD_SEC
+            ]
+            for name in idle:
+                _evict(name, f"idle for over {MODEL_IDLE_UNLOAD_SEC:.0f}s")
+                _count(name, "idle_unloads")
+        if idle:
+            _free_memory()
+
+
+def _start_reaper() -> None:
+    global _reaper
+    if _reaper is None and MODEL_IDLE_UNLOAD_SEC > 0:
+        _reaper = threading.Thread(target=_reap_idle_models, name="model-reaper", daemon=True)
+        _reaper.start()
+
+
+def _acquire(name: str, loader: Callable[[], Any], size_estimate_mb: float) -> Any:
+    global _loading
+    with _lock:
+        entry = _models.get(name)
+        if entry is not None:
+            entry["in_use"] += 1
+            _models.move_to_end(name)
+            _count(name, "hits")
+            return entry["model"]
+    with _load_lock:
+        with _lock:
+            # Another thread may have loaded it while we waited
+            entry = _models.get(name)
+            if entry is not None:
+                entry["in_use"] += 1
+                _models.move_to_end(name)
+                _count(name, "hits")
+                return entry["model"]
+            _count(name, "misses")
+            _make_room(size_estimate_mb)
+        _loading = name
+        before = _memory_mb()
+        try:
+            model = loader()
+        finally:
+            _loading = None
+        after = _memory_mb()
+        measured = after - before if before is not None and after is not None else 0.0
+        size_mb = measured if measured > 0 else size_estimate_mb
+        with _lock:
+            _models[name] = {"model": model, "size_mb": size_mb, "last_used": time.time(), "in_use": 1}
+        logging.info(f"Loaded model {name} ({size_mb:.0f} MB, {_used_mb():.0f} MB in use by models)")
+    _start_reaper()
+    return model
+
+
+def _release(name: str) -> None:
+    with _lock:
+        entry = _models.get(name)
+        if entry is not None:
+            entry["in_use"] -= 1
+            entry["last_used"] = time.time()
+
+
+@contextmanager
+def use(name: str, loader: Callable[[], Any], size_estimate_mb: float = 0.0) -> Iterator[Any]:
+    """Yields the model called name, loading it with loader if it is not resident.
+
+    The model cannot be unloaded while it is in use. size_estimate_mb is used to make
+    room in the memory budget before loading, and when the loaded size can't be measured.
+    """
+    model = _acquire(name, loader, size_estimate_mb)
+    try:
+        yield model
+    finally:
+        _release(name)
+
+
+def stats(family: Optional[str] = None) -> Dict[str, int]:
+    """Cache hits, misses, evictions and idle unloads of one model family, or of all of them."""
+    with _lock:
+        families = [_stats[family]] if family in _stats else [] if family is not None else list(_stats.values())
+        return {
+            counter: sum(counters[counter] for counters in families)
+            for counter in ("hits", "misses", "evictions", "idle_unloads")
+        }
+
+
+def memory_by_model() -> Dict[str, float]:
+    with _lock:
+        return {name: entry["size_mb"] for name, entry in _models.items()}
+
+
+def status() -> Dict[str, Any]:
+    now = time.time()
+    totals = stats()
+    with _lock:
+        return {
+            "loaded": [
+                {
+                    "name": name,
+                    "size_mb": round(entry["size_mb"], 1),
+                    "in_use": entry["in_use"],
+                    "idle_sec": 0.0 if entry["in_use"] else round(now - entry["last_used"], 1),
+                }
+                for name, entry in _models.items()
+            ],
+            "loading": _loading,
+            "memory_mb": round(_used_mb(), 1),
+            "budget_mb": MODEL_MEMORY_BUDGET_MB or None,
+            "idle_unload_sec": MODEL_IDLE_UNLOAD_SEC or None,
+            **totals,
+            "by_family": {family: dict(counters) for family, counters in _stats.items()},
+        }
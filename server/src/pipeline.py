@@ -0,0 +1,193 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import catalog
+import events
+import jobs
+import metrics
+import profiles
+import recordings
+import session_store
+import speakers
+import streaming
+import transcribe
+import views
+import word_timings
+
+_working_dir: str = "./data"
+_sessions: Optional[session_store.SessionStore] = None
+# Session whose job runs on the current worker thread, for stage events
+_job_local = threading.local()
+
+
+def configure(working_dir: str, sessions: session_store.SessionStore) -> None:
+    global _working_dir, _sessions
+    _working_dir = working_dir
+    _sessions = sessions
+
+
+def publish_stage(name: str, elapsed: float) -> None:
+    session_id: Optional[str] = getattr(_job_local, "session_id", None)
+    if session_id is not None:
+        events.publish(session_id, "stage", {"stage": name, "duration": elapsed})
+
+
+def _segment_publisher(session_id: str) -> streaming.WindowListener:
+    def publish_segments(segments: List[Dict[str, Any]], transcribed_until: float) -> None:
+        segments = [{key: value for key, value in segment.items() if key != "words"} for segment in segments]
+        events.publish(
+            session_id, "segments", {"segments": segments, "transcribed_until": transcribed_until}
+        )
+
+    return publish_segments
+
+
+def _choose_profile(pending_sec: float) -> profiles.Profile:
+    other_jobs = max(jobs.queue_depth() - 1, 0)
+    return profiles.choose(pending_sec, other_jobs, jobs.TRANSCRIBE_WORKERS, transcribe.device_config()[0])
+
+
+def _window_job(job: Dict[str, Any]) -> None:
+    session_id: str = job["payload"]["session_id"]
+    if jobs.get_job(session_id) is not None:
+        logging.info(f"Session {session_id} already ended, finalize will transcribe the rest")
+        return
+    session = _sessions.get(session_id, job["payload"]["session"])
+    chunk_dir = os.path.join(_working_dir, session_id)
+    if not os.path.isdir(chunk_dir):
+        logging.info(f"Session {session_id} was discarded, nothing to transcribe")
+        return
+    state = streaming.transcribe_available(
+        chunk_dir,
+        session_store.contiguous_chunks(session),
+        on_window=_segment_publisher(session_id),
+        choose_profile=_choose_profile,
+    )
+    logging.info(
+        f"Session {session_id} transcribed up to {state['transcribed_until']:.1f}s"
+    )
+
+
+def _identify_speakers(session_id: str, result: Dict[str, Any]) -> None:
+    embeddings = result.pop("speaker_embeddings", None)
+    if not speakers.SPEAKER_INDEX or not embeddings:
+        return
+    try:
+        speakers.apply(result, speakers.identify(session_id, embeddings))
+    except Exception as e:
+        # Speakers keep their per-meeting labels, the transcript is still written
+        logging.warning(f"Failed to identify speakers of session {session_id}: {e}", exc_info=True)
+
+
+def _keep_audio(session_id: str, chunks: List[str], meeting_path: str) -> None:
+    try:
+        recordings.keep(chunks, meeting_path)
+    except OSError as e:
+        # The transcript is still worth having without playback
+        logging.warning(f"Failed to keep the audio of session {session_id}: {e}")
+
+
+def _finalize_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    session_id: str = job["payload"].get("session_id", job["id"])
+    session: Dict[str, Any] = job["payload"]["session"]
+    out_path: str = job["payload"]["output"]
+    rerun: bool = job["payload"].get("kind") == "rerun"
+    result: Dict[str, Any]
+    chunk_dir = os.path.join(_working_dir, session_id)
+
+    try:
+        logging.info(
+            f"Starting transcription of {len(session['chunks'])} audio chunks for session {session_id} -> {out_path}"
+        )
+        if rerun:
+            streaming.reset_state(chunk_dir)
+        result = streaming.finalize(
+            chunk_dir,
+            session["chunks"],
+            on_window=_segment_publisher(session_id),
+            choose_profile=(lambda _: profiles.default()) if rerun else _choose_profile,
+        )
+        _identify_speakers(session_id, result)
+        words = word_timings.pop_words(result)
+        transcribe.write_json(result, session, out_path)
+        word_timings.write(words, os.path.dirname(out_path))
+        logging.info(f"Finished transcription for session {session_id} -> {out_path}")
+        _keep_audio(session_id, session["chunks"], os.path.dirname(out_path))
+        catalog.upsert_meeting(session_id, session)
+        catalog.index_segments(session_id, result.get("segments", []))
+        views.write_merged_view(result, os.path.dirname(out_path))
+    except Exception:
+        logging.info(
+            f"Preserved session chunk directory {chunk_dir} for debugging."
+        )
+        raise
+
+    if not rerun and profiles.RERUN_AT_QUALITY and not profiles.is_best(result.get("profile") or ""):
+        # The audio is kept until the meeting is transcribed again with the best profile
+        jobs.enqueue(
+            f"rerun:{session_id}",
+            {"kind": "rerun", "session_id": session_id, "session": session, "output": out_path},
+            priority=jobs.PRIORITY_BACKGROUND,
+        )
+        logging.info(f"Session {session_id} finalized with profile {result['profile']}, queued a re-run at quality.")
+        return result
+
+    try:
+        shutil.rmtree(chunk_dir)
+        logging.info(f"Deleted session chunk directory {chunk_dir}")
+    except Exception as e:
+        logging.warning(
+            f"Failed to delete session chunk directory {chunk_dir}: {e}"
+        )
+    logging.info(f"Session {session_id} finalized.")
+    return result
+
+
+def run_job(job: Dict[str, Any]) -> None:
+    kind: str = job["payload"].get("kind", "finalize")
+    session_id: str = job["payload"].get("session_id", job["id"])
+    started = time.perf_counter()
+    status = "error"
+    _job_local.session_id = session_id
+    events.publish(
+        session_id, "job", {"kind": kind, "state": jobs.STATE_RUNNING, "attempt": job["attempts"] + 1}
+    )
+    try:
+        with metrics.trace(kind, session_id=session_id, attempt=job["attempts"] + 1) as span:
+            if kind == "window":
+                _window_job(job)
+            else:
+                result = _finalize_job(job)
+                audio_sec = result.get("duration")
+                span["attributes"]["audio_sec"] = audio_sec
+                span["attributes"]["profile"] = result.get("profile")
+                if audio_sec:
+                    elapsed = time.perf_counter() - started
+                    metrics.real_time_factor.observe(elapsed / audio_sec)
+                    # Incremental finalize only transcribes the tail, its time says nothing of the profile's speed,
+                    # and neither does the time spent loading models
+                    if result.get("profile") in profiles.PROFILES and (
+                            kind == "rerun" or not streaming.INCREMENTAL_TRANSCRIPTION
+                    ):
+                        load_sec = sum(
+                            stage["duration"] for stage in span["spans"] if stage["name"] in transcribe.MODEL_LOAD_STAGES
+                        )
+                        profiles.record(profiles.get(result["profile"]), audio_sec, elapsed - load_sec)
+                events.publish(session_id, "finalized", {
+                    "duration": audio_sec,
+                    "language": result.get("language"),
+                    "segments": len(result.get("segments", [])),
+                    "profile": result.get("profile"),
+                })
+        status = "ok"
+    except Exception as e:
+        events.publish(session_id, "job", {"kind": kind, "state": jobs.STATE_FAILED, "error": str(e)})
+        raise
+    finally:
+        _job_local.session_id = None
+        if kind == "finalize":
+            metrics.finalize_duration.observe(time.perf_counter() - started, status)
@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional
+
+# "auto" picks a profile per job, any profile name pins it
+TRANSCRIPTION_PROFILE: str = os.environ.get("TRANSCRIPTION_PROFILE", "auto")
+# Profiles to add or override, a JSON object of profile name to Profile fields
+TRANSCRIPTION_PROFILES_FILE: Optional[str] = os.environ.get("TRANSCRIPTION_PROFILES_FILE")
+# Transcripts should be ready this long after a meeting ends, queueing included
+TRANSCRIPTION_SLO_SEC: float = float(os.environ.get("TRANSCRIPTION_SLO_SEC", 60 * 60))
+# Re-run meetings transcribed below the best profile once the queue is empty
+RERUN_AT_QUALITY: bool = os.environ.get("RERUN_AT_QUALITY", "").lower() in ("1", "true", "yes")
+# Assumed length of queued meetings until one has been transcribed
+DEFAULT_MEETING_SEC: float = 30 * 60
+# Weight of the latest job in the moving averages of real-time factor and meeting length
+EWMA_WEIGHT: float = 0.3
+
+
+class Profile(NamedTuple):
+    name: str
+    model: str
+    # None uses the device default (float16 on GPU, int8 on CPU)
+    compute_type: Optional[str] = None
+    batch_size: int = 16
+    beam_size: int = 5
+    diarize: bool = True
+    # CPU threads of the Whisper model, 0 keeps the whisperx default
+    threads: int = 0
+    # Expected processing time per second of audio, until measured
+    rtf_cpu: float = 1.0
+    rtf_gpu: float = 0.1
+
+
+def _builtin_profiles() -> List[Profile]:
+    # Best quality first: the policy takes the first profile that meets the SLO
+    return [
+        Profile("quality", os.environ.get("WHISPERX_MODEL", "large-v2"), rtf_cpu=1.5, rtf_gpu=0.1),
+        Profile("balanced", "medium", rtf_cpu=0.6, rtf_gpu=0.06),
+        Profile("fast", "small", beam_size=1, diarize=False, rtf_cpu=0.15, rtf_gpu=0.03),
+    ]
+
+
+def _load_profiles() -> Dict[str, Profile]:
+    profiles = {profile.name: profile for profile in _builtin_profiles()}
+    if TRANSCRIPTION_PROFILES_FILE:
+        with open(TRANSCRIPTION_PROFILES_FILE, "r", encoding="utf-8") as f:
+            overrides: Dict[str, Dict[str, Any]] = json.load(f)
+        for name, fields in overrides.items():
+            if name in profiles:
+                profiles[name] = profiles[name]._replace(**fields)
+            else:
+                profiles[name] = Profile(name=name, **fields)
+    if TRANSCRIPTION_PROFILE != "auto" and TRANSCRIPTION_PROFILE not in profiles:
+        raise ValueError(f"Unknown TRANSCRIPTION_PROFILE {TRANSCRIPTION_PROFILE}, expected one of {list(profiles)}")
+    return profiles
+
+
+PROFILES: Dict[str, Profile] = _load_profiles()
+
+_lock = threading.Lock()
+_measured_rtf: Dict[str, float] = {}
+_meeting_sec: float = DEFAULT_MEETING_SEC
+
+
+def get(name: str) -> Profile:
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown transcription profile {name}, expected one of {list(PROFILES)}") from None
+
+
+def default() -> Profile:
+    return PROFILES[TRANSCRIPTION_PROFILE] if TRANSCRIPTION_PROFILE != "auto" else next(iter(PROFILES.values()))
+
+
+def rank(name: str) -> int:
+    # 0 for the best profile, profiles that are no longer configured rank last
+    names = list(PROFILES)
+    return names.index(name) if name in names else len(names)
+
+
+def is_best(name: str) -> bool:
+    return rank(name) <= rank(default().name)
+
+
+def expected_rtf(profile: Profile, device: str) -> float:
+    with _lock:
+        measured = _measured_rtf.get(profile.name)
+    if measured is not None:
+        return measured
+    return profile.rtf_gpu if device == "cuda" else profile.rtf_cpu
+
+
+def record(profile: Profile, audio_sec: float, elapsed_sec: float) -> None:
+    """Updates the real-time factor of profile and the typical meeting length with a finished job."""
+    global _meeting_sec
+    if audio_sec <= 0:
+        return
+    with _lock:
+        rtf = elapsed_sec / audio_sec
+        previous = _measured_rtf.get(profile.name)
+        _measured_rtf[profile.name] = rtf if previous is None else (1 - EWMA_WEIGHT) * previous + EWMA_WEIGHT * rtf
+        _meeting_sec = (1 - EWMA_WEIGHT) * _meeting_sec + EWMA_WEIGHT * audio_sec
+
+
+def choose(audio_sec: float, queued_jobs: int, workers: int, device: str) -> Profile:
+    """Picks the best profile expected to finish within TRANSCRIPTION_SLO_SEC.
+
+    The estimate is the time to transcribe audio_sec seconds plus the queued_jobs other
+    jobs in the queue, shared by workers, so profiles get faster as the backlog grows
+    and better again once it drains. When no profile meets the SLO the fastest one is used.
+    """
+    if TRANSCRIPTION_PROFILE != "auto":
+        return PROFILES[TRANSCRIPTION_PROFILE]
+    with _lock:
+        meeting_sec = _meeting_sec
+    backlog_sec = queued_jobs * meeting_sec / max(workers, 1) + audio_sec
+    fastest: Optional[Profile] = None
+    for profile in PROFILES.values():
+        estimate = backlog_sec * expected_rtf(profile, device)
+        if estimate <= TRANSCRIPTION_SLO_SEC:
+            logging.info(
+                f"Using transcription profile {profile.name} for {audio_sec:.0f}s of audio, "
+                f"{queued_jobs} other jobs queued, done in about {estimate:.0f}s"
+            )
+            return profile
+        if fastest is None or expected_rtf(profile, device) < expected_rtf(fastest, device):
+            fastest = profile
+    logging.warning(
+        f"No transcription profile meets the {TRANSCRIPTION_SLO_SEC:.0f}s SLO with {queued_jobs} other jobs queued, "
+        f"using the fastest, {fastest.name}"
+    )
+    return fastest
+
+
+def status() -> Dict[str, Any]:
+    with _lock:
+        measured = dict(_measured_rtf)
+    return {
+        "mode": TRANSCRIPTION_PROFILE,
+        "slo_sec": TRANSCRIPTION_SLO_SEC,
+        "rerun_at_quality": RERUN_AT_QUALITY,
+        "profiles": [
+            {**profile._asdict(), "measured_rtf": measured.get(profile.name)} for profile in PROFILES.values()
+        ],
+    }
@@ -0,0 +1,110 @@
+import logging
+import os
+import shutil
+import subprocess
+from typing import List, Optional
+
+# Keep the meeting audio next to its transcript, for playback in the viewer
+KEEP_AUDIO: bool = os.environ.get("KEEP_AUDIO", "true").lower() in ("1", "true", "yes")
+AUDIO_BASENAME = "audio"
+# Bitrate of the Opus audio kept meetings are re-encoded to, plenty for speech
+AUDIO_OPUS_BITRATE: str = os.environ.get("AUDIO_OPUS_BITRATE", "24k")
+COMPACT_EXT = ".opus"
+
+MEDIA_TYPES = {
+    ".webm": "audio/webm",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg",
+    ".m4a": "audio/mp4",
+    ".mp4": "audio/mp4",
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+}
+
+
+def _concatenate(chunks: List[str], path: str) -> None:
+    with open(path, "wb") as out:
+        for chunk in chunks:
+            with open(chunk, "rb") as f:
+                shutil.copyfileobj(f, out, 1024 * 1024)
+
+
+def keep(chunks: List[str], meeting_path: str) -> Optional[str]:
+    """Stores the recorded audio of a meeting as a single file in meeting_path, as recorded.
+
+    The chunks are remuxed without re-encoding, which adds the duration and seek index
+    that recorder blobs lack, so players can seek in it. Without ffmpeg the chunks are
+    concatenated as they are.
+    """
+    if not KEEP_AUDIO or not chunks:
+        return None
+    ext = os.path.splitext(chunks[0])[1].lower() or ".webm"
+    path = os.path.join(meeting_path, AUDIO_BASENAME + ext)
+    # ffmpeg picks the container from the extension
+    tmp_path = os.path.join(meeting_path, f"{AUDIO_BASENAME}.tmp{ext}")
+    try:
+        subprocess.run(
+            ["ffmpeg", "-nostdin", "-v", "error", "-y", "-i", "concat:" + "|".join(chunks), "-vn", "-c", "copy", tmp_path],
+            capture_output=True,
+            check=True,
+        )
+    except FileNotFoundError:
+        logging.warning("ffmpeg not found, keeping the meeting audio without a seek index")
+        _concatenate(chunks, tmp_path)
+    except subprocess.CalledProcessError as e:
+        logging.warning(f"Failed to remux the meeting audio, keeping it as recorded: {e.stderr.decode()}")
+        _concatenate(chunks, tmp_path)
+    os.replace(tmp_path, path)
+    for previous in audio_files(meeting_path):
+        # A meeting transcribed again replaces its audio, compacted or not
+        if previous != path:
+            os.remove(previous)
+    logging.info(f"Kept {os.path.getsize(path)} bytes of meeting audio at {path}")
+    return path
+
+
+def is_compact(path: str) -> bool:
+    return path.endswith(COMPACT_EXT)
+
+
+def compact(path: str) -> str:
+    """Re-encodes meeting audio to mono Opus at AUDIO_OPUS_BITRATE, replacing the original.
+
+    Raises FileNotFoundError without ffmpeg and CalledProcessError if it fails.
+    """
+    meeting_path = os.path.dirname(path)
+    target = os.path.join(meeting_path, AUDIO_BASENAME + COMPACT_EXT)
+    tmp_path = os.path.join(meeting_path, f"{AUDIO_BASENAME}.tmp{COMPACT_EXT}")
+    subprocess.run(
+        [
+            "ffmpeg", "-nostdin", "-v", "error", "-y", "-i", path, "-vn", "-ac", "1",
+            "-c:a", "libopus", "-b:a", AUDIO_OPUS_BITRATE, "-application", "voip", tmp_path,
+        ],
+        capture_output=True,
+        check=True,
+    )
+    os.replace(tmp_path, target)
+    if path != target:
+        os.remove(path)
+    return target
+
+
+def audio_files(meeting_path: str) -> List[str]:
+    try:
+        names = sorted(os.listdir(meeting_path))
+    except FileNotFoundError:
+        return []
+    return [
+        os.path.join(meeting_path, name)
+        for name in names
+        if os.path.splitext(name)[0] == AUDIO_BASENAME and os.path.splitext(name)[1].lower() in MEDIA_TYPES
+    ]
+
+
+def find(meeting_path: str) -> Optional[str]:
+    files = audio_files(meeting_path)
+    return files[0] if files else None
+
+
+def media_type(path: str) -> str:
+    return MEDIA_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
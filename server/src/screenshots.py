@@ -0,0 +1,241 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image, features
+
+SCREENSHOT_DEDUPE: bool = os.environ.get("SCREENSHOT_DEDUPE", "true").lower() in ("1", "true", "yes")
+# Frames whose hashes differ in at most this many of HASH_SIZE * HASH_SIZE bits are duplicates
+SCREENSHOT_HASH_DISTANCE: int = int(os.environ.get("SCREENSHOT_HASH_DISTANCE", 10))
+THUMBNAIL_WIDTH: int = int(os.environ.get("THUMBNAIL_WIDTH", 320))
+MANIFEST_CACHE_SIZE: int = int(os.environ.get("MANIFEST_CACHE_SIZE", 64))
+HASH_SIZE: int = 8
+# Frames whose mean colour differs by more than this in any channel are never duplicates
+COLOUR_DISTANCE: int = 16
+
+MANIFEST_FILENAME = "screenshots.jsonl"
+
+THUMBNAIL_DIR = "thumbnails"
+THUMBNAIL_FORMAT, THUMBNAIL_EXT, THUMBNAIL_MEDIA_TYPE = (
+    ("WEBP", "webp", "image/webp") if features.check("webp") else ("JPEG", "jpg", "image/jpeg")
+)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumbnails")
+
+
+class FrameHash(NamedTuple):
+    dhash: int
+    colour: Tuple[int, int, int]
+
+
+class Manifest(NamedTuple):
+    entries: List[Dict[str, Any]]
+    by_filename: Dict[str, Dict[str, Any]]
+    mtime_ns: int
+    size: int
+
+
+_cache_lock = threading.Lock()
+_cache: "OrderedDict[str, Manifest]" = OrderedDict()
+
+
+def frame_hash(image: Image.Image) -> FrameHash:
+    # Difference hash: whether each cell of a downscaled grayscale frame is brighter
+    # than its right neighbour. Robust to compression noise, sensitive to content.
+    # Uniform frames all hash to zero, so the mean colour tells blank slides apart.
+    small = image.convert("RGB").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX)
+    pixels = np.asarray(small.convert("L"), dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    colour = np.asarray(small, dtype=np.float64).mean(axis=(0, 1)).round().astype(int)
+    return FrameHash(int.from_bytes(np.packbits(bits).tobytes(), "big"), tuple(int(c) for c in colour))
+
+
+def _hash_file(path: str) -> Optional[FrameHash]:
+    try:
+        with Image.open(path) as image:
+            return frame_hash(image)
+    except OSError as e:
+        logging.warning(f"Failed to hash screenshot {path}: {e}")
+        return None
+
+
+def _entry_hash(meeting_path: str, entry: Dict[str, Any]) -> Optional[FrameHash]:
+    # Entries written before the hash size changed, or without a colour, are hashed again
+    phash, colour = entry.get("phash"), entry.get("colour")
+    if phash and colour and len(phash) == HASH_SIZE * HASH_SIZE // 4:
+        return FrameHash(int(phash, 16), tuple(colour))
+    return _hash_file(os.path.join(meeting_path, entry["filename"]))
+
+
+def is_duplicate(current: FrameHash, previous: FrameHash) -> bool:
+    return (
+        (current.dhash ^ previous.dhash).bit_count() <= SCREENSHOT_HASH_DISTANCE
+        and max(abs(a - b) for a, b in zip(current.colour, previous.colour)) <= COLOUR_DISTANCE
+    )
+
+
+def check_duplicate(meeting_path: str, data: bytes) -> Tuple[bool, FrameHash]:
+    """Returns whether the frame in data is a near duplicate of the meeting's last
+    kept screenshot, and the frame's perceptual hash."""
+    with Image.open(BytesIO(data)) as image:
+        current = frame_hash(image)
+    entries = load_manifest(meeting_path).entries
+    if not entries:
+        return False, current
+    previous = _entry_hash(meeting_path, entries[-1])
+    if previous is None:
+        return False, current
+    return is_duplicate(current, previous), current
+
+
+def screenshot_filename(timestamp: float, ext: str, meeting_path: str) -> str:
+    # Millisecond resolution, so screenshots taken in the same minute no longer collide
+    stem = "screenshot_" + datetime.fromtimestamp(timestamp).strftime("%Y.%m.%d.%H.%M.%S.%f")[:-3]
+    filename = f"{stem}.{ext}"
+    suffix = 1
+    while os.path.exists(os.path.join(meeting_path, filename)):
+        filename = f"{stem}_{suffix}.{ext}"
+        suffix += 1
+    return filename
+
+
+def add_screenshot(
+        meeting_path: str,
+        filename: str,
+        data: bytes,
+        timestamp: float,
+        start_time: float,
+        phash: Optional[FrameHash] = None,
+) -> Dict[str, Any]:
+    entry = {
+        "filename": filename,
+        "timestamp": timestamp,
+        "relative_time": timestamp - start_time,
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "phash": f"{phash.dhash:0{HASH_SIZE * HASH_SIZE // 4}x}" if phash is not None else None,
+        "colour": list(phash.colour) if phash is not None else None,
+    }
+    with open(os.path.join(meeting_path, MANIFEST_FILENAME), "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    return entry
+
+
+def _legacy_entries(meeting_path: str) -> List[Dict[str, Any]]:
+    # Meetings recorded before the manifest existed: timestamps come from the
+    # minute resolution filenames, or the file modification time
+    start_time = 0.0
+    transcription_path = os.path.join(meeting_path, "transcription.json")
+    if os.path.exists(transcription_path):
+        with open(transcription_path, "r", encoding="utf-8") as f:
+            start_time = json.load(f).get("session", {}).get("start_time", 0)
+    entries = []
+    for filename in os.listdir(meeting_path):
+        if not (filename.startswith("screenshot_") and filename.endswith(".png")):
+            continue
+        path = os.path.join(meeting_path, filename)
+        try:
+            parts = filename[len("screenshot_"):-len(".png")].split(".")
+            timestamp = datetime(*map(int, parts[:5])).timestamp()
+        except (TypeError, ValueError):
+            timestamp = os.path.getmtime(path)
+        entries.append({
+            "filename": filename,
+            "timestamp": timestamp,
+            "relative_time": timestamp - start_time,
+            "size": os.path.getsize(path),
+            "sha256": None,
+            "phash": None,
+            "colour": None,
+        })
+    entries.sort(key=lambda entry: entry["timestamp"])
+    return entries
+
+
+def _write_legacy_manifest(meeting_path: str) -> None:
+    entries = _legacy_entries(meeting_path)
+    path = os.path.join(meeting_path, MANIFEST_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+    # Don't clobber a manifest created by an upload in the meantime
+    if not os.path.exists(path):
+        os.replace(tmp_path, path)
+        logging.info(f"Created screenshot manifest for {meeting_path} with {len(entries)} screenshots")
+    else:
+        os.remove(tmp_path)
+
+
+def load_manifest(meeting_path: str) -> Manifest:
+    """Screenshots of a meeting in capture order, cached until the manifest changes."""
+    path = os.path.join(meeting_path, MANIFEST_FILENAME)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        if not os.path.isdir(meeting_path):
+            return Manifest([], {}, 0, 0)
+        _write_legacy_manifest(meeting_path)
+        stat = os.stat(path)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached is not None and cached.mtime_ns == stat.st_mtime_ns and cached.size == stat.st_size:
+            _cache.move_to_end(path)
+            return cached
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.endswith("\n"):
+                entries.append(json.loads(line))
+    entries.sort(key=lambda entry: entry["timestamp"])
+    manifest = Manifest(entries, {entry["filename"]: entry for entry in entries}, stat.st_mtime_ns, stat.st_size)
+    with _cache_lock:
+        _cache[path] = manifest
+        _cache.move_to_end(path)
+        while len(_cache) > MANIFEST_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return manifest
+
+
+def thumbnail_path(meeting_path: str, filename: str) -> str:
+    return os.path.join(meeting_path, THUMBNAIL_DIR, f"{os.path.splitext(filename)[0]}.{THUMBNAIL_EXT}")
+
+
+def make_thumbnail(meeting_path: str, filename: str) -> str:
+    path = thumbnail_path(meeting_path, filename)
+    tmp_path = path + ".tmp"
+    # The screenshot is opened first, so a meeting deleted in the meantime is not recreated
+    with Image.open(os.path.join(meeting_path, filename)) as image:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        image.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 4))
+        image.convert("RGB").save(tmp_path, format=THUMBNAIL_FORMAT, quality=75)
+    os.replace(tmp_path, path)
+    return path
+
+
+def get_thumbnail(meeting_path: str, filename: str) -> str:
+    # Thumbnails are written in the background after upload, and older meetings have
+    # none, so a missing one is generated on demand
+    path = thumbnail_path(meeting_path, filename)
+    if os.path.exists(path):
+        return path
+    return make_thumbnail(meeting_path, filename)
+
+
+def _make_thumbnail_logged(meeting_path: str, filename: str) -> None:
+    try:
+        make_thumbnail(meeting_path, filename)
+    except Exception as e:
+        logging.warning(f"Failed to create thumbnail for {filename} in {meeting_path}: {e}")
+
+
+def schedule_thumbnail(meeting_path: str, filename: str) -> None:
+    _executor.submit(_make_thumbnail_logged, meeting_path, filename)
@@ -1,23 +1,44 @@
 import asyncio
+import fcntl
+import gzip
+import hashlib
 import json
 import logging
 import os
+import re
 import shutil
 import warnings
 from contextlib import asynccontextmanager
 from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
 from typing import Optional, Dict, Any, List
 from uuid import uuid4
 
 import aiofiles
 import uvicorn
-from fastapi import FastAPI, UploadFile, File, Header, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-
+from pydantic import BaseModel, Field
+
+import archive
+import catalog
+import events
+import jobs
+import lifecycle
+import metrics
+import models
+import pipeline
+import profiles
+import recordings
+import screenshots
+import session_store
+import speakers
+import streaming
 import transcribe
+import views
+import word_timings
 
 warnings.filterwarnings(
     "ignore", message="resource_tracker: There appear to be .* leaked semaphore objects"
@@ -26,18 +47,69 @@ warnings.filterwarnings(
 WORKING_DIR: str = os.environ.get("WORKING_DIR", "./data")
 OUTPUT_DIR: str = os.environ.get("OUTPUT_DIR", "./output")
 PORT: int = int(os.environ.get("PORT", 8017))
+# "all" transcribes in this process, "api" only queues jobs for separate src/worker.py processes
+ROLE: str = os.environ.get("ROLE", "all").lower()
+# Models are loaded on first use unless preloading is requested
+PRELOAD_MODELS: bool = os.environ.get("PRELOAD_MODELS", "").lower() in ("1", "true", "yes")
 
 os.makedirs(WORKING_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-sessions: Dict[str, Dict[str, Any]] = {}
+SESSION_REAPER_INTERVAL_SEC: float = 600.0
+SCREENSHOT_CLOCK_SKEW_SEC: float = 300.0
+STREAM_WRITE_BUFFER_BYTES: int = 1024 * 1024
+
+sessions = session_store.SessionStore(os.path.join(WORKING_DIR, "sessions.journal"))
+
+
+async def _reap_idle_sessions() -> None:
+    while True:
+        await asyncio.sleep(SESSION_REAPER_INTERVAL_SEC)
+        try:
+            for session_id in await asyncio.to_thread(sessions.idle_sessions):
+                logging.info(f"Session {session_id} has been idle too long, finalizing")
+                await asyncio.to_thread(_end_session, session_id)
+        except Exception as e:
+            logging.error(f"Failed to reap idle sessions: {e}", exc_info=True)
+
+
+async def _run_storage_lifecycle() -> None:
+    if lifecycle.LIFECYCLE_INTERVAL_SEC <= 0:
+        return
+    while True:
+        await asyncio.sleep(lifecycle.LIFECYCLE_INTERVAL_SEC)
+        try:
+            await asyncio.to_thread(lifecycle.sweep)
+        except Exception as e:
+            logging.error(f"Storage lifecycle sweep failed: {e}", exc_info=True)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    logging.info("Pre-initializing model in background...")
-    asyncio.create_task(transcribe.ensure_model_ready())
+    if ROLE != "api" and PRELOAD_MODELS:
+        logging.info("Pre-initializing models in background...")
+        asyncio.create_task(transcribe.preload_models())
+    archive.init(OUTPUT_DIR)
+    catalog.init(os.path.join(OUTPUT_DIR, "catalog.db"), OUTPUT_DIR)
+    jobs.init(os.path.join(WORKING_DIR, "jobs.db"))
+    events.init(os.path.join(WORKING_DIR, "events.db"))
+    speakers.init(os.path.join(WORKING_DIR, "speakers"))
+    jobs.recover()
+    _recover_sessions()
+    pipeline.configure(WORKING_DIR, sessions)
+    lifecycle.configure(WORKING_DIR, OUTPUT_DIR, sessions)
+    if ROLE != "api":
+        jobs.start_workers(pipeline.run_job)
+        transcribe.add_stage_listener(metrics.record_stage)
+        transcribe.add_stage_listener(pipeline.publish_stage)
+    reaper = asyncio.create_task(_reap_idle_sessions())
+    event_pump = asyncio.create_task(events.pump())
+    storage_lifecycle = asyncio.create_task(_run_storage_lifecycle())
     yield
+    storage_lifecycle.cancel()
+    event_pump.cancel()
+    reaper.cancel()
+    jobs.stop_workers()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -60,10 +132,6 @@ def _normalize_title(title: str) -> str:
     )
 
 
-def _timestamp_str() -> str:
-    return datetime.now().strftime("%Y.%m.%d.%H.%M")
-
-
 def _get_ext_from_mime(mime: str) -> str:
     if mime == "audio/webm":
         return "webm"
@@ -80,217 +148,301 @@ def _get_ext_from_mime(mime: str) -> str:
     )
 
 
+metrics.register(
+    metrics.Gauge(
+        "attendee_active_sessions",
+        "Sessions currently recording",
+        lambda: {(): len(sessions)},
+    )
+)
+metrics.register(
+    metrics.Gauge(
+        "attendee_jobs",
+        "Transcription jobs by state",
+        lambda: {(state,): count for state, count in jobs.counts_by_state().items()},
+        ("state",),
+    )
+)
+metrics.register(
+    metrics.Gauge(
+        "attendee_disk_usage_bytes",
+        "Disk usage of the working and output directories",
+        lambda: metrics.disk_usage({"working": WORKING_DIR, "output": OUTPUT_DIR}),
+        ("directory",),
+    )
+)
+metrics.register(
+    metrics.Gauge(
+        "attendee_event_subscribers",
+        "Clients connected to the event streams of this process",
+        lambda: {(): events.subscriber_count()},
+    )
+)
+metrics.register(
+    metrics.Gauge(
+        "attendee_model_memory_mb",
+        "Memory held by loaded models in this process",
+        lambda: {(name,): size for name, size in models.memory_by_model().items()},
+        ("model",),
+    )
+)
+
+
 class SessionStartRequest(BaseModel):
     title: str
 
 
+class SpeakerNameRequest(BaseModel):
+    # Names are shown in every transcript the speaker appears in, so no markup or control characters
+    name: Optional[str] = Field(None, max_length=100, pattern=r"^[^\x00-\x1f\x7f<>&]*$")
+
+
 @app.get("/", response_class=HTMLResponse)
 @app.get("/index.html", response_class=HTMLResponse)
 async def serve_index():
     return FileResponse("static/index.html")
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health")
+def get_health() -> Dict[str, Any]:
+    # Models load on demand, so the server is ready as soon as it accepts requests
+    return {
+        "status": "ok",
+        "role": ROLE,
+        "whisper_model": profiles.default().model,
+        "transcription": profiles.status(),
+        "models": models.status(),
+        "align_cache": transcribe.align_cache_info(),
+        "jobs": jobs.counts_by_state(),
+    }
+
+
+@app.get("/api/storage")
+def get_storage():
+    return {"interval_sec": lifecycle.LIFECYCLE_INTERVAL_SEC, "last_sweep": lifecycle.last_report()}
+
+
+@app.get("/api/traces")
+async def get_traces(
+    limit: int = Query(50, ge=1, le=1000),
+    slowest: bool = False,
+):
+    return {"traces": metrics.recent_traces(limit=limit, slowest=slowest)}
+
+
 @app.get("/api/meetings")
-async def get_meetings():
-    meetings = []
-    
-    if not os.path.exists(OUTPUT_DIR):
-        return {"meetings": meetings}
-    
-    for meeting_dir in os.listdir(OUTPUT_DIR):
-        meeting_path = os.path.join(OUTPUT_DIR, meeting_dir)
-        if not os.path.isdir(meeting_path):
-            continue
-            
-        transcription_path = os.path.join(meeting_path, "transcription.json")
-        if not os.path.exists(transcription_path):
-            continue
-            
-        try:
-            async with aiofiles.open(transcription_path, "r", encoding="utf-8") as f:
-                transcription_data = json.loads(await f.read())
-                
-            session = transcription_data.get("session", {})
-            title = session.get("title", meeting_dir)
-            start_time = session.get("start_time", 0)
-            
-            screenshots = []
-            for file in os.listdir(meeting_path):
-                if file.startswith("screenshot_") and file.endswith(".png"):
-                    screenshots.append(file)
-            
-            screenshots.sort()
-            middle_screenshot = None
-            if screenshots:
-                middle_index = len(screenshots) // 2
-                middle_screenshot = screenshots[middle_index]
-            
-            meetings.append({
-                "id": meeting_dir,
-                "title": title,
-                "date": start_time,
-                "screenshot": middle_screenshot
-            })
-        except Exception as e:
-            logging.error(f"Error processing meeting {meeting_dir}: {e}")
-            continue
-    
-    meetings.sort(key=lambda x: x["date"], reverse=True)
-    return {"meetings": meetings}
+def get_meetings(
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    sort: str = Query("date", pattern="^(date|title)$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+):
+    meetings, total = catalog.list_meetings(
+        limit=limit, offset=offset, sort=sort, order=order, since=since, until=until
+    )
+    return {"meetings": meetings, "total": total, "offset": offset, "limit": limit}
 
 
-@app.get("/api/meetings/{meeting_id}/transcription")
-async def get_transcription(meeting_id: str):
+@app.get("/api/search")
+def search_transcripts(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+):
+    return {"query": q, "results": catalog.search(q, limit=limit, offset=offset)}
+
+
+@app.get("/api/speakers")
+def get_speakers():
+    return {"speakers": speakers.list_identities()}
+
+
+@app.put("/api/speakers/{identity}")
+def name_speaker(identity: str, request: SpeakerNameRequest):
+    try:
+        return speakers.rename(identity, (request.name or "").strip() or None)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Speaker not found")
+
+
+def _meeting_path(meeting_id: str, audio: bool = False) -> str:
+    # Meetings moved to the monthly archives are read from an extracted copy
     meeting_path = os.path.join(OUTPUT_DIR, meeting_id)
-    transcription_path = os.path.join(meeting_path, "transcription.json")
-    
-    if not os.path.exists(transcription_path):
-        raise HTTPException(status_code=404, detail="Transcription not found")
-    
+    if os.path.isdir(meeting_path):
+        return meeting_path
+    return archive.restore(meeting_id, audio=audio) or meeting_path
+
+
+@app.get("/api/meetings/{meeting_id}/transcription")
+def get_transcription(meeting_id: str, request: Request):
+    meeting_path = _meeting_path(meeting_id)
+
     try:
-        async with aiofiles.open(transcription_path, "r", encoding="utf-8") as f:
-            transcription_data = json.loads(await f.read())
-        
-        # Merge consecutive segments from the same speaker
-        if "segments" in transcription_data and transcription_data["segments"]:
-            merged_segments = []
-            current_segment = None
-            
-            for segment in transcription_data["segments"]:
-                if current_segment is None:
-                    current_segment = segment.copy()
-                elif current_segment["speaker"] == segment["speaker"]:
-                    # Merge with current segment
-                    current_segment["end"] = segment["end"]
-                    current_segment["text"] += "\n" + segment["text"]
-                else:
-                    # Different speaker, save current and start new
-                    merged_segments.append(current_segment)
-                    current_segment = segment.copy()
-            
-            # Don't forget the last segment
-            if current_segment is not None:
-                merged_segments.append(current_segment)
-            
-            transcription_data["segments"] = merged_segments
-        
-        return transcription_data
+        view = views.get_merged_view(meeting_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Transcription not found")
     except Exception as e:
         logging.error(f"Error reading transcription for {meeting_id}: {e}")
         raise HTTPException(status_code=500, detail="Error reading transcription")
 
+    headers = {
+        "ETag": view.etag,
+        "Last-Modified": formatdate(view.mtime, usegmt=True),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        if view.etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+    elif if_modified_since is not None:
+        try:
+            if int(view.mtime) <= parsedate_to_datetime(if_modified_since).timestamp():
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=view.body_gzip, media_type="application/json", headers=headers)
+    return Response(
+        content=gzip.decompress(view.body_gzip), media_type="application/json", headers=headers
+    )
 
-@app.get("/api/meetings/{meeting_id}/screenshot")
-async def get_screenshot(meeting_id: str):
-    meeting_path = os.path.join(OUTPUT_DIR, meeting_id)
-    
-    if not os.path.exists(meeting_path):
-        raise HTTPException(status_code=404, detail="Meeting not found")
-    
-    screenshots = []
-    for file in os.listdir(meeting_path):
-        if file.startswith("screenshot_") and file.endswith(".png"):
-            screenshots.append(file)
-    
-    if not screenshots:
-        raise HTTPException(status_code=404, detail="No screenshots found")
-    
-    screenshots.sort()
-    middle_index = len(screenshots) // 2
-    screenshot_path = os.path.join(meeting_path, screenshots[middle_index])
-    
-    return FileResponse(screenshot_path, media_type="image/png")
 
+@app.get("/api/meetings/{meeting_id}/audio")
+def get_audio(meeting_id: str):
+    # FileResponse answers Range requests, so players fetch only the part they play or seek to
+    path = recordings.find(_meeting_path(meeting_id, audio=True))
+    if path is None:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    return FileResponse(path, media_type=recordings.media_type(path), headers={"Cache-Control": "no-cache"})
 
-@app.get("/api/meetings/{meeting_id}/screenshots")
-async def get_screenshots_list(meeting_id: str):
-    meeting_path = os.path.join(OUTPUT_DIR, meeting_id)
-    
-    if not os.path.exists(meeting_path):
+
+@app.get("/api/meetings/{meeting_id}/words")
+def get_words(
+    meeting_id: str,
+    start: float = Query(0.0, ge=0, description="Words starting at or after this many seconds"),
+    end: Optional[float] = Query(None, ge=0, description="Words starting before this many seconds, all by default"),
+):
+    try:
+        words = word_timings.read(_meeting_path(meeting_id), start, end)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Word timings not found")
+    except (OSError, ValueError) as e:
+        logging.error(f"Error reading word timings for {meeting_id}: {e}")
+        raise HTTPException(status_code=500, detail="Error reading word timings")
+    return {"start": start, "end": end, "words": words}
+
+
+def _event_stream(session_id: str, last_event_id: Optional[int], types: Optional[str]) -> StreamingResponse:
+    wanted = set(types.split(",")) if types else None
+
+    async def body():
+        # Browsers wait this long before reconnecting, resuming from the last event id
+        yield "retry: 3000\n\n"
+        async for event in events.subscribe(session_id, last_event_id):
+            if event is None:
+                yield ": keepalive\n\n"
+            elif wanted is None or event["type"] in wanted:
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/events")
+async def get_events(
+    types: Optional[str] = Query(None, description="Comma separated event types, all types by default"),
+    since: Optional[int] = Query(None, ge=0, description="Replay events after this event id"),
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID"),
+):
+    return _event_stream(events.ALL, last_event_id if last_event_id is not None else since, types)
+
+
+@app.get("/api/meetings/{meeting_id}/events")
+async def get_meeting_events(
+    meeting_id: str,
+    types: Optional[str] = Query(None, description="Comma separated event types, all types by default"),
+    since: Optional[int] = Query(None, ge=0, description="Replay events after this event id"),
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID"),
+):
+    return _event_stream(meeting_id, last_event_id if last_event_id is not None else since, types)
+
+
+def _thumbnail_response(meeting_path: str, filename: str) -> FileResponse:
+    try:
+        path = screenshots.get_thumbnail(meeting_path, filename)
+    except OSError as e:
+        logging.warning(f"Failed to create thumbnail for {filename} in {meeting_path}: {e}")
+        return FileResponse(os.path.join(meeting_path, filename), media_type="image/png")
+    return FileResponse(
+        path, media_type=screenshots.THUMBNAIL_MEDIA_TYPE, headers={"Cache-Control": "max-age=86400"}
+    )
+
+
+def _screenshot_manifest(meeting_id: str) -> screenshots.Manifest:
+    meeting_path = _meeting_path(meeting_id)
+    if not os.path.isdir(meeting_path):
         raise HTTPException(status_code=404, detail="Meeting not found")
-    
-    transcription_path = os.path.join(meeting_path, "transcription.json")
-    if not os.path.exists(transcription_path):
-        raise HTTPException(status_code=404, detail="Transcription not found")
-    
     try:
-        async with aiofiles.open(transcription_path, "r", encoding="utf-8") as f:
-            transcription_data = json.loads(await f.read())
-        
-        session = transcription_data.get("session", {})
-        start_time = session.get("start_time", 0)
-        
-        screenshots = []
-        for file in os.listdir(meeting_path):
-            if file.startswith("screenshot_") and file.endswith(".png"):
-                # Parse timestamp from filename like "screenshot_2025.07.16.12.15.png"
-                timestamp_str = file.replace("screenshot_", "").replace(".png", "")
-                try:
-                    # Convert timestamp format 2025.07.16.12.15 to datetime
-                    parts = timestamp_str.split(".")
-                    if len(parts) >= 5:
-                        year, month, day, hour, minute = map(int, parts[:5])
-                        from datetime import datetime
-                        screenshot_time = datetime(year, month, day, hour, minute)
-                        screenshot_epoch = screenshot_time.timestamp()
-                        
-                        screenshots.append({
-                            "filename": file,
-                            "timestamp": screenshot_epoch,
-                            "relative_time": screenshot_epoch - start_time
-                        })
-                except (ValueError, IndexError):
-                    # If parsing fails, use file modification time as fallback
-                    file_path = os.path.join(meeting_path, file)
-                    file_mtime = os.path.getmtime(file_path)
-                    screenshots.append({
-                        "filename": file,
-                        "timestamp": file_mtime,
-                        "relative_time": file_mtime - start_time
-                    })
-        
-        # Sort by timestamp
-        screenshots.sort(key=lambda x: x["timestamp"])
-        
-        return {"screenshots": screenshots}
-    except Exception as e:
+        return screenshots.load_manifest(meeting_path)
+    except (OSError, ValueError) as e:
         logging.error(f"Error reading screenshots for {meeting_id}: {e}")
         raise HTTPException(status_code=500, detail="Error reading screenshots")
 
 
-@app.get("/api/meetings/{meeting_id}/screenshots/{filename}")
-async def get_screenshot_file(meeting_id: str, filename: str):
-    meeting_path = os.path.join(OUTPUT_DIR, meeting_id)
-    screenshot_path = os.path.join(meeting_path, filename)
-    
-    if not os.path.exists(screenshot_path) or not filename.startswith("screenshot_"):
+def _screenshot_entry(meeting_id: str, filename: str) -> Dict[str, Any]:
+    entry = _screenshot_manifest(meeting_id).by_filename.get(filename)
+    if entry is None:
         raise HTTPException(status_code=404, detail="Screenshot not found")
-    
-    return FileResponse(screenshot_path, media_type="image/png")
+    return entry
 
 
-async def transcribe_chunk_async(audio_path: str, output_path: str) -> None:
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(
-        None, transcribe.transcribe_and_write_json, audio_path, output_path
-    )
+@app.get("/api/meetings/{meeting_id}/screenshot")
+def get_screenshot(meeting_id: str):
+    entries = _screenshot_manifest(meeting_id).entries
+    if not entries:
+        raise HTTPException(status_code=404, detail="No screenshots found")
+    middle = entries[len(entries) // 2]
+    return _thumbnail_response(_meeting_path(meeting_id), middle["filename"])
 
 
-async def merge_transcripts(transcript_files: List[str], out_path: str) -> None:
-    merged: Dict[str, Any] = {"segments": []}
-    for f in sorted(transcript_files):
-        async with aiofiles.open(f, "r", encoding="utf-8") as infile:
-            data = json.loads(await infile.read())
-            if "segments" in data:
-                merged["segments"].extend(data["segments"])
-    async with aiofiles.open(out_path, "w", encoding="utf-8") as outfile:
-        await outfile.write(json.dumps(merged, indent=2, ensure_ascii=False))
-    for f in transcript_files:
-        try:
-            os.remove(f)
-            logging.info(f"Deleted partial transcript file {f}")
-        except Exception as e:
-            logging.warning(f"Failed to delete partial transcript file {f}: {e}")
+@app.get("/api/meetings/{meeting_id}/screenshots")
+def get_screenshots_list(meeting_id: str):
+    return {
+        "screenshots": [
+            {
+                **entry,
+                "thumbnail": f"/api/meetings/{meeting_id}/screenshots/{entry['filename']}/thumbnail",
+            }
+            for entry in _screenshot_manifest(meeting_id).entries
+        ]
+    }
+
+
+@app.get("/api/meetings/{meeting_id}/screenshots/{filename}")
+def get_screenshot_file(meeting_id: str, filename: str):
+    _screenshot_entry(meeting_id, filename)
+    media_type = "image/jpeg" if filename.endswith(".jpg") else "image/png"
+    return FileResponse(os.path.join(_meeting_path(meeting_id), filename), media_type=media_type)
+
+
+@app.get("/api/meetings/{meeting_id}/screenshots/{filename}/thumbnail")
+def get_screenshot_thumbnail(meeting_id: str, filename: str):
+    _screenshot_entry(meeting_id, filename)
+    return _thumbnail_response(_meeting_path(meeting_id), filename)
 
 
 @app.post("/sessions/start")
@@ -298,56 +450,216 @@ def start_session(req: SessionStartRequest) -> Dict[str, str]:
     logging.info(f"/sessions/start called with title: {req.title}")
     if not req.title:
         raise HTTPException(status_code=400, detail="Session title required")
+    if jobs.is_saturated():
+        raise HTTPException(
+            status_code=503,
+            detail="Transcription queue is full, try again later",
+            headers={"Retry-After": "60"},
+        )
     session_id: str = str(uuid4())
     norm_title: str = _normalize_title(req.title)
-    sessions[session_id] = {
+    sessions.start(session_id, {
         "title": req.title,
         "norm_title": norm_title,
         "start_time": datetime.now().timestamp(),
         "chunks": [],
         "screenshots": [],
-    }
+    })
     logging.info(f"Started session {session_id} with title '{req.title}'")
     return {"session_id": session_id}
 
 
+def _schedule_window(session_id: str) -> None:
+    if streaming.INCREMENTAL_TRANSCRIPTION:
+        jobs.enqueue(
+            f"window:{session_id}",
+            {"kind": "window", "session_id": session_id, "session": sessions[session_id]},
+        )
+
+
+def _stream_chunk(session: Dict[str, Any]) -> Optional[str]:
+    # Streamed sessions have a single chunk that the stream is appended to
+    return next(
+        (path for path in session["chunks"] if os.path.basename(path).startswith("audio_stream_")), None
+    )
+
+
 @app.post("/sessions/{session_id}/chunk")
-async def upload_chunk(
+@metrics.timed(metrics.upload_latency, "chunk")
+def upload_chunk(
     session_id: str,
     file: UploadFile = File(...),
-) -> Dict[str, str]:
+    seq: Optional[int] = Form(None, ge=0),
+    sha256: Optional[str] = Form(None),
+) -> Dict[str, Any]:
     mime_type = file.content_type
     logging.info(
-        f"/sessions/{session_id}/chunk called. filename={file.filename}, content_type={mime_type}"
+        f"/sessions/{session_id}/chunk called. filename={file.filename}, content_type={mime_type}, seq={seq}"
     )
     if not mime_type:
         raise HTTPException(
             status_code=400, detail="content_type missing from uploaded file"
         )
     mime_type_simple: str = mime_type.split(";")[0].strip()
-    if session_id not in sessions:
+    session = sessions.get(session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
     ext: str = _get_ext_from_mime(mime_type_simple)
-    ts: str = _timestamp_str()
+    if _stream_chunk(session) is not None:
+        raise HTTPException(status_code=409, detail="Session audio is streamed, append to its stream instead")
+    received_sha256: Optional[str] = session.get("chunk_seqs", {}).get(str(seq)) if seq is not None else None
+    if received_sha256 is not None and sha256 is not None and sha256.lower() == received_sha256:
+        return {"status": "duplicate", "seq": seq, "sha256": received_sha256}
+
     chunk_dir: str = os.path.join(WORKING_DIR, session_id)
     os.makedirs(chunk_dir, exist_ok=True)
-    chunk_fname: str = f"audio_{ts}_{session_id}.{ext}"
-    chunk_fpath: str = os.path.join(chunk_dir, chunk_fname)
-    async with aiofiles.open(chunk_fpath, "wb") as out:
-        while True:
-            chunk = await file.read(1024 * 1024)
-            if not chunk:
-                break
-            await out.write(chunk)
-    sessions[session_id]["chunks"].append(chunk_fpath)
-    logging.info(f"Saved audio chunk for session {session_id}: {chunk_fpath}")
-    return {"status": "ok", "path": os.path.relpath(chunk_fpath, WORKING_DIR)}
+    # Written under a temporary name, so an interrupted upload never becomes a chunk
+    tmp_path: str = os.path.join(chunk_dir, f".upload_{uuid4().hex}.part")
+    digest = hashlib.sha256()
+    try:
+        with open(tmp_path, "wb") as out:
+            while True:
+                chunk = file.file.read(1024 * 1024)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                metrics.chunk_bytes.inc(len(chunk))
+        content_sha256 = digest.hexdigest()
+        if sha256 is not None and sha256.lower() != content_sha256:
+            raise HTTPException(status_code=400, detail="Chunk content does not match its sha256")
+        if received_sha256 is not None:
+            if received_sha256 == content_sha256:
+                return {"status": "duplicate", "seq": seq, "sha256": content_sha256}
+            raise HTTPException(
+                status_code=409, detail=f"Chunk {seq} was already received with different content"
+            )
+
+        def place(chunk_seq: int) -> str:
+            path = os.path.join(chunk_dir, f"audio_{chunk_seq:08d}_{session_id}.{ext}")
+            os.replace(tmp_path, path)
+            return path
+
+        if seq is None:
+            # Numbered once the chunk is complete, under the journal lock, as uploads may run concurrently
+            try:
+                seq, chunk_fpath = sessions.add_next_chunk(session_id, place, content_sha256)
+            except KeyError:
+                raise HTTPException(status_code=404, detail="Session not found")
+        else:
+            chunk_fpath = place(seq)
+            sessions.add_chunk(session_id, chunk_fpath, seq, content_sha256)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logging.info(f"Saved audio chunk {seq} for session {session_id}: {chunk_fpath}")
+    events.publish(session_id, "chunk", {"seq": seq, "size": os.path.getsize(chunk_fpath)})
+    _schedule_window(session_id)
+    return {
+        "status": "ok",
+        "seq": seq,
+        "sha256": content_sha256,
+        "path": os.path.relpath(chunk_fpath, WORKING_DIR),
+    }
+
+
+@app.get("/sessions/{session_id}/stream")
+def get_stream_offset(session_id: str) -> Dict[str, Any]:
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    stream_path = _stream_chunk(session)
+    return {"session_id": session_id, "offset": os.path.getsize(stream_path) if stream_path else 0}
+
+
+@app.post("/sessions/{session_id}/stream")
+@metrics.timed(metrics.upload_latency, "stream")
+async def append_stream(
+    session_id: str,
+    request: Request,
+    offset: int = Query(0, ge=0, description="Position of the request body in the session's audio stream"),
+) -> Dict[str, Any]:
+    # The raw request body is appended to the session's audio file as it arrives, without
+    # multipart parsing or a temporary copy. A body may be a single recorder blob or a
+    # stream lasting the whole meeting. Bytes below the current end of the stream were
+    # already received and are skipped, so a client can resume from the returned offset.
+    mime_type = request.headers.get("content-type")
+    if not mime_type:
+        raise HTTPException(status_code=400, detail="Content-Type missing from audio stream")
+    ext: str = _get_ext_from_mime(mime_type.split(";")[0].strip())
+    # The journal, job queue and event log block on file locks and fsync, never on the event loop
+    session = await asyncio.to_thread(sessions.get, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    chunk_dir: str = os.path.join(WORKING_DIR, session_id)
+    os.makedirs(chunk_dir, exist_ok=True)
+    stream_path = _stream_chunk(session) or os.path.join(chunk_dir, f"audio_stream_{session_id}.{ext}")
+    if session["chunks"] and stream_path not in session["chunks"]:
+        raise HTTPException(status_code=409, detail="Session audio is uploaded in chunks, not streamed")
+
+    received = 0
+    async with aiofiles.open(stream_path, "ab") as out:
+        try:
+            fcntl.flock(out.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise HTTPException(status_code=409, detail="Another upload is appending to this stream")
+        size = os.fstat(out.fileno()).st_size
+        if offset > size:
+            raise HTTPException(
+                status_code=409, detail={"message": "Audio stream has a gap", "offset": size}
+            )
+        # Read again under the stream lock, another request may have added it meanwhile
+        if stream_path not in (await asyncio.to_thread(sessions.get, session_id, session))["chunks"]:
+            await asyncio.to_thread(sessions.add_chunk, session_id, stream_path)
+        skip = size - offset
+        buffer = bytearray()
+        try:
+            async for data in request.stream():
+                if skip:
+                    skipped = min(skip, len(data))
+                    data = data[skipped:]
+                    skip -= skipped
+                buffer += data
+                received += len(data)
+                if len(buffer) >= STREAM_WRITE_BUFFER_BYTES:
+                    await out.write(bytes(buffer))
+                    buffer.clear()
+        finally:
+            # Whatever arrived before a disconnect is kept, the client resumes after it
+            if buffer:
+                await out.write(bytes(buffer))
+            metrics.chunk_bytes.inc(received)
+    size += received
+    logging.info(f"Appended {received} bytes to the audio stream of session {session_id}, now {size} bytes")
+    await asyncio.to_thread(events.publish, session_id, "chunk", {"offset": size, "size": received})
+    await asyncio.to_thread(_schedule_window, session_id)
+    return {"status": "ok", "offset": size, "received": received}
+
+
+@app.get("/sessions/{session_id}/chunks")
+def get_session_chunks(
+    session_id: str,
+    expected: Optional[int] = Query(None, ge=0, description="Number of chunks the client has recorded"),
+) -> Dict[str, Any]:
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    received = session_store.received_chunks(session)
+    missing = session_store.missing_chunks(session, expected)
+    return {
+        "session_id": session_id,
+        "received": received,
+        "missing": missing,
+        "next_seq": max(expected or 0, received[-1] + 1 if received else 0),
+    }
 
 
 @app.post("/sessions/{session_id}/screenshot")
+@metrics.timed(metrics.upload_latency, "screenshot")
 def upload_screenshot(
     session_id: str,
     file: UploadFile = File(...),
+    captured_at: Optional[float] = Form(None),
 ) -> Dict[str, str]:
     mime_type = file.content_type
     logging.info(
@@ -361,72 +673,179 @@ def upload_screenshot(
     if session_id not in sessions:
         raise HTTPException(status_code=404, detail="Session not found")
     ext: str = _get_ext_from_mime(mime_type_simple)
-    ts: str = _timestamp_str()
+    data: bytes = file.file.read()
     session_dir: str = os.path.join(OUTPUT_DIR, session_id)
     os.makedirs(session_dir, exist_ok=True)
-    fname: str = f"screenshot_{ts}.{ext}"
+    frame_hash: Optional[screenshots.FrameHash] = None
+    if screenshots.SCREENSHOT_DEDUPE:
+        try:
+            duplicate, frame_hash = screenshots.check_duplicate(session_dir, data)
+        except OSError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+        if duplicate:
+            metrics.screenshots_deduplicated.inc()
+            logging.info(f"Dropped screenshot for session {session_id}, unchanged since the previous one")
+            return {"status": "duplicate"}
+    timestamp: float = datetime.now().timestamp()
+    # Prefer the capture time sent by the extension, unless its clock is clearly off
+    if captured_at is not None and abs(captured_at - timestamp) < SCREENSHOT_CLOCK_SKEW_SEC:
+        timestamp = captured_at
+    fname: str = screenshots.screenshot_filename(timestamp, ext, session_dir)
     fpath: str = os.path.join(session_dir, fname)
     with open(fpath, "wb") as out:
-        shutil.copyfileobj(file.file, out)
-    sessions[session_id]["screenshots"].append(fpath)
+        out.write(data)
+    screenshots.add_screenshot(
+        session_dir, fname, data, timestamp, sessions[session_id]["start_time"], frame_hash
+    )
+    sessions.add_screenshot(session_id, fpath)
+    catalog.add_screenshot(session_id, fname)
+    screenshots.schedule_thumbnail(session_dir, fname)
     logging.info(f"Received screenshot for session {session_id}: {fpath}")
     return {"status": "ok", "path": os.path.relpath(fpath, OUTPUT_DIR)}
 
 
-@app.post("/sessions/{session_id}/end")
-async def end_session(session_id: str, background_tasks: BackgroundTasks):
-    logging.info(f"/sessions/{session_id}/end called.")
-    if session_id not in sessions:
-        raise HTTPException(status_code=404, detail="Session not found")
-    session = sessions[session_id]
+def _enqueue_finalize(session_id: str, session: Dict[str, Any]) -> str:
     session_dir = os.path.join(OUTPUT_DIR, session_id)
     os.makedirs(session_dir, exist_ok=True)
     out_path = os.path.join(session_dir, "transcription.json")
+    job = jobs.enqueue(
+        session_id, {"kind": "finalize", "session": session, "output": out_path}
+    )
+    logging.info(f"Session {session_id} ended. Finalization job {job['state']}.")
+    events.publish(session_id, "job", {"kind": "finalize", "state": job["state"]})
+    return out_path
 
-    async def finalize():
+
+def _end_session(session_id: str) -> str:
+    # The job is queued before the session is closed in the journal, so a crash in
+    # between leaves an active session that recovery recognizes as already ended.
+    out_path = _enqueue_finalize(session_id, sessions[session_id])
+    sessions.end(session_id)
+    return out_path
+
+
+def _chunk_seq(chunk_path: str) -> Optional[int]:
+    match = re.match(r"audio_(\d+)_", os.path.basename(chunk_path))
+    return int(match.group(1)) if match else None
+
+
+def _chunk_files(chunk_dir: str) -> List[str]:
+    return sorted(
+        os.path.join(chunk_dir, f) for f in os.listdir(chunk_dir) if f.startswith("audio_")
+    )
+
+
+def _recover_sessions() -> None:
+    for session_id in list(sessions):
+        if jobs.get_job(session_id) is not None:
+            sessions.end(session_id)
+            continue
         chunk_dir = os.path.join(WORKING_DIR, session_id)
-        logging.info(
-            f"Starting combination of {len(session['chunks'])} audio chunks for session {session_id}"
-        )
-        concat_path = os.path.join(chunk_dir, f"concat_{session_id}.webm")
-        with open(concat_path, "wb") as outfile:
-            for chunk_path in session["chunks"]:
-                with open(chunk_path, "rb") as infile:
-                    outfile.write(infile.read())
-        logging.info(
-            f"Finished combination of audio chunks for session {session_id}, combined audio written to {concat_path}"
-        )
+        if os.path.isdir(chunk_dir):
+            known_chunks = set(sessions[session_id]["chunks"])
+            for chunk_path in _chunk_files(chunk_dir):
+                if chunk_path not in known_chunks:
+                    logging.info(f"Recovered unjournaled chunk {chunk_path}")
+                    with open(chunk_path, "rb") as f:
+                        content_sha256 = hashlib.file_digest(f, "sha256").hexdigest()
+                    sessions.add_chunk(session_id, chunk_path, _chunk_seq(chunk_path), content_sha256)
+        logging.info(f"Resuming session {session_id} after restart")
+
+    for session_id in sessions.idle_sessions():
+        logging.info(f"Session {session_id} was abandoned before restart, finalizing")
+        _end_session(session_id)
+
+    # Chunk directories from before the journal existed, stranded without a transcript
+    for session_id in os.listdir(WORKING_DIR):
+        chunk_dir = os.path.join(WORKING_DIR, session_id)
+        if (
+            not os.path.isdir(chunk_dir)
+            or session_id in sessions
+            or jobs.get_job(session_id) is not None
+            or os.path.exists(os.path.join(OUTPUT_DIR, session_id, "transcription.json"))
+        ):
+            continue
+        chunks = _chunk_files(chunk_dir)
+        if not chunks:
+            continue
+        logging.info(f"Requeueing stranded session {session_id} with {len(chunks)} chunks")
+        _enqueue_finalize(session_id, {
+            "title": session_id,
+            "norm_title": session_id,
+            "start_time": min(os.path.getmtime(c) for c in chunks),
+            "chunks": chunks,
+            "screenshots": [],
+        })
 
-        success = False
-        try:
-            logging.info(f"Starting transcription for {concat_path} -> {out_path}")
-            await transcribe.transcribe_and_write_json(session, concat_path, out_path)
-            logging.info(f"Finished transcription for {concat_path} -> {out_path}")
-            success = True
-        except Exception as e:
-            logging.error(f"Transcription failed for {concat_path}: {e}", exc_info=True)
+    sessions.compact()
 
-        if success:
-            import shutil
 
-            try:
-                shutil.rmtree(chunk_dir)
-                logging.info(f"Deleted session chunk directory {chunk_dir}")
-            except Exception as e:
-                logging.warning(
-                    f"Failed to delete session chunk directory {chunk_dir}: {e}"
-                )
-        else:
-            logging.info(
-                f"Preserved session chunk directory {chunk_dir} for debugging."
+@app.post("/sessions/{session_id}/end")
+def end_session(
+    session_id: str,
+    chunks: Optional[int] = Query(None, ge=0, description="Number of chunks the client has recorded"),
+    stream_bytes: Optional[int] = Query(
+        None, ge=0, alias="bytes", description="Size of the audio stream the client has recorded"
+    ),
+):
+    logging.info(f"/sessions/{session_id}/end called.")
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if stream_bytes is not None:
+        stream_path = _stream_chunk(session)
+        size = os.path.getsize(stream_path) if stream_path else 0
+        if size < stream_bytes:
+            raise HTTPException(
+                status_code=409, detail={"message": "Audio stream is incomplete", "offset": size}
             )
-        logging.info(f"Session {session_id} finalized.")
-
-    background_tasks.add_task(finalize)
-    logging.info(f"Session {session_id} ended. Finalization task dispatched.")
+    if chunks is not None:
+        missing = session_store.missing_chunks(session, chunks)
+        if missing:
+            raise HTTPException(
+                status_code=409, detail={"message": "Audio chunks are missing", "missing": missing}
+            )
+    out_path = _end_session(session_id)
     return {"status": "ok", "output": os.path.relpath(out_path, OUTPUT_DIR)}
 
 
+@app.delete("/sessions/{session_id}")
+def discard_session(session_id: str) -> Dict[str, str]:
+    # Ends the session without transcribing it, and deletes what was uploaded
+    logging.info(f"DELETE /sessions/{session_id} called.")
+    if session_id not in sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+    sessions.end(session_id)
+    shutil.rmtree(os.path.join(WORKING_DIR, session_id), ignore_errors=True)
+    shutil.rmtree(os.path.join(OUTPUT_DIR, session_id), ignore_errors=True)
+    catalog.remove_meeting(session_id)
+    events.publish(session_id, "discarded", {})
+    logging.info(f"Discarded session {session_id}")
+    return {"status": "ok"}
+
+
+@app.get("/sessions/{session_id}/status")
+def get_session_status(session_id: str) -> Dict[str, Any]:
+    job = jobs.get_job(session_id)
+    if job is None:
+        if session_id in sessions:
+            return {"session_id": session_id, "state": "recording"}
+        raise HTTPException(status_code=404, detail="Session not found")
+    status = {
+        "session_id": session_id,
+        "state": job["state"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "error": job["error"],
+        "worker_id": job["worker_id"],
+    }
+    if "queue_position" in job:
+        status["queue_position"] = job["queue_position"]
+    return status
+
+
 if __name__ == "__main__":
     logging.info(f"Starting FastAPI server on port {PORT}")
     uvicorn.run("server:app", host="0.0.0.0", port=PORT, reload=not os.getenv("PROD", False))
@@ -0,0 +1,211 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+SESSION_IDLE_TIMEOUT_SEC: float = float(os.environ.get("SESSION_IDLE_TIMEOUT_SEC", 2 * 60 * 60))
+
+
+class SessionStore:
+    """Active recording sessions, backed by an append-only journal.
+
+    Every change is appended to the journal under an exclusive file lock before it is
+    applied in memory, and reads first catch up with lines written by other processes,
+    so several server workers can share sessions and a restart loses nothing.
+    """
+
+    def __init__(self, journal_path: str):
+        self.journal_path = journal_path
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._last_activity: Dict[str, float] = {}
+        self._offset = 0
+        self._inode: Optional[int] = None
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(journal_path)), exist_ok=True)
+        with open(self.journal_path, "ab"):
+            pass
+        self._refresh()
+
+    def _apply(self, entry: Dict[str, Any]) -> None:
+        op = entry["op"]
+        session_id = entry["id"]
+        if op == "start":
+            self._sessions[session_id] = entry["session"]
+        elif op == "end":
+            self._sessions.pop(session_id, None)
+            self._last_activity.pop(session_id, None)
+            return
+        elif session_id not in self._sessions:
+            return
+        elif op == "chunk":
+            self._apply_chunk(self._sessions[session_id], entry)
+        elif op == "screenshot":
+            self._sessions[session_id]["screenshots"].append(entry["path"])
+        self._last_activity[session_id] = entry["ts"]
+
+    @staticmethod
+    def _apply_chunk(session: Dict[str, Any], entry: Dict[str, Any]) -> None:
+        seq = entry.get("seq")
+        if seq is None:
+            session["chunks"].append(entry["path"])
+            return
+        chunk_seqs = session.setdefault("chunk_seqs", {})
+        if str(seq) in chunk_seqs:
+            return
+        # Keep chunks in sequence order, whatever order they arrived in
+        position = len(session["chunks"]) - sum(1 for other in chunk_seqs if int(other) > seq)
+        session["chunks"].insert(position, entry["path"])
+        chunk_seqs[str(seq)] = entry.get("sha256")
+
+    def _read_new_entries(self, f) -> None:
+        inode = os.fstat(f.fileno()).st_ino
+        if inode != self._inode:
+            # The journal was compacted by another process, replay it from scratch
+            self._inode = inode
+            self._offset = 0
+            self._sessions.clear()
+            self._last_activity.clear()
+        if os.fstat(f.fileno()).st_size == self._offset:
+            return
+        f.seek(self._offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            self._offset += len(line)
+            try:
+                self._apply(json.loads(line))
+            except (ValueError, KeyError) as e:
+                logging.warning(f"Skipping corrupt session journal entry: {e}")
+
+    def _refresh(self) -> None:
+        with self._lock, open(self.journal_path, "rb") as f:
+            self._read_new_entries(f)
+
+    @contextmanager
+    def _locked_journal(self) -> Iterator[BinaryIO]:
+        while True:
+            f = open(self.journal_path, "ab+")
+            fcntl.flock(f, fcntl.LOCK_EX)
+            # A compaction may have replaced the file while we waited for the lock
+            if os.fstat(f.fileno()).st_ino == os.stat(self.journal_path).st_ino:
+                break
+            f.close()
+        try:
+            self._read_new_entries(f)
+            yield f
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+            f.close()
+
+    def _write(self, f: BinaryIO, entry: Dict[str, Any]) -> None:
+        entry["ts"] = time.time()
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+        self._offset += len(line)
+        self._apply(entry)
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        with self._lock, self._locked_journal() as f:
+            self._write(f, entry)
+
+    def start(self, session_id: str, session: Dict[str, Any]) -> None:
+        self._append({"op": "start", "id": session_id, "session": session})
+
+    def add_chunk(self, session_id: str, path: str, seq: Optional[int] = None, sha256: Optional[str] = None) -> None:
+        self._append({"op": "chunk", "id": session_id, "path": path, "seq": seq, "sha256": sha256})
+
+    def add_next_chunk(
+            self, session_id: str, place: Callable[[int], str], sha256: Optional[str] = None
+    ) -> Tuple[int, str]:
+        """Adds a chunk under the next free sequence number, returning the number and its path.
+
+        The number is allocated and the chunk moved to its path by place(seq) under the
+        journal lock, so concurrent uploads without sequence numbers, in any process,
+        never get the same one. Raises KeyError if the session is not active.
+        """
+        with self._lock, self._locked_journal() as f:
+            session = self._sessions.get(session_id)
+            if session is None:
+                raise KeyError(session_id)
+            seq = max(received_chunks(session), default=-1) + 1
+            path = place(seq)
+            self._write(f, {"op": "chunk", "id": session_id, "path": path, "seq": seq, "sha256": sha256})
+        return seq, path
+
+    def add_screenshot(self, session_id: str, path: str) -> None:
+        self._append({"op": "screenshot", "id": session_id, "path": path})
+
+    def end(self, session_id: str) -> None:
+        self._append({"op": "end", "id": session_id})
+
+    def get(self, session_id: str, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        self._refresh()
+        return self._sessions.get(session_id, default)
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def __getitem__(self, session_id: str) -> Dict[str, Any]:
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def __len__(self) -> int:
+        self._refresh()
+        return len(self._sessions)
+
+    def __iter__(self) -> Iterator[str]:
+        self._refresh()
+        return iter(list(self._sessions))
+
+    def idle_sessions(self, now: Optional[float] = None) -> List[str]:
+        self._refresh()
+        now = now or time.time()
+        return [
+            session_id
+            for session_id, last_activity in self._last_activity.items()
+            if now - last_activity > SESSION_IDLE_TIMEOUT_SEC
+        ]
+
+    def compact(self) -> None:
+        # Rewrite the journal with only the sessions that are still active
+        with self._lock, self._locked_journal():
+            tmp_path = self.journal_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as out:
+                for session_id, session in self._sessions.items():
+                    ts = self._last_activity.get(session_id, time.time())
+                    entry = {"op": "start", "id": session_id, "session": session, "ts": ts}
+                    out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, self.journal_path)
+        self._inode = None
+        self._refresh()
+        logging.info(f"Compacted session journal to {len(self._sessions)} active sessions")
+
+
+def received_chunks(session: Dict[str, Any]) -> List[int]:
+    return sorted(int(seq) for seq in session.get("chunk_seqs", {}))
+
+
+def missing_chunks(session: Dict[str, Any], expected: Optional[int] = None) -> List[int]:
+    # Sequence numbers below the highest received (or below expected) not received yet
+    received = received_chunks(session)
+    total = max(expected or 0, received[-1] + 1 if received else 0)
+    return sorted(set(range(total)) - set(received))
+
+
+def contiguous_chunks(session: Dict[str, Any]) -> List[str]:
+    # Chunks up to the first gap in sequence numbers, the audio that can already be decoded
+    missing = missing_chunks(session)
+    if not missing:
+        return list(session["chunks"])
+    unsequenced = len(session["chunks"]) - len(session.get("chunk_seqs", {}))
+    return session["chunks"][:unsequenced + missing[0]]
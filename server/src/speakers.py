@@ -0,0 +1,232 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set
+
+import numpy as np
+
+SPEAKER_INDEX: bool = os.environ.get("SPEAKER_INDEX", "true").lower() in ("1", "true", "yes")
+# Cosine similarity above which a voice is taken to be a known identity
+SPEAKER_IDENTITY_THRESHOLD: float = float(os.environ.get("SPEAKER_IDENTITY_THRESHOLD", 0.7))
+
+EMBEDDINGS_FILENAME = "embeddings.f32"
+ROWS_FILENAME = "rows.jsonl"
+IDENTITIES_FILENAME = "identities.json"
+LOCK_FILENAME = ".lock"
+
+
+class Index(NamedTuple):
+    # Unit length embeddings, one row per speaker of every indexed meeting, memory-mapped
+    embeddings: np.ndarray
+    # Identity of each row
+    identities: np.ndarray
+    meetings: Set[str]
+    size: int
+
+
+_index_dir: Optional[str] = None
+_lock = threading.Lock()
+_index: Optional[Index] = None
+# Lines of rows.jsonl read so far, and the offset to read new lines from
+_rows: List[Dict[str, Any]] = []
+_rows_offset: int = 0
+
+
+def init(index_dir: str) -> None:
+    global _index_dir, _index, _rows, _rows_offset
+    os.makedirs(index_dir, exist_ok=True)
+    _index_dir = index_dir
+    _index = None
+    _rows, _rows_offset = [], 0
+
+
+def _path(filename: str) -> str:
+    if _index_dir is None:
+        raise RuntimeError("Speaker index not initialized, call speakers.init() first")
+    return os.path.join(_index_dir, filename)
+
+
+@contextmanager
+def _locked() -> Iterator[None]:
+    # Serializes writers across the API and worker processes
+    with _lock, open(_path(LOCK_FILENAME), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _load_identities() -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(_path(IDENTITIES_FILENAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _save_identities(identities: Dict[str, Dict[str, Any]]) -> None:
+    path = _path(IDENTITIES_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(identities, ensure_ascii=False))
+    os.replace(tmp_path, path)
+
+
+def _read_new_rows() -> None:
+    global _rows_offset
+    try:
+        with open(_path(ROWS_FILENAME), "rb") as f:
+            f.seek(_rows_offset)
+            for line in f:
+                # A line without its end is being written, it is read once complete
+                if not line.endswith(b"\n"):
+                    break
+                _rows.append(json.loads(line))
+                _rows_offset += len(line)
+    except FileNotFoundError:
+        pass
+
+
+def _load_index() -> Index:
+    """The embedding matrix, re-mapped only when rows were added since the last call.
+
+    Rows are appended to the matrix before their line in rows.jsonl, so a row without
+    a line (a writer died in between) is ignored.
+    """
+    global _index
+    embeddings_path = _path(EMBEDDINGS_FILENAME)
+    size = os.path.getsize(embeddings_path) if os.path.exists(embeddings_path) else 0
+    if _index is not None and _index.size == size:
+        return _index
+    _read_new_rows()
+    dim = _rows[0]["dim"] if _rows else 0
+    count = min(size // (4 * dim), len(_rows)) if dim else 0
+    embeddings = (
+        np.memmap(embeddings_path, dtype=np.float32, mode="r", shape=(count, dim))
+        if count
+        else np.zeros((0, dim), dtype=np.float32)
+    )
+    _index = Index(
+        embeddings,
+        np.asarray([row["identity"] for row in _rows[:count]], dtype=str),
+        {row["meeting_id"] for row in _rows[:count]},
+        size,
+    )
+    return _index
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def identify(meeting_id: str, embeddings: Dict[str, List[float]]) -> Dict[str, Dict[str, Any]]:
+    """Maps the speaker labels of a meeting to identities shared across meetings.
+
+    Each voice is compared with every indexed voice in one matrix product. Labels are
+    matched greedily, most similar first, and never two to the same identity. Voices
+    unlike any indexed one get a new identity. The meeting's voices are then added to
+    the index, so later meetings also match them.
+    """
+    if not embeddings:
+        return {}
+    labels = list(embeddings)
+    queries = _normalize(np.asarray([embeddings[label] for label in labels], dtype=np.float32))
+    with _locked():
+        index = _load_index()
+        if len(index.identities) and index.embeddings.shape[1] != queries.shape[1]:
+            raise ValueError(
+                f"Speaker embeddings have {queries.shape[1]} dimensions, the index has {index.embeddings.shape[1]}"
+            )
+        identities = _load_identities()
+
+        # Best similarity of each label to each identity, over all of its indexed voices
+        names = np.unique(index.identities)
+        scores = np.full((len(labels), len(names)), -1.0, dtype=np.float32)
+        if len(names):
+            similarity = queries @ index.embeddings.T
+            columns = np.searchsorted(names, index.identities)
+            np.maximum.at(scores.T, columns, similarity.T)
+
+        mapping: Dict[str, Dict[str, Any]] = {}
+        taken = set()
+        for flat in np.argsort(scores, axis=None)[::-1]:
+            row, column = divmod(int(flat), len(names))
+            if scores[row, column] < SPEAKER_IDENTITY_THRESHOLD:
+                break
+            if labels[row] in mapping or column in taken:
+                continue
+            mapping[labels[row]] = {"identity": str(names[column]), "similarity": round(float(scores[row, column]), 3)}
+            taken.add(column)
+        for label in labels:
+            if label not in mapping:
+                identity = f"PERSON_{len(identities):04d}"
+                identities[identity] = {"name": None, "created_at": time.time()}
+                mapping[label] = {"identity": identity, "similarity": None}
+        for label in labels:
+            identity = identities.setdefault(mapping[label]["identity"], {"name": None, "created_at": time.time()})
+            identity["last_seen"] = meeting_id
+            mapping[label]["name"] = identity["name"]
+
+        # A re-transcribed meeting matches its own voices, they are not indexed twice
+        if meeting_id not in index.meetings:
+            _append(index, meeting_id, labels, queries, mapping)
+        _save_identities(identities)
+    matched = sum(1 for entry in mapping.values() if entry["similarity"] is not None)
+    logging.info(f"Identified {matched} of {len(labels)} speakers of meeting {meeting_id} as known voices")
+    return mapping
+
+
+def _append(
+        index: Index,
+        meeting_id: str,
+        labels: List[str],
+        queries: np.ndarray,
+        mapping: Dict[str, Dict[str, Any]],
+) -> None:
+    embeddings_path = _path(EMBEDDINGS_FILENAME)
+    with open(embeddings_path, "ab") as f:
+        # Drops rows left without a line by a writer that died, which would shift every row after them
+        f.truncate(len(index.identities) * queries.shape[1] * 4)
+        f.write(queries.tobytes())
+    lines = [
+        json.dumps({
+            "meeting_id": meeting_id,
+            "label": label,
+            "identity": mapping[label]["identity"],
+            "dim": queries.shape[1],
+        })
+        for label in labels
+    ]
+    with open(_path(ROWS_FILENAME), "a", encoding="utf-8") as f:
+        f.write("".join(line + "\n" for line in lines))
+
+
+def apply(result: Dict[str, Any], mapping: Dict[str, Dict[str, Any]]) -> None:
+    # Records the identities in a transcription, naming the segments of named speakers
+    result["speakers"] = mapping
+    for segment in result.get("segments", []):
+        name = mapping.get(segment.get("speaker"), {}).get("name")
+        if name:
+            segment["speaker_name"] = name
+
+
+def list_identities() -> List[Dict[str, Any]]:
+    with _lock:
+        identities = _load_identities()
+    return [{"identity": identity, **entry} for identity, entry in sorted(identities.items())]
+
+
+def rename(identity: str, name: Optional[str]) -> Dict[str, Any]:
+    with _locked():
+        identities = _load_identities()
+        if identity not in identities:
+            raise KeyError(identity)
+        identities[identity]["name"] = name
+        _save_identities(identities)
+    return {"identity": identity, **identities[identity]}
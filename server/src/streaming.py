@@ -0,0 +1,215 @@
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+import profiles
+import transcribe
+
+INCREMENTAL_TRANSCRIPTION: bool = os.environ.get(
+    "INCREMENTAL_TRANSCRIPTION", ""
+).lower() in ("1", "true", "yes")
+WINDOW_SEC: float = float(os.environ.get("INCREMENTAL_WINDOW_SEC", 300))
+OVERLAP_SEC: float = float(os.environ.get("INCREMENTAL_OVERLAP_SEC", 10))
+# Every window must move transcribed_until forward
+if not 0 <= OVERLAP_SEC < WINDOW_SEC:
+    raise ValueError(
+        f"INCREMENTAL_OVERLAP_SEC ({OVERLAP_SEC}) must be at least 0 and less than INCREMENTAL_WINDOW_SEC ({WINDOW_SEC})"
+    )
+# Longer meetings are transcribed window by window even without incremental mode,
+# so peak memory stays that of a single window regardless of meeting length
+LONG_MEETING_SEC: float = float(os.environ.get("LONG_MEETING_SEC", 60 * 60))
+
+STATE_FILENAME = "incremental.json"
+PCM_FILENAME = "audio.pcm"
+
+# Called with the segments kept from each transcribed window and the new transcribed_until
+WindowListener = Callable[[List[Dict[str, Any]], float], None]
+# Called with the seconds of audio left to transcribe, returns the profile to use
+ProfileChooser = Callable[[float], profiles.Profile]
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _session_lock(chunk_dir: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(chunk_dir, threading.Lock())
+
+
+def _state_path(chunk_dir: str) -> str:
+    return os.path.join(chunk_dir, STATE_FILENAME)
+
+
+def load_state(chunk_dir: str) -> Dict[str, Any]:
+    path = _state_path(chunk_dir)
+    if not os.path.exists(path):
+        return {"transcribed_until": 0.0, "language": None, "speakers": {}, "segments": []}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_state(chunk_dir: str, state: Dict[str, Any]) -> None:
+    path = _state_path(chunk_dir)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _extends(decoded: List[List[Any]], sizes: List[List[Any]]) -> bool:
+    # True if the chunks only grew since they were decoded: the same chunks first, all but
+    # the last of them unchanged, and the last (a growing stream) no shorter
+    if len(sizes) < len(decoded):
+        return False
+    for index, ((path, size), (current_path, current_size)) in enumerate(zip(decoded, sizes)):
+        if path != current_path or current_size < size or (current_size != size and index < len(decoded) - 1):
+            return False
+    return True
+
+
+def _open_audio(chunk_dir: str, chunks: List[str], state: Optional[Dict[str, Any]] = None) -> np.ndarray:
+    """Decodes the chunks to audio.pcm in chunk_dir and returns its samples.
+
+    With a state, the chunks and their sizes are recorded in it, and while chunks are only
+    added (or the stream appended to) later calls decode just the new audio. A gap being
+    filled, or no state, as for finalize, decodes everything again.
+    """
+    pcm_path = os.path.join(chunk_dir, PCM_FILENAME)
+    sizes = [[chunk, os.path.getsize(chunk)] for chunk in chunks]
+    decoded = state.get("decoded") if state is not None else None
+    audio: Optional[np.ndarray] = None
+    if decoded and os.path.exists(pcm_path) and _extends(decoded, sizes):
+        audio = transcribe.open_pcm(pcm_path) if sizes == decoded else transcribe.append_to_pcm(chunks, pcm_path)
+    if audio is None:
+        audio = transcribe.decode_to_pcm(chunks, pcm_path)
+    if state is not None:
+        state["decoded"] = sizes
+    return audio
+
+
+def reset_state(chunk_dir: str) -> None:
+    # Forget the windows transcribed so far, so the next pass starts from the beginning
+    if os.path.exists(_state_path(chunk_dir)):
+        os.remove(_state_path(chunk_dir))
+
+
+def _choose(choose_profile: Optional[ProfileChooser], pending_sec: float) -> profiles.Profile:
+    return choose_profile(pending_sec) if choose_profile is not None else profiles.default()
+
+
+def _transcribe_window(
+        audio: np.ndarray,
+        state: Dict[str, Any],
+        final: bool,
+        window_profile: Callable[[], profiles.Profile],
+) -> bool:
+    total_sec = len(audio) / transcribe.SAMPLE_RATE
+    until = state["transcribed_until"]
+    if total_sec - until <= 0 or (not final and total_sec - until < WINDOW_SEC):
+        return False
+
+    start = max(0.0, until - OVERLAP_SEC)
+    end = min(total_sec, until + WINDOW_SEC)
+    last_window = end >= total_sec and final
+    logging.info(
+        f"Transcribing window {start:.1f}s-{end:.1f}s of {total_sec:.1f}s (final={last_window})"
+    )
+    window = transcribe.pcm_to_float(audio[int(start * transcribe.SAMPLE_RATE):int(end * transcribe.SAMPLE_RATE)])
+    profile = window_profile()
+    result = transcribe.transcribe_array(
+        window, known_speakers=state["speakers"], language=state["language"], profile=profile
+    )
+    state["language"] = result["language"]
+    # A transcript is only as good as its worst window
+    if state.get("profile") is None or profiles.rank(profile.name) > profiles.rank(state["profile"]):
+        state["profile"] = profile.name
+
+    # Segments starting inside the leading overlap were already kept by the previous
+    # window, and segments starting in the trailing overlap may be cut off mid-sentence.
+    keep_before = end if last_window else end - OVERLAP_SEC
+    new_until = until if last_window else keep_before
+    for segment in result.get("segments", []):
+        for item in [segment] + segment.get("words", []):
+            for key in ("start", "end"):
+                if item.get(key) is not None:
+                    item[key] += start
+        if segment["start"] < until or segment["start"] >= keep_before:
+            continue
+        state["segments"].append(segment)
+        new_until = max(new_until, segment["end"])
+    state["transcribed_until"] = end if last_window else new_until
+    return True
+
+
+def _transcribe_windows(
+        chunk_dir: str,
+        state: Dict[str, Any],
+        audio: np.ndarray,
+        final: bool,
+        on_window: Optional[WindowListener] = None,
+        choose_profile: Optional[ProfileChooser] = None,
+) -> Dict[str, Any]:
+    kept = len(state["segments"])
+    profile: Optional[profiles.Profile] = None
+
+    def window_profile() -> profiles.Profile:
+        # Chosen once per pass, and only if there is a window to transcribe
+        nonlocal profile
+        if profile is None:
+            profile = _choose(choose_profile, len(audio) / transcribe.SAMPLE_RATE - state["transcribed_until"])
+        return profile
+
+    while _transcribe_window(audio, state, final, window_profile):
+        _save_state(chunk_dir, state)
+        if on_window is not None:
+            on_window(state["segments"][kept:], state["transcribed_until"])
+        kept = len(state["segments"])
+    return state
+
+
+def transcribe_available(
+        chunk_dir: str,
+        chunks: List[str],
+        final: bool = False,
+        on_window: Optional[WindowListener] = None,
+        choose_profile: Optional[ProfileChooser] = None,
+) -> Dict[str, Any]:
+    with _session_lock(chunk_dir):
+        state = load_state(chunk_dir)
+        audio = _open_audio(chunk_dir, chunks, state)
+        _save_state(chunk_dir, state)
+        return _transcribe_windows(chunk_dir, state, audio, final, on_window, choose_profile)
+
+
+def finalize(
+        chunk_dir: str,
+        chunks: List[str],
+        on_window: Optional[WindowListener] = None,
+        choose_profile: Optional[ProfileChooser] = None,
+) -> Dict[str, Any]:
+    try:
+        with _session_lock(chunk_dir):
+            audio = _open_audio(chunk_dir, chunks)
+            total_sec = len(audio) / transcribe.SAMPLE_RATE
+            if not INCREMENTAL_TRANSCRIPTION and total_sec <= LONG_MEETING_SEC:
+                return transcribe.transcribe_array(
+                    transcribe.pcm_to_float(audio), profile=_choose(choose_profile, total_sec)
+                )
+            logging.info(f"Transcribing {total_sec:.1f}s of audio in windows of {WINDOW_SEC:.0f}s")
+            state = _transcribe_windows(
+                chunk_dir, load_state(chunk_dir), audio, final=True, on_window=on_window, choose_profile=choose_profile
+            )
+    finally:
+        with _locks_guard:
+            _locks.pop(chunk_dir, None)
+    return {
+        "segments": state["segments"],
+        "language": state["language"],
+        "duration": state["transcribed_until"],
+        "profile": state.get("profile"),
+        "speaker_embeddings": state["speakers"],
+    }
@@ -1,144 +1,452 @@
 import argparse
 import asyncio
+import functools
 import json
 import logging
 import os
 import shutil
 import subprocess
-import tempfile
-import threading
-from typing import Optional
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 import logger as _
+import models
+import profiles
+import vad
 
-import torch
-import whisperx
-from whisperx.diarize import DiarizationPipeline
+import numpy as np
+
+# torch and whisperx take seconds to import, so they are only imported once a model
+# is needed. The API process never loads them.
 
 HF_TOKEN: Optional[str] = os.environ.get("HF_TOKEN")
 MODEL_DIR: Optional[str] = os.environ.get("MODEL_DIR")
 
-WHISPERX_MODEL: str = "large-v2"
+SAMPLE_RATE: int = 16000  # whisperx.audio.SAMPLE_RATE
+SPEAKER_MATCH_THRESHOLD: float = float(os.environ.get("SPEAKER_MATCH_THRESHOLD", 0.6))
+
+# Audio decoded again before the end of an earlier decode, to line up the new samples with it
+PCM_OVERLAP_SEC: float = 2.0
+# Samples at the end of an earlier decode that are replaced, the chunks may have ended mid-packet
+_PCM_REDECODE_SEC: float = 0.5
+# After a seek the decoder takes this long to produce the same samples as a decode from the start
+_SEEK_PREROLL_SEC: float = 0.2
+_ALIGN_PROBE_SEC: float = 0.5
+_ALIGN_MAX_LAG_SEC: float = 0.25
+# Quieter audio (in 16-bit sample units) cannot be lined up reliably
+_ALIGN_MIN_RMS: float = 30.0
+
+ALIGN_CACHE_SIZE: int = int(os.environ.get("ALIGN_CACHE_SIZE", 3))
+PRELOAD_ALIGN_LANGUAGES: List[str] = [
+    lang.strip()
+    for lang in os.environ.get("PRELOAD_ALIGN_LANGUAGES", "").split(",")
+    if lang.strip()
+]
+
+# Approximate resident sizes, used to plan the memory budget before a model is loaded
+WHISPER_SIZE_ESTIMATE_MB: Dict[str, float] = {
+    "tiny": 150, "base": 300, "small": 900, "medium": 2000, "large": 3500, "distil": 2000, "turbo": 2000,
+}
+DIARIZE_SIZE_ESTIMATE_MB: float = 700
+ALIGN_SIZE_ESTIMATE_MB: float = 1200
+
+_stage_listeners: List[Callable[[str, float], None]] = []
+# Stages that load a model, on the first job of a process or after an idle unload
+MODEL_LOAD_STAGES = ("load_whisper_model", "load_diarize_model", "load_align_model")
+
+
+@functools.lru_cache(maxsize=None)
+def device_config() -> Tuple[str, str]:
+    import torch
+
+    if torch.cuda.is_available():
+        return "cuda", "float16"
+    return "cpu", "int8"
+
+
+def _load_whisper_model(profile: profiles.Profile):
+    import whisperx
+
+    device, default_compute_type = device_config()
+    compute_type = profile.compute_type or default_compute_type
+    model_kwargs = {
+        "device": device,
+        "compute_type": compute_type,
+        "asr_options": {"beam_size": profile.beam_size},
+    }
+    if profile.threads:
+        model_kwargs["threads"] = profile.threads
+    if MODEL_DIR:
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        model_kwargs["download_root"] = MODEL_DIR
+    logging.info(
+        f"Loading WhisperX model {profile.model} for profile {profile.name} "
+        f"(device={device}, compute_type={compute_type}, beam_size={profile.beam_size}, model_dir={MODEL_DIR})..."
+    )
+    with _stage("load_whisper_model"):
+        return whisperx.load_model(profile.model, **model_kwargs)
+
+
+def _load_diarize_model():
+    from whisperx.diarize import DiarizationPipeline
+
+    logging.info("Loading diarization pipeline...")
+    with _stage("load_diarize_model"):
+        return DiarizationPipeline(use_auth_token=HF_TOKEN, device=device_config()[0])
+
+
+def _load_align_model(language_code: str) -> Tuple[Any, dict]:
+    import whisperx
+
+    logging.info(f"Loading alignment model for language '{language_code}'...")
+    with _stage("load_align_model"):
+        return whisperx.load_align_model(language_code=language_code, device=device_config()[0])
+
+
+def _whisper_model(profile: profiles.Profile):
+    size_mb = next(
+        (mb for name, mb in WHISPER_SIZE_ESTIMATE_MB.items() if name in profile.model),
+        WHISPER_SIZE_ESTIMATE_MB["large"],
+    )
+    # Profiles that load the same model with the same options share it
+    name = f"whisper:{profile.model}:{profile.compute_type or 'default'}:beam{profile.beam_size}:threads{profile.threads}"
+    return models.use(name, lambda: _load_whisper_model(profile), size_mb)
+
+
+def _diarize_model():
+    return models.use("diarize", _load_diarize_model, DIARIZE_SIZE_ESTIMATE_MB)
+
 
-device: str
-compute_type: str
-if torch.cuda.is_available():
-    device = "cuda"
-    compute_type = "float16"
-else:
-    device = "cpu"
-    compute_type = "int8"
+def _align_model(language_code: str):
+    name = f"align:{language_code}"
+    # Alignment models are per language, keep room for this one within ALIGN_CACHE_SIZE
+    if name not in models.memory_by_model():
+        models.trim("align:", ALIGN_CACHE_SIZE - 1)
+    return models.use(name, lambda: _load_align_model(language_code), ALIGN_SIZE_ESTIMATE_MB)
 
-batch_size: int = 16
 
-_model_lock = threading.Lock()
-_model_ready_event = threading.Event()
+def align_cache_info() -> Dict[str, Any]:
+    languages = [name.split(":", 1)[1] for name in models.memory_by_model() if name.startswith("align:")]
+    return {**models.stats("align"), "size": len(languages), "capacity": ALIGN_CACHE_SIZE, "languages": languages}
 
-_whisper_model = None
-_diarize_model = None
 
+def preload_models_sync(profile: Optional[profiles.Profile] = None) -> None:
+    with _whisper_model(profile or profiles.default()):
+        pass
+    with _diarize_model():
+        pass
+    for language_code in PRELOAD_ALIGN_LANGUAGES[:ALIGN_CACHE_SIZE]:
+        try:
+            with _align_model(language_code):
+                pass
+        except Exception as e:
+            logging.warning(f"Failed to preload alignment model for '{language_code}': {e}")
 
-async def ensure_model_ready() -> None:
-    if _model_ready_event.is_set():
-        return
+
+async def preload_models() -> None:
     loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, _init_model_once)
-
-
-def _init_model_once() -> None:
-    if _model_ready_event.is_set():
-        return
-    with _model_lock:
-        if _model_ready_event.is_set():
-            return
-        if shutil.which("ffmpeg") is None:
-            raise RuntimeError(
-                "ffmpeg not found. Please install ffmpeg and ensure it is in your PATH."
+    await loop.run_in_executor(None, preload_models_sync)
+
+
+def _cosine_similarity(a, b) -> float:
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    denom = float(np.linalg.norm(a) * np.linalg.norm(b))
+    if denom == 0.0:
+        return 0.0
+    return float(np.dot(a, b) / denom)
+
+
+def _match_speakers(embeddings: Dict[str, list], known_speakers: Dict[str, list]) -> Dict[str, str]:
+    # Maps this run's speaker labels onto known_speakers, adding unseen voices to it.
+    mapping: Dict[str, str] = {}
+    taken = set()
+    for label, embedding in embeddings.items():
+        best_label, best_score = None, SPEAKER_MATCH_THRESHOLD
+        for known_label, known_embedding in known_speakers.items():
+            if known_label in taken:
+                continue
+            score = _cosine_similarity(embedding, known_embedding)
+            if score >= best_score:
+                best_label, best_score = known_label, score
+        if best_label is None:
+            best_label = f"SPEAKER_{len(known_speakers):02d}"
+            known_speakers[best_label] = list(embedding)
+        else:
+            known_speakers[best_label] = list(
+                (np.asarray(known_speakers[best_label]) + np.asarray(embedding)) / 2
             )
-        model_kwargs = {"device": device, "compute_type": compute_type}
-        if MODEL_DIR:
-            os.makedirs(MODEL_DIR, exist_ok=True)
-            model_kwargs["download_root"] = MODEL_DIR
-        global _whisper_model, _diarize_model
-        logging.info(
-            f"Loading WhisperX model (device={device}, compute_type={compute_type}, model_dir={MODEL_DIR})..."
-        )
-        _whisper_model = whisperx.load_model(WHISPERX_MODEL, **model_kwargs)
-        logging.info("WhisperX model loaded.")
-        logging.info("Loading diarization pipeline...")
-        _diarize_model = DiarizationPipeline(use_auth_token=HF_TOKEN, device=device)
-        logging.info("Diarization pipeline loaded.")
-        _model_ready_event.set()
-
-
-def _transcribe_audio(audio_path: str, prev_embeddings=None):
-    global _whisper_model, _diarize_model
-    logging.info(f"Loading audio from: {audio_path}")
-    audio = whisperx.load_audio(audio_path)
-    logging.info("Running transcription...")
-    result = _whisper_model.transcribe(audio, batch_size=batch_size)
-    logging.info("Transcription complete. Running alignment...")
-    align_model, align_metadata = whisperx.load_align_model(
-        language_code=result["language"], device=device
-    )
-    result = whisperx.align(
-        result["segments"],
-        align_model,
-        align_metadata,
+        taken.add(best_label)
+        mapping[label] = best_label
+    return mapping
+
+
+def add_stage_listener(listener: Callable[[str, float], None]) -> None:
+    _stage_listeners.append(listener)
+
+
+@contextmanager
+def _stage(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        logging.info(f"Stage {name} took {elapsed:.2f}s")
+        for listener in _stage_listeners:
+            try:
+                listener(name, elapsed)
+            except Exception as e:
+                logging.warning(f"Stage listener failed for {name}: {e}")
+
+
+def transcribe_array(
         audio,
-        device,
-        return_char_alignments=False,
-    )
-    logging.info("Alignment complete. Running diarization...")
-    diarize_segments = _diarize_model(audio, return_embeddings=False)
-    logging.info("Diarization complete. Assigning speakers...")
-    result = whisperx.assign_word_speakers(diarize_segments, result)
-    logging.info("Speaker assignment complete.")
+        known_speakers: Optional[Dict[str, list]] = None,
+        language: Optional[str] = None,
+        profile: Optional[profiles.Profile] = None,
+):
+    profile = profile or profiles.default()
+    timeline = None
+    original_sec = len(audio) / SAMPLE_RATE
+    if vad.VAD_TRIM:
+        with _stage("vad"):
+            audio, timeline = vad.trim_silence(audio, SAMPLE_RATE)
+        if len(audio) == 0:
+            return {
+                "segments": [],
+                "language": language,
+                "profile": profile.name,
+                "vad": vad.stats(original_sec, 0.0),
+            }
+    import whisperx
+
+    logging.info(f"Running transcription with profile {profile.name}...")
+    with _whisper_model(profile) as whisper_model, _stage("transcribe"):
+        result = whisper_model.transcribe(audio, batch_size=profile.batch_size, language=language)
+    language = result["language"]
+    logging.info("Transcription complete. Running alignment...")
+    with _align_model(language) as (align_model, align_metadata), _stage("align"):
+        result = whisperx.align(
+            result["segments"],
+            align_model,
+            align_metadata,
+            audio,
+            device_config()[0],
+            return_char_alignments=False,
+        )
+    if not profile.diarize:
+        logging.info("Alignment complete. Diarization is off in this profile.")
+        diarize_segments, embeddings = None, {}
+    else:
+        logging.info("Alignment complete. Running diarization...")
+        with _diarize_model() as diarize_model, _stage("diarize"):
+            diarize_segments, embeddings = diarize_model(audio, return_embeddings=True)
+            embeddings = {label: list(map(float, embedding)) for label, embedding in (embeddings or {}).items()}
+            if known_speakers is not None:
+                mapping = _match_speakers(embeddings, known_speakers)
+                diarize_segments["speaker"] = diarize_segments["speaker"].map(
+                    lambda label: mapping.get(label, label)
+                )
+                embeddings = {mapping[label]: embedding for label, embedding in embeddings.items()}
+    if diarize_segments is not None:
+        logging.info("Diarization complete. Assigning speakers...")
+        with _stage("assign_word_speakers"):
+            result = whisperx.assign_word_speakers(diarize_segments, result)
+        logging.info("Speaker assignment complete.")
+    if timeline is not None:
+        timeline.restore(result)
+        result["vad"] = timeline.stats()
+    elif vad.VAD_TRIM:
+        # No silence long enough to cut
+        result["vad"] = vad.stats(original_sec, original_sec)
+    result["duration"] = original_sec
+    result["language"] = language
+    result["profile"] = profile.name
+    # Voices of this run, for the cross-meeting speaker index, never written to the transcript
+    result["speaker_embeddings"] = embeddings
+    # Word timings stay on their segments until the caller stores or drops them
     result.pop("word_segments", None)
-    for segment in result.get("segments", []):
-        segment.pop("words", None)
     return result
 
 
-def _concat_audio_files_in_dir(directory: str) -> str:
-    logging.info(f"Concatenating audio files in directory: {directory}")
-    files = sorted(
-        [
-            os.path.join(directory, f)
-            for f in os.listdir(directory)
-            if os.path.isfile(os.path.join(directory, f))
-        ]
-    )
-    if not files:
-        raise ValueError(f"No files found in directory: {directory}")
-    with tempfile.NamedTemporaryFile(
-            mode="w", delete=False, suffix=".txt"
-    ) as list_file:
-        for f in files:
-            list_file.write(f"file '{f}'\n")
-        list_file_path = list_file.name
-    temp_out = tempfile.NamedTemporaryFile(
-        suffix=os.path.splitext(files[0])[1], delete=False
-    )
-    temp_out_path = temp_out.name
-    temp_out.close()
-    cmd = [
+def _ffmpeg_decode_cmd(input_arg: str, start_sec: Optional[float] = None) -> List[str]:
+    # Same decoding as whisperx.load_audio, but the input may be an ffmpeg protocol URL.
+    return [
         "ffmpeg",
-        "-y",
-        "-f",
-        "concat",
-        "-safe",
+        "-nostdin",
+        "-threads",
         "0",
+        *(["-ss", f"{start_sec:.6f}"] if start_sec is not None else []),
         "-i",
-        list_file_path,
-        "-c",
-        "copy",
-        temp_out_path,
+        input_arg,
+        "-f",
+        "s16le",
+        "-ac",
+        "1",
+        "-acodec",
+        "pcm_s16le",
+        "-ar",
+        str(SAMPLE_RATE),
+        "-",
     ]
-    logging.info(f"Running ffmpeg to concatenate files: {' '.join(cmd)}")
-    subprocess.run(cmd, check=True)
-    os.unlink(list_file_path)
-    logging.info(f"Concatenation complete: {temp_out_path}")
-    return temp_out_path
+
+
+def _decode_with_ffmpeg(input_arg: str) -> np.ndarray:
+    try:
+        out = subprocess.run(_ffmpeg_decode_cmd(input_arg), capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
+    return pcm_to_float(np.frombuffer(out, np.int16))
+
+
+def pcm_to_float(samples: np.ndarray) -> np.ndarray:
+    return samples.astype(np.float32) / 32768.0
+
+
+def _ffmpeg_inputs(source: Union[str, List[str]]) -> List[str]:
+    if isinstance(source, list):
+        # Chunks uploaded by the recorder are consecutive pieces of a single stream,
+        # so ffmpeg reads them back to back instead of us writing a combined file.
+        if not source:
+            raise ValueError("No audio chunks to load")
+        logging.info(f"Decoding {len(source)} audio chunks")
+        return ["concat:" + "|".join(source)]
+    if os.path.isdir(source):
+        # Files in a directory are independent recordings, each with its own header.
+        files = sorted(
+            os.path.join(source, f)
+            for f in os.listdir(source)
+            if os.path.isfile(os.path.join(source, f))
+        )
+        if not files:
+            raise ValueError(f"No files found in directory: {source}")
+        logging.info(f"Decoding {len(files)} audio files in directory: {source}")
+        return files
+    logging.info(f"Loading audio from: {source}")
+    return [source]
+
+
+def _require_ffmpeg() -> None:
+    if shutil.which("ffmpeg") is None:
+        raise RuntimeError(
+            "ffmpeg not found. Please install ffmpeg and ensure it is in your PATH."
+        )
+
+
+def load_audio(source: Union[str, List[str]]) -> np.ndarray:
+    _require_ffmpeg()
+    with _stage("load_audio"):
+        decoded = [_decode_with_ffmpeg(input_arg) for input_arg in _ffmpeg_inputs(source)]
+        return decoded[0] if len(decoded) == 1 else np.concatenate(decoded)
+
+
+def decode_to_pcm(source: Union[str, List[str]], pcm_path: str) -> np.ndarray:
+    """Decodes source like load_audio, but to 16-bit PCM on disk.
+
+    Returns the samples memory-mapped from pcm_path, so only the parts that are read
+    are paged in and memory use does not grow with the length of the recording.
+    """
+    _require_ffmpeg()
+    with _stage("load_audio"):
+        inputs = _ffmpeg_inputs(source)
+        tmp_path = pcm_path + ".tmp"
+        with open(tmp_path, "wb") as out:
+            for input_arg in inputs:
+                try:
+                    subprocess.run(_ffmpeg_decode_cmd(input_arg), stdout=out, stderr=subprocess.PIPE, check=True)
+                except subprocess.CalledProcessError as e:
+                    raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
+        os.replace(tmp_path, pcm_path)
+    return open_pcm(pcm_path)
+
+
+def open_pcm(pcm_path: str) -> np.ndarray:
+    if os.path.getsize(pcm_path) == 0:
+        return np.zeros(0, dtype=np.int16)
+    return np.memmap(pcm_path, dtype=np.int16, mode="r")
+
+
+def _align(reference: np.ndarray, probe: np.ndarray) -> Optional[int]:
+    # Offset of probe in reference, if it is there (nearly) exactly and nowhere else
+    reference = reference.astype(np.float64)
+    probe = probe.astype(np.float64)
+    size = 1 << (len(reference) + len(probe) - 1).bit_length()
+    correlation = np.fft.irfft(np.fft.rfft(reference, size) * np.conj(np.fft.rfft(probe, size)), size)
+    energy_sums = np.concatenate(([0.0], np.cumsum(reference ** 2)))
+    energy = float(np.dot(probe, probe))
+    distances = energy_sums[len(probe):] - energy_sums[:-len(probe)] - 2 * correlation[:len(reference) - len(probe) + 1] + energy
+    best = int(np.argmin(distances))
+    others = np.delete(distances, np.arange(max(best - 2, 0), min(best + 3, len(distances))))
+    if energy < len(probe) * _ALIGN_MIN_RMS ** 2 or distances[best] > 1e-3 * energy:
+        return None
+    if others.size and others.min() < 1e-2 * energy:
+        return None
+    return best
+
+
+def append_to_pcm(source: List[str], pcm_path: str) -> Optional[np.ndarray]:
+    """Extends pcm_path, a decode of the beginning of the chunks in source, with the audio added since.
+
+    ffmpeg seeks to shortly before the end of the samples already decoded instead of
+    decoding from the start. The new samples are lined up with the old ones on the audio
+    both contain, as timestamps of recorded streams do not map exactly to sample positions.
+    Returns None if they cannot be lined up, e.g. over silence, and the chunks have to be
+    decoded with decode_to_pcm.
+    """
+    _require_ffmpeg()
+    decoded = os.path.getsize(pcm_path) // 2
+    seek = decoded - int(PCM_OVERLAP_SEC * SAMPLE_RATE)
+    if seek <= 0:
+        return None
+    preroll = int(_SEEK_PREROLL_SEC * SAMPLE_RATE)
+    probe_length = int(_ALIGN_PROBE_SEC * SAMPLE_RATE)
+    max_lag = int(_ALIGN_MAX_LAG_SEC * SAMPLE_RATE)
+    # The end of the earlier decode may be a packet cut short, it is decoded again
+    splice = decoded - int(_PCM_REDECODE_SEC * SAMPLE_RATE)
+    with _stage("load_audio"):
+        (input_arg,) = _ffmpeg_inputs(source)
+        tail_path = pcm_path + ".tail.tmp"
+        try:
+            with open(tail_path, "wb") as out:
+                try:
+                    subprocess.run(
+                        _ffmpeg_decode_cmd(input_arg, seek / SAMPLE_RATE), stdout=out, stderr=subprocess.PIPE, check=True
+                    )
+                except subprocess.CalledProcessError as e:
+                    raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
+            tail = open_pcm(tail_path)
+            if len(tail) < preroll + probe_length:
+                return None
+            reference_start = max(seek + preroll - max_lag, 0)
+            offset = _align(
+                open_pcm(pcm_path)[reference_start:seek + preroll + max_lag + probe_length],
+                tail[preroll:preroll + probe_length],
+            )
+            if offset is None:
+                logging.info("Could not line up newly decoded audio with the earlier decode, decoding from the start")
+                return None
+            # tail[i] is the sample at shift + i of the full decode
+            shift = reference_start + offset - preroll
+            with open(tail_path, "rb") as f, open(pcm_path, "r+b") as out:
+                f.seek((splice - shift) * 2)
+                out.truncate(splice * 2)
+                out.seek(splice * 2)
+                shutil.copyfileobj(f, out, 1024 * 1024)
+        finally:
+            if os.path.exists(tail_path):
+                os.remove(tail_path)
+    logging.info(f"Decoded {(os.path.getsize(pcm_path) // 2 - decoded) / SAMPLE_RATE:.1f}s of new audio")
+    return open_pcm(pcm_path)
+
+
+def _transcribe_audio(
+        audio_path: Union[str, List[str]],
+        prev_embeddings=None,
+        profile: Optional[profiles.Profile] = None,
+):
+    audio = load_audio(audio_path)
+    return transcribe_array(audio, known_speakers=prev_embeddings, profile=profile)
 
 
 def _get_output_json_path(audio_path: str) -> str:
@@ -146,28 +454,36 @@ def _get_output_json_path(audio_path: str) -> str:
     return base + ".transcription.json"
 
 
+def write_json(result: dict, session: dict, output_path: str) -> None:
+    logging.info(f"Writing transcription to: {output_path}")
+    result.pop("speaker_embeddings", None)
+    for segment in result.get("segments", []):
+        segment.pop("words", None)
+    result["session"] = session
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def transcribe_to_json(
+        session: dict,
+        input_path: Union[str, List[str]],
+        output_path: str,
+        profile: Optional[profiles.Profile] = None,
+):
+    result = _transcribe_audio(input_path, profile=profile)
+    write_json(result, session, output_path)
+    return result
+
+
 async def transcribe_and_write_json(
         session: dict,
-        input_path: str,
+        input_path: Union[str, List[str]],
         output_path: str,
 ):
-    await ensure_model_ready()
-    temp_concat_path: Optional[str] = None
-    try:
-        if os.path.isdir(input_path):
-            temp_concat_path = _concat_audio_files_in_dir(input_path)
-            result = _transcribe_audio(temp_concat_path)
-        else:
-            result = _transcribe_audio(input_path)
-        logging.info(f"Writing transcription to: {output_path}")
-        result["session"] = session
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(result, f, indent=2, ensure_ascii=False)
-        return result
-    finally:
-        if temp_concat_path and os.path.exists(temp_concat_path):
-            logging.info(f"Removing temporary concatenated file: {temp_concat_path}")
-            os.remove(temp_concat_path)
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        None, transcribe_to_json, session, input_path, output_path
+    )
 
 
 if __name__ == "__main__":
@@ -179,4 +495,4 @@ if __name__ == "__main__":
     )
     args = parser.parse_args()
     output_path = _get_output_json_path(args.audio_path)
-    transcribe_and_write_json({}, args.audio_path, output_path)
+    transcribe_to_json({}, args.audio_path, output_path)
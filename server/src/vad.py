@@ -0,0 +1,93 @@
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+VAD_TRIM: bool = os.environ.get("VAD_TRIM", "true").lower() in ("1", "true", "yes")
+VAD_THRESHOLD_DB: float = float(os.environ.get("VAD_THRESHOLD_DB", -45))
+VAD_MIN_SILENCE_SEC: float = float(os.environ.get("VAD_MIN_SILENCE_SEC", 2.0))
+VAD_PAD_SEC: float = float(os.environ.get("VAD_PAD_SEC", 0.3))
+FRAME_SEC: float = 0.03
+
+
+class SpeechTimeline:
+    def __init__(self, regions: List[Tuple[int, int]], sample_rate: int, original_samples: int):
+        self.sample_rate = sample_rate
+        self.original_samples = original_samples
+        lengths = np.array([end - start for start, end in regions], dtype=np.int64)
+        self.original_starts = np.array([start for start, _ in regions], dtype=np.int64)
+        self.compact_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        self.speech_samples = int(lengths.sum())
+
+    def to_original(self, t: float, end: bool = False) -> float:
+        # A time on the join of two regions is the start of the later one, or the end of the earlier one
+        sample = t * self.sample_rate
+        idx = max(int(np.searchsorted(self.compact_starts, sample, side="left" if end else "right")) - 1, 0)
+        return float(self.original_starts[idx] + sample - self.compact_starts[idx]) / self.sample_rate
+
+    def restore(self, result: Dict[str, Any]) -> None:
+        for segment in result.get("segments", []):
+            for item in [segment] + segment.get("words", []):
+                for key in ("start", "end"):
+                    if item.get(key) is not None:
+                        item[key] = round(self.to_original(item[key], end=key == "end"), 3)
+                # An empty item on a join would otherwise end before it starts
+                if item.get("start") is not None and item.get("end") is not None:
+                    item["end"] = max(item["end"], item["start"])
+
+    def stats(self) -> Dict[str, float]:
+        return stats(self.original_samples / self.sample_rate, self.speech_samples / self.sample_rate)
+
+
+def stats(original_sec: float, speech_sec: float) -> Dict[str, float]:
+    return {
+        "original_sec": round(original_sec, 3),
+        "speech_sec": round(speech_sec, 3),
+        "skipped_sec": round(original_sec - speech_sec, 3),
+    }
+
+
+def trim_silence(audio: np.ndarray, sample_rate: int) -> Tuple[np.ndarray, Optional[SpeechTimeline]]:
+    frame = int(sample_rate * FRAME_SEC)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return audio, None
+
+    frames = audio[: n_frames * frame].reshape(n_frames, frame)
+    energy_db = 20 * np.log10(np.sqrt(np.mean(np.square(frames), axis=1)) + 1e-10)
+    speech = energy_db > VAD_THRESHOLD_DB
+    pad = int(VAD_PAD_SEC / FRAME_SEC)
+    if pad:
+        speech = np.convolve(speech.astype(np.int32), np.ones(2 * pad + 1, dtype=np.int32), mode="same") > 0
+
+    edges = np.diff(np.concatenate(([0], (~speech).astype(np.int8), [0])))
+    silence_starts = np.flatnonzero(edges == 1)
+    silence_ends = np.flatnonzero(edges == -1)
+    is_long = (silence_ends - silence_starts) * FRAME_SEC >= VAD_MIN_SILENCE_SEC
+    cuts = [
+        (int(start) * frame, len(audio) if end == n_frames else int(end) * frame)
+        for start, end in zip(silence_starts[is_long], silence_ends[is_long])
+    ]
+    if not cuts:
+        return audio, None
+
+    regions: List[Tuple[int, int]] = []
+    position = 0
+    for cut_start, cut_end in cuts:
+        if cut_start > position:
+            regions.append((position, cut_start))
+        position = cut_end
+    if position < len(audio):
+        regions.append((position, len(audio)))
+    if not regions:
+        logging.info("No speech detected in audio")
+        return audio[:0], None
+
+    timeline = SpeechTimeline(regions, sample_rate, len(audio))
+    stats = timeline.stats()
+    logging.info(
+        f"Voice activity detection kept {stats['speech_sec']:.1f}s of {stats['original_sec']:.1f}s, "
+        f"skipping {stats['skipped_sec']:.1f}s of silence"
+    )
+    return np.concatenate([audio[start:end] for start, end in regions]), timeline
@@ -0,0 +1,101 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple
+
+TRANSCRIPTION_FILENAME = "transcription.json"
+MERGED_FILENAME = "transcription.merged.json.gz"
+VIEW_CACHE_SIZE: int = int(os.environ.get("VIEW_CACHE_SIZE", 64))
+
+
+class MergedView(NamedTuple):
+    body_gzip: bytes
+    etag: str
+    mtime: float
+
+
+_cache_lock = threading.Lock()
+_cache: "OrderedDict[str, MergedView]" = OrderedDict()
+
+
+def merge_segments(transcription_data: Dict[str, Any]) -> Dict[str, Any]:
+    # Merge consecutive segments from the same speaker
+    if "segments" in transcription_data and transcription_data["segments"]:
+        merged_segments = []
+        current_segment = None
+
+        for segment in transcription_data["segments"]:
+            if current_segment is None:
+                current_segment = segment.copy()
+            elif current_segment.get("speaker") == segment.get("speaker"):
+                # Merge with current segment
+                current_segment["end"] = segment["end"]
+                current_segment["text"] += "\n" + segment["text"]
+            else:
+                # Different speaker, save current and start new
+                merged_segments.append(current_segment)
+                current_segment = segment.copy()
+
+        # Don't forget the last segment
+        if current_segment is not None:
+            merged_segments.append(current_segment)
+
+        transcription_data = {**transcription_data, "segments": merged_segments}
+    return transcription_data
+
+
+def write_merged_view(transcription_data: Dict[str, Any], meeting_path: str) -> str:
+    merged = merge_segments(transcription_data)
+    body = json.dumps(merged, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    merged_path = os.path.join(meeting_path, MERGED_FILENAME)
+    tmp_path = merged_path + ".tmp"
+    # mtime=0 keeps the compressed bytes, and so the ETag, stable across rewrites
+    with open(tmp_path, "wb") as f:
+        f.write(gzip.compress(body, compresslevel=9, mtime=0))
+    os.replace(tmp_path, merged_path)
+    with _cache_lock:
+        _cache.pop(merged_path, None)
+    logging.info(f"Wrote merged transcript view {merged_path}")
+    return merged_path
+
+
+def _is_stale(merged_path: str, transcription_path: str) -> bool:
+    if not os.path.exists(merged_path):
+        return True
+    return os.path.getmtime(transcription_path) > os.path.getmtime(merged_path)
+
+
+def get_merged_view(meeting_path: str) -> MergedView:
+    transcription_path = os.path.join(meeting_path, TRANSCRIPTION_FILENAME)
+    merged_path = os.path.join(meeting_path, MERGED_FILENAME)
+    if not os.path.exists(transcription_path):
+        raise FileNotFoundError(transcription_path)
+    if _is_stale(merged_path, transcription_path):
+        # Meetings finalized before merged views existed are converted on first read
+        with open(transcription_path, "r", encoding="utf-8") as f:
+            write_merged_view(json.load(f), meeting_path)
+
+    mtime = os.path.getmtime(merged_path)
+    with _cache_lock:
+        view = _cache.get(merged_path)
+        if view is not None and view.mtime == mtime:
+            _cache.move_to_end(merged_path)
+            return view
+
+    with open(merged_path, "rb") as f:
+        body_gzip = f.read()
+    view = MergedView(
+        body_gzip=body_gzip,
+        etag='"' + hashlib.sha1(body_gzip).hexdigest() + '"',
+        mtime=mtime,
+    )
+    with _cache_lock:
+        _cache[merged_path] = view
+        _cache.move_to_end(merged_path)
+        while len(_cache) > VIEW_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return view
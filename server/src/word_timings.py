@@ -0,0 +1,125 @@
+import math
+import os
+import struct
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+WORDS_FILENAME = "words.bin"
+# Granularity of the time index, a range read starts at most this far before its first word
+WORD_INDEX_BUCKET_SEC: float = 10.0
+
+# Magic, word count, index buckets, bucket length in seconds
+_HEADER = struct.Struct("<4sIIf")
+_MAGIC = b"WRD1"
+_RECORD = np.dtype([
+    ("start", "<f4"),
+    ("end", "<f4"),
+    ("score", "<f4"),
+    ("segment", "<u4"),
+    ("text_offset", "<u4"),
+    ("text_length", "<u4"),
+])
+_INDEX_ITEM = np.dtype("<u4")
+
+
+def pop_words(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Removes the words from the segments of a transcription, returning them in one list.
+
+    Each word keeps the index of its segment. Words alignment could not time (digits,
+    symbols) take the end of the word before them.
+    """
+    words: List[Dict[str, Any]] = []
+    for index, segment in enumerate(result.get("segments", [])):
+        previous_end: float = segment.get("start") or 0.0
+        for word in segment.pop("words", None) or []:
+            start = word.get("start")
+            start = previous_end if start is None else start
+            end = word.get("end")
+            end = start if end is None else end
+            words.append({
+                "word": word.get("word", ""),
+                "start": start,
+                "end": end,
+                "score": word.get("score"),
+                "segment": index,
+            })
+            previous_end = end
+    return words
+
+
+def write(words: List[Dict[str, Any]], meeting_path: str) -> str:
+    """Writes words to a binary sidecar: a header, a time index, fixed-size records and the text.
+
+    Records are sorted by start time and the index holds the first record of every
+    WORD_INDEX_BUCKET_SEC seconds, so a time range is read without the rest of the file.
+    """
+    words = sorted(words, key=lambda word: word["start"])
+    texts = [word["word"].encode("utf-8") for word in words]
+    records = np.zeros(len(words), dtype=_RECORD)
+    records["start"] = [word["start"] for word in words]
+    records["end"] = [word["end"] for word in words]
+    records["score"] = [np.nan if word["score"] is None else word["score"] for word in words]
+    records["segment"] = [word["segment"] for word in words]
+    records["text_length"] = [len(text) for text in texts]
+    records["text_offset"] = np.concatenate(([0], np.cumsum(records["text_length"])[:-1])) if words else []
+
+    buckets = int(records["start"][-1] // WORD_INDEX_BUCKET_SEC) + 1 if words else 0
+    bucket_starts = np.arange(buckets, dtype=np.float32) * WORD_INDEX_BUCKET_SEC
+    index = np.append(np.searchsorted(records["start"], bucket_starts, side="left"), len(words)).astype(_INDEX_ITEM)
+
+    path = os.path.join(meeting_path, WORDS_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, len(words), buckets, WORD_INDEX_BUCKET_SEC))
+        f.write(index.tobytes())
+        f.write(records.tobytes())
+        f.write(b"".join(texts))
+    os.replace(tmp_path, path)
+    return path
+
+
+def _read_index_item(f, bucket: int) -> int:
+    f.seek(_HEADER.size + bucket * _INDEX_ITEM.itemsize)
+    return int(np.frombuffer(f.read(_INDEX_ITEM.itemsize), dtype=_INDEX_ITEM)[0])
+
+
+def read(meeting_path: str, start: float = 0.0, end: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Words starting in [start, end), reading only the index entries, records and text of that range.
+
+    Raises FileNotFoundError if the meeting has no word timings.
+    """
+    with open(os.path.join(meeting_path, WORDS_FILENAME), "rb") as f:
+        magic, count, buckets, bucket_sec = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError(f"Not a word timings file: {meeting_path}")
+        first_bucket = min(max(int(start // bucket_sec), 0), buckets)
+        last_bucket = buckets if end is None else min(max(math.ceil(end / bucket_sec), first_bucket), buckets)
+        first = _read_index_item(f, first_bucket)
+        last = _read_index_item(f, last_bucket)
+
+        records_offset = _HEADER.size + (buckets + 1) * _INDEX_ITEM.itemsize
+        f.seek(records_offset + first * _RECORD.itemsize)
+        records = np.frombuffer(f.read((last - first) * _RECORD.itemsize), dtype=_RECORD)
+        keep = records["start"] >= start
+        if end is not None:
+            keep &= records["start"] < end
+        records = records[keep]
+        if not len(records):
+            return []
+
+        text_start = int(records["text_offset"][0])
+        text_end = int(records["text_offset"][-1] + records["text_length"][-1])
+        f.seek(records_offset + count * _RECORD.itemsize + text_start)
+        text = f.read(text_end - text_start)
+
+    return [
+        {
+            "word": text[offset - text_start:offset - text_start + length].decode("utf-8"),
+            "start": round(float(record_start), 3),
+            "end": round(float(record_end), 3),
+            "score": None if math.isnan(score) else round(float(score), 3),
+            "segment": int(segment),
+        }
+        for record_start, record_end, score, segment, offset, length in records.tolist()
+    ]
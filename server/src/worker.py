@@ -0,0 +1,57 @@
+import argparse
+import logging
+import os
+import signal
+import threading
+
+import logger as _
+import catalog
+import events
+import jobs
+import metrics
+import pipeline
+import session_store
+import speakers
+import transcribe
+
+WORKING_DIR: str = os.environ.get("WORKING_DIR", "./data")
+OUTPUT_DIR: str = os.environ.get("OUTPUT_DIR", "./output")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Run transcription workers against the job queue shared with an ROLE=api server."
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=jobs.TRANSCRIBE_WORKERS,
+        help="Jobs transcribed at once by this process",
+    )
+    args = parser.parse_args()
+
+    os.makedirs(WORKING_DIR, exist_ok=True)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    catalog.init(os.path.join(OUTPUT_DIR, "catalog.db"), OUTPUT_DIR)
+    jobs.init(os.path.join(WORKING_DIR, "jobs.db"))
+    events.init(os.path.join(WORKING_DIR, "events.db"))
+    speakers.init(os.path.join(WORKING_DIR, "speakers"))
+    sessions = session_store.SessionStore(os.path.join(WORKING_DIR, "sessions.journal"))
+    pipeline.configure(WORKING_DIR, sessions)
+    transcribe.add_stage_listener(metrics.record_stage)
+    transcribe.add_stage_listener(pipeline.publish_stage)
+
+    if os.environ.get("PRELOAD_MODELS", "").lower() in ("1", "true", "yes"):
+        transcribe.preload_models_sync()
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+    jobs.start_workers(pipeline.run_job, args.concurrency)
+    stopping.wait()
+    logging.info("Stopping transcription workers, running jobs will be retried once their lease expires")
+    jobs.stop_workers()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import os
+import time
+
+import pytest
+
+import archive
+
+
+@pytest.fixture
+def output_dir(tmp_path):
+    archive.init(str(tmp_path))
+    return tmp_path
+
+
+def _meeting(output_dir, meeting_id: str, audio: bool = True) -> str:
+    path = output_dir / meeting_id
+    (path / "thumbnails").mkdir(parents=True)
+    (path / "transcription.json").write_text('{"segments": []}')
+    (path / "screenshot_1.png").write_bytes(b"png")
+    (path / "thumbnails" / "screenshot_1.webp").write_bytes(b"webp")
+    if audio:
+        (path / "audio.opus").write_bytes(b"opus" * 100)
+    return str(path)
+
+
+def _archive(output_dir, *meeting_ids: str) -> str:
+    path = archive.bundle_path("2026-01")
+    assert archive.add(path, [_meeting(output_dir, meeting_id) for meeting_id in meeting_ids]) == list(meeting_ids)
+    return path
+
+
+def test_restore_without_audio(output_dir):
+    bundle = _archive(output_dir, "m1", "m2")
+    assert archive.archived() == {"m1": bundle, "m2": bundle}
+
+    path = archive.restore("m1")
+
+    assert path == os.path.join(archive.archive_dir(), archive.CACHE_DIRNAME, "m1")
+    with open(os.path.join(path, "transcription.json")) as f:
+        assert f.read() == '{"segments": []}'
+    assert os.path.exists(os.path.join(path, "thumbnails", "screenshot_1.webp"))
+    assert not os.path.exists(os.path.join(path, "audio.opus"))
+    assert not os.path.exists(os.path.join(archive.archive_dir(), archive.CACHE_DIRNAME, "m2"))
+
+
+def test_restore_audio_on_demand(output_dir):
+    _archive(output_dir, "m1")
+    archive.restore("m1")
+    path = archive.restore("m1", audio=True)
+    with open(os.path.join(path, "audio.opus"), "rb") as f:
+        assert f.read() == b"opus" * 100
+
+
+def test_restore_unknown_meeting(output_dir):
+    _archive(output_dir, "m1")
+    assert archive.restore("nope") is None
+
+
+def test_restore_refreshes_after_bundle_changes(output_dir):
+    bundle = _archive(output_dir, "m1", "m2")
+    path = archive.restore("m1")
+    with open(os.path.join(path, "stale"), "w") as f:
+        f.write("left over from an older extraction")
+
+    archive.rewrite(bundle, lambda member: not member.endswith("screenshot_1.png"))
+
+    assert archive.restore("m1") == path
+    assert not os.path.exists(os.path.join(path, "stale"))
+    assert not os.path.exists(os.path.join(path, "screenshot_1.png"))
+    assert os.path.exists(os.path.join(path, "transcription.json"))
+
+
+def test_drop_removes_meeting_and_its_cache(output_dir):
+    bundle = _archive(output_dir, "m1", "m2")
+    archive.restore("m1")
+    assert archive.drop(bundle, {"m1"}) > 0
+    assert archive.archived() == {"m2": bundle}
+    assert not os.path.exists(os.path.join(archive.archive_dir(), archive.CACHE_DIRNAME, "m1"))
+    # Dropping the last meeting deletes the bundle
+    archive.drop(bundle, {"m2"})
+    assert archive.archived() == {}
+    assert not os.path.exists(bundle)
+
+
+def test_drop_audio_only(output_dir):
+    bundle = _archive(output_dir, "m1")
+    audio, other = archive.meeting_sizes(bundle)["m1"]
+    assert archive.drop(bundle, {"m1"}, audio_only=True) > 0
+    assert archive.meeting_sizes(bundle)["m1"] == (0, other)
+
+
+def test_prune_cache_keeps_most_recently_read(output_dir, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_CACHE_MEETINGS", 2)
+    _archive(output_dir, "m1", "m2", "m3")
+    now = time.time()
+    for age, meeting_id in enumerate(("m3", "m2", "m1")):
+        path = archive.restore(meeting_id)
+        os.utime(path, (now - 100 * (3 - age), now - 100 * (3 - age)))
+    # Reading a meeting again makes it the most recently read
+    archive.restore("m3")
+
+    assert archive.prune_cache() > 0
+
+    cache_dir = os.path.join(archive.archive_dir(), archive.CACHE_DIRNAME)
+    assert sorted(os.listdir(cache_dir)) == ["m1", "m3"]
+    assert archive.prune_cache() == 0
+    # A pruned meeting is extracted again on its next read
+    assert os.path.exists(os.path.join(archive.restore("m2"), "transcription.json"))
+
+
+def test_read_meetings(output_dir):
+    _archive(output_dir, "m1")
+    [(meeting_id, transcription, filenames)] = archive.read_meetings(str(output_dir))
+    assert meeting_id == "m1"
+    assert transcription == b'{"segments": []}'
+    assert sorted(filenames) == ["audio.opus", "screenshot_1.png", "transcription.json"]
@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+import jobs
+
+
+@pytest.fixture(autouse=True)
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "WORKER_ID", "worker-a")
+    monkeypatch.setattr(jobs, "JOB_LEASE_SEC", 60.0)
+    jobs.init(str(tmp_path / "jobs.db"))
+
+
+def _lose_lease(job_id: str) -> None:
+    # As if the worker running the job died a lease ago
+    with jobs._connect() as conn:
+        conn.execute("UPDATE jobs SET lease_expires_at = ? WHERE id = ?", (time.time() - 1, job_id))
+
+
+def test_claim_leases_job_to_worker():
+    jobs.enqueue("a", {"kind": "finalize"})
+    claimed = jobs._claim_next()
+    assert claimed["id"] == "a"
+    job = jobs.get_job("a")
+    assert job["state"] == jobs.STATE_RUNNING
+    assert job["worker_id"] == "worker-a"
+    assert job["attempts"] == 1
+    assert job["lease_expires_at"] > time.time() + 50
+    assert jobs._claim_next() is None
+
+
+def test_claim_prefers_normal_priority():
+    jobs.enqueue("background", {}, priority=jobs.PRIORITY_BACKGROUND)
+    jobs.enqueue("normal", {})
+    assert jobs._claim_next()["id"] == "normal"
+    assert jobs._claim_next()["id"] == "background"
+
+
+def test_enqueue_keeps_pending_job():
+    jobs.enqueue("a", {"n": 1})
+    assert jobs.enqueue("a", {"n": 2})["payload"] == {"n": 1}
+    jobs._claim_next()
+    jobs._finish("a")
+    assert jobs.enqueue("a", {"n": 3})["state"] == jobs.STATE_QUEUED
+
+
+def test_heartbeat_renews_own_leases_only(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_LEASE_SEC", 0.3)
+    jobs.enqueue("mine", {})
+    jobs.enqueue("theirs", {})
+    jobs._claim_next()
+    monkeypatch.setattr(jobs, "WORKER_ID", "worker-b")
+    jobs._claim_next()
+    monkeypatch.setattr(jobs, "WORKER_ID", "worker-a")
+    leases = {job_id: jobs.get_job(job_id)["lease_expires_at"] for job_id in ("mine", "theirs")}
+
+    jobs._stopping.clear()
+    try:
+        heartbeat = threading.Thread(target=jobs._heartbeat_loop, daemon=True)
+        heartbeat.start()
+        time.sleep(0.25)
+    finally:
+        jobs._stopping.set()
+    heartbeat.join(1)
+
+    assert jobs.get_job("mine")["lease_expires_at"] > leases["mine"]
+    assert jobs.get_job("theirs")["lease_expires_at"] == leases["theirs"]
+
+
+def test_recover_requeues_expired_jobs():
+    jobs.enqueue("expired", {})
+    jobs.enqueue("alive", {})
+    jobs._claim_next()
+    jobs._claim_next()
+    _lose_lease("expired")
+
+    assert jobs.recover() == 1
+    expired = jobs.get_job("expired")
+    assert expired["state"] == jobs.STATE_QUEUED
+    assert expired["worker_id"] is None
+    assert expired["lease_expires_at"] is None
+    assert jobs.get_job("alive")["state"] == jobs.STATE_RUNNING
+    assert jobs._claim_next()["id"] == "expired"
+    assert jobs.get_job("expired")["attempts"] == 2
+
+
+def test_recover_fails_job_after_max_attempts(monkeypatch):
+    monkeypatch.setattr(jobs, "MAX_JOB_ATTEMPTS", 2)
+    jobs.enqueue("a", {})
+    for _ in range(2):
+        jobs._claim_next()
+        _lose_lease("a")
+        jobs.recover()
+    job = jobs.get_job("a")
+    assert job["state"] == jobs.STATE_FAILED
+    assert job["error"] == "Worker lost too many times"
+
+
+def test_finish_ignores_job_taken_over():
+    jobs.enqueue("a", {})
+    jobs._claim_next()
+    _lose_lease("a")
+    jobs.recover()
+    with jobs._connect() as conn:
+        conn.execute("UPDATE jobs SET state = ?, worker_id = ? WHERE id = ?", (jobs.STATE_RUNNING, "worker-b", "a"))
+    # The worker that lost its lease finishing late doesn't overwrite the new attempt
+    jobs._finish("a", error="late")
+    assert jobs.get_job("a")["state"] == jobs.STATE_RUNNING
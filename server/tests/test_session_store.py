@@ -0,0 +1,127 @@
+import json
+import time
+
+import pytest
+
+import session_store
+from session_store import SessionStore
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return str(tmp_path / "sessions.journal")
+
+
+def _start(store: SessionStore, session_id: str = "s") -> None:
+    store.start(session_id, {"title": "t", "chunks": [], "screenshots": []})
+
+
+def _journal_ops(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["op"] for line in f]
+
+
+def test_chunks_kept_in_sequence_order(journal):
+    store = SessionStore(journal)
+    _start(store)
+    for seq in (2, 0, 3, 1):
+        store.add_chunk("s", f"chunk{seq}", seq, f"sha{seq}")
+    session = store["s"]
+    assert session["chunks"] == ["chunk0", "chunk1", "chunk2", "chunk3"]
+    assert session_store.received_chunks(session) == [0, 1, 2, 3]
+
+
+def test_duplicate_seq_ignored(journal):
+    store = SessionStore(journal)
+    _start(store)
+    store.add_chunk("s", "first", 0, "a")
+    store.add_chunk("s", "again", 0, "b")
+    assert store["s"]["chunks"] == ["first"]
+    assert store["s"]["chunk_seqs"] == {"0": "a"}
+
+
+def test_missing_and_contiguous_chunks(journal):
+    store = SessionStore(journal)
+    _start(store)
+    for seq in (0, 1, 3):
+        store.add_chunk("s", f"chunk{seq}", seq)
+    session = store["s"]
+    assert session_store.missing_chunks(session) == [2]
+    assert session_store.missing_chunks(session, expected=6) == [2, 4, 5]
+    assert session_store.contiguous_chunks(session) == ["chunk0", "chunk1"]
+
+
+def test_add_next_chunk_takes_next_free_seq(journal):
+    store = SessionStore(journal)
+    _start(store)
+    store.add_chunk("s", "chunk0", 0)
+    store.add_chunk("s", "chunk1", 1)
+    placed = []
+    seq, path = store.add_next_chunk("s", lambda n: placed.append(n) or f"chunk{n}")
+    assert (seq, path, placed) == (2, "chunk2", [2])
+    with pytest.raises(KeyError):
+        store.add_next_chunk("nope", lambda n: f"chunk{n}")
+
+
+def test_replay_and_other_processes(journal):
+    store = SessionStore(journal)
+    other = SessionStore(journal)
+    _start(store)
+    store.add_chunk("s", "chunk1", 1)
+    other.add_chunk("s", "chunk0", 0)
+    # Each store catches up with the journal lines the other wrote
+    assert store["s"]["chunks"] == other["s"]["chunks"] == ["chunk0", "chunk1"]
+    store.end("s")
+    assert "s" not in other
+    assert len(SessionStore(journal)) == 0
+
+
+def test_torn_last_line_ignored(journal):
+    store = SessionStore(journal)
+    _start(store)
+    with open(journal, "a", encoding="utf-8") as f:
+        f.write('{"op": "chunk", "id": "s", "path": "torn"')
+    assert SessionStore(journal)["s"]["chunks"] == []
+
+
+def test_compact_keeps_active_sessions_only(journal):
+    store = SessionStore(journal)
+    _start(store, "ended")
+    _start(store, "active")
+    for seq in (1, 0):
+        store.add_chunk("active", f"chunk{seq}", seq, f"sha{seq}")
+    store.add_screenshot("active", "shot.png")
+    store.end("ended")
+    before = store["active"]
+
+    store.compact()
+
+    assert _journal_ops(journal) == ["start"]
+    assert list(store) == ["active"]
+    assert store["active"] == before
+    assert SessionStore(journal)["active"] == before
+
+
+def test_compact_seen_by_other_process(journal):
+    store = SessionStore(journal)
+    other = SessionStore(journal)
+    _start(store, "a")
+    _start(store, "b")
+    store.add_chunk("a", "chunk0", 0)
+    store.end("b")
+    assert sorted(other) == ["a"]
+
+    store.compact()
+    # The other store replays the compacted journal, and keeps appending to it
+    other.add_chunk("a", "chunk1", 1)
+    assert store["a"]["chunks"] == other["a"]["chunks"] == ["chunk0", "chunk1"]
+    assert _journal_ops(journal) == ["start", "chunk"]
+
+
+def test_idle_sessions(journal, monkeypatch):
+    monkeypatch.setattr(session_store, "SESSION_IDLE_TIMEOUT_SEC", 60)
+    store = SessionStore(journal)
+    started = time.time()
+    _start(store)
+    assert store.idle_sessions(now=started + 30) == []
+    assert store.idle_sessions(now=started + 61) == ["s"]
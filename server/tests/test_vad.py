@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+import vad
+from vad import SpeechTimeline
+
+SAMPLE_RATE = 16000
+
+
+@pytest.fixture
+def timeline():
+    # Speech from 0s to 1s and from 3s to 4s, the silence in between was cut
+    return SpeechTimeline([(0, 16000), (48000, 64000)], SAMPLE_RATE, 64000)
+
+
+def test_to_original(timeline):
+    assert timeline.to_original(0.0) == 0.0
+    assert timeline.to_original(0.5) == 0.5
+    assert timeline.to_original(1.5) == 3.5
+    assert timeline.to_original(2.0) == 4.0
+
+
+def test_to_original_on_join(timeline):
+    # A start on the join is the start of the later region, an end the end of the earlier one
+    assert timeline.to_original(1.0) == 3.0
+    assert timeline.to_original(1.0, end=True) == 1.0
+    assert timeline.to_original(0.0, end=True) == 0.0
+
+
+def test_restore(timeline):
+    result = {
+        "segments": [
+            {"start": 0.2, "end": 1.0, "words": [{"start": 0.2, "end": 0.6}, {"start": 0.6, "end": 1.0}]},
+            {"start": 1.0, "end": 1.8, "words": [{"start": 1.0, "end": 1.8}, {"word": "unaligned"}]},
+        ]
+    }
+    timeline.restore(result)
+    first, second = result["segments"]
+    assert (first["start"], first["end"]) == (0.2, 1.0)
+    assert [(w["start"], w["end"]) for w in first["words"]] == [(0.2, 0.6), (0.6, 1.0)]
+    assert (second["start"], second["end"]) == (3.0, 3.8)
+    assert (second["words"][0]["start"], second["words"][0]["end"]) == (3.0, 3.8)
+    assert "start" not in second["words"][1]
+
+
+def test_restore_empty_item_on_join(timeline):
+    result = {"segments": [{"start": 1.0, "end": 1.0, "words": []}]}
+    timeline.restore(result)
+    segment = result["segments"][0]
+    assert segment["end"] >= segment["start"] == 3.0
+
+
+def test_trim_silence_round_trip():
+    tone = 0.5 * np.sin(np.linspace(0, 440 * 2 * np.pi, SAMPLE_RATE, dtype=np.float32))
+    silence = np.zeros(3 * SAMPLE_RATE, dtype=np.float32)
+    audio = np.concatenate([tone, silence, tone])
+
+    trimmed, timeline = vad.trim_silence(audio, SAMPLE_RATE)
+
+    assert timeline is not None
+    assert len(trimmed) == timeline.speech_samples < len(audio)
+    stats = timeline.stats()
+    assert stats["original_sec"] == 5.0
+    assert stats["skipped_sec"] == pytest.approx(5.0 - stats["speech_sec"])
+    # Samples of the trimmed audio map back to the same samples of the original
+    for index in (100, len(trimmed) - 100):
+        original = timeline.to_original(index / SAMPLE_RATE)
+        assert audio[round(original * SAMPLE_RATE)] == trimmed[index]
+    assert timeline.to_original(len(trimmed) / SAMPLE_RATE, end=True) == 5.0